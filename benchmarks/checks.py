@@ -0,0 +1,732 @@
+#!/usr/bin/env python
+"""
+Checks of engine parts against stand-ins of the cloud (fakecli.py),
+behaviour that benchmarks rely on but do not assert.
+
+    python benchmarks/checks.py
+    python benchmarks/checks.py --checks session,python
+
+Checks:
+    session   replies of CLISession, its return codes and streaming;
+              REPL that died, idle or in the middle of a command,
+              is dropped by SessionPool and new one takes its place
+    python    PythonActions called from threads share one pooled
+              session object, failed action returns its return code,
+              quoted arguments are kept whole; object being created
+              does not hold up other threads of SessionObjectPool
+    command   splitting of command lines and chains, quoting, filling of
+              action templates with item values and '{}:item.x.Y' values
+    parser    listings of each format parsed from chunks of any size,
+              broken listings are rejected
+    filter    rules of fields, regexes and prefixes, include and exclude,
+              raw items
+    scheduler dependencies of sections, implicit and declared ones,
+              rejection of cycles, order and concurrency of runs
+    journal   resumed sweep skips items swept before it was interrupted,
+              record cut by the crash is dropped
+    scripts   'post_script' of a section that uses common environment
+              leaves it primed, common 'post_script' runs once at the end
+
+Each check prints 'ok' or what failed, return code is the number
+of failed checks.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from run import _common_options, bench_dir, root_dir, sweep_script
+from run import write_cli
+
+# janitor modules import each other by plain names
+sys.path.insert(0, os.path.join(root_dir, "janitor"))
+
+from command import CommandTemplate, join_command  # noqa: E402
+from command import split_command  # noqa: E402
+from filters import ItemFilter, KeyFilter, parse_rules  # noqa: E402
+from parsers import get_parser  # noqa: E402
+from pyaction import PythonActions, SessionObjectPool  # noqa: E402
+from scheduler import SectionScheduler, get_ancestors  # noqa: E402
+from scheduler import resolve_dependencies  # noqa: E402
+from pyaction import python_failed_return_code  # noqa: E402
+from session import CLISession, SessionPool  # noqa: E402
+from session import session_failed_return_code  # noqa: E402
+from sweeper import DataCache  # noqa: E402
+from utils.exception import CommandInvalid  # noqa: E402
+from utils.exception import JSONParsingFailed  # noqa: E402
+from utils.exception import OutputParsingFailed  # noqa: E402
+from utils.exception import SectionDependencyCycle  # noqa: E402
+
+
+def _expect(value, expected, what):
+    if value != expected:
+        raise AssertionError("{}: {!r}, expected {!r}".format(
+            what,
+            value,
+            expected
+        ))
+
+
+def check_session(folder):
+    _cli = write_cli(folder, sys.executable)
+    _started = []
+
+    def _start(latency=0):
+        _session = CLISession(
+            [_cli, "repl"],
+            marker_cmd="echo {} $?",
+            env=dict(os.environ, FAKECLI_LATENCY=str(latency))
+        )
+        _started.append(_session)
+        return _session
+
+    _pool = SessionPool(_start, size=1)
+    _slow = SessionPool(lambda: _start(latency=1), size=1)
+    try:
+        _output, _err, _rc = _pool.execute(
+            "list server --count 3 --format raw"
+        )
+        _expect(_rc, 0, "rc of listing")
+        _expect(
+            _output.splitlines(),
+            ["tempest-server-{}".format(_i) for _i in range(3)],
+            "listing"
+        )
+        _output, _err, _rc = _pool.execute("nosuch")
+        _expect(_rc, 2, "rc of unknown command")
+        _expect("Unknown command" in _err, True, "error of unknown command")
+
+        # output goes to consumer by lines, only its start is returned
+        _chunks = []
+        _output, _err, _rc = _pool.execute(
+            "list server --count 20000 --format raw",
+            consumer=_chunks.append,
+            capture_limit=100
+        )
+        _expect(_rc, 0, "rc of streamed listing")
+        _expect(len(_output), 100, "captured output")
+        _lines = "".join(_chunks).splitlines()
+        _expect(len(_lines), 20000, "streamed lines")
+        _expect(_lines[-1], "tempest-server-19999", "last streamed line")
+        _expect(len(_started), 1, "sessions started")
+
+        # idle session died, command fails and session is dropped
+        os.kill(_started[0].pid, signal.SIGKILL)
+        _started[0]._process.wait()
+        _output, _err, _rc = _pool.execute("delete server-1")
+        _expect(_rc, session_failed_return_code, "rc in dead session")
+        _expect(_pool.execute("delete server-1")[2], 0, "rc in new session")
+        _expect(len(_started), 2, "sessions started")
+        _expect(_started[0].pid != _started[1].pid, True, "new session")
+
+        # session died in the middle of a command, each one takes 1s
+        _killer = threading.Timer(
+            0.3,
+            lambda: os.kill(_started[-1].pid, signal.SIGKILL)
+        )
+        _killer.start()
+        _begin = time.time()
+        _rc = _slow.execute("delete server-2")[2]
+        _killer.join()
+        _expect(_rc, session_failed_return_code, "rc of killed command")
+        _expect(time.time() - _begin < 1, True, "killed command returned")
+        _expect(_slow.execute("delete server-2")[2], 0, "rc after restart")
+        _expect(len(_started), 4, "sessions started")
+    finally:
+        _pool.close()
+        _slow.close()
+    _expect(
+        [_session.is_alive() for _session in _started],
+        [False] * len(_started),
+        "sessions alive after pool is closed"
+    )
+
+
+def check_python(folder):
+    _actions = PythonActions(
+        path=bench_dir,
+        session_factory="fakecloud.connect",
+        pool_size=1
+    )
+    _cmds = [
+        "python:fakecloud.list_items server --count 3",
+        "python:fakecloud.delete tempest-server-1"
+    ] * 4
+    _results = []
+    # calls overlap, so all but one of them wait for the session
+    _environ = dict(os.environ)
+    os.environ["FAKECLI_LATENCY"] = "0.05"
+    try:
+        _threads = [
+            threading.Thread(
+                target=lambda _cmd=_cmd: _results.append(_actions.call(_cmd))
+            )
+            for _cmd in _cmds
+        ]
+        for _thread in _threads:
+            _thread.start()
+        for _thread in _threads:
+            _thread.join()
+
+        _expect([_rc for _, _, _rc in _results], [0] * len(_cmds), "rcs")
+        _expect(len(_actions.pool._created), 1, "session objects")
+        _expect(
+            _actions.pool._created[0].calls,
+            len(_cmds),
+            "calls in session"
+        )
+        _listed = [_output for _output, _, _ in _results if _output]
+        _expect(len(_listed), len(_cmds) // 2, "listings")
+        _expect(len(_listed[0]), 3, "listed items")
+
+        # exception of action is its error, session stays in the pool
+        os.environ["FAKECLI_FAIL_RATE"] = "1"
+        _output, _err, _rc = _actions.call(
+            "python:fakecloud.delete tempest-server-2"
+        )
+        _expect(_rc, python_failed_return_code, "rc of failed action")
+        _expect("Conflict" in _err, True, "error of failed action")
+        _expect(len(_actions.pool._created), 1, "session objects")
+
+        # arguments are split like shell does
+        os.environ["FAKECLI_FAIL_RATE"] = "0"
+        os.environ["FAKECLI_DELETE_LOG"] = os.path.join(folder, "deleted")
+        _actions.call(
+            "python:fakecloud.delete 'tempest server 3' \"it's 4\" 5"
+        )
+        with open(os.environ["FAKECLI_DELETE_LOG"]) as _file:
+            _expect(
+                [_line.split("\t")[0] for _line in _file],
+                ["tempest server 3", "it's 4", "5"],
+                "deleted arguments"
+            )
+        _output, _err, _rc = _actions.call("python:fakecloud.delete 'x")
+        _expect(_rc, python_failed_return_code, "rc of unclosed quote")
+    finally:
+        os.environ.clear()
+        os.environ.update(_environ)
+        _actions.close()
+    _expect(len(_actions.pool._created), 0, "session objects after close")
+
+    # slow factory does not block threads that release or reuse objects
+    _gate = threading.Event()
+    _made = []
+
+    def _factory():
+        if _made:
+            _gate.wait(5)
+        _made.append(object())
+        return _made[-1]
+
+    _pool = SessionObjectPool(_factory, size=2)
+    _first = _pool.acquire()
+    _creating = threading.Thread(target=_pool.acquire)
+    _creating.start()
+    time.sleep(0.1)
+    _begin = time.time()
+    _pool.release(_first)
+    _expect(_pool.acquire() is _first, True, "object reused")
+    _expect(time.time() - _begin < 1, True, "released while creating")
+    _gate.set()
+    _creating.join()
+    _expect(len(_made), 2, "objects created")
+
+
+# command line, its steps as (operator, words)
+_command_lines = [
+    ("a b  c", [(None, ["a", "b", "c"])]),
+    ("a 'b c' \"d \\\" $e\"", [(None, ["a", "b c", 'd " $e'])]),
+    ("a\\ b 'c'd \"\"", [(None, ["a b", "cd", ""])]),
+    ("a; b && c", [(None, ["a"]), (";", ["b"]), ("&&", ["c"])]),
+    ("a;b&&c;", [(None, ["a"]), (";", ["b"]), ("&&", ["c"])]),
+    ("a ';' \"&&\" \\;", [(None, ["a", ";", "&&", ";"])]),
+    ("a & b | c", [(None, ["a", "&", "b", "|", "c"])]),
+]
+
+_invalid_command_lines = ["a 'b", 'a "b', "; a", "a && && b", "a &&"]
+
+# template, value, variables, chunk, steps of rendered command
+_command_templates = [
+    ("del {}", "a b", None, False, [(None, ["del", "a b"])]),
+    ("del {}", "a b c", None, True, [(None, ["del", "a", "b", "c"])]),
+    (
+        "file {0}; tail {0}",
+        "x",
+        None,
+        False,
+        [(None, ["file", "x"]), (";", ["tail", "x"])]
+    ),
+    (
+        "stop {0} && del {0}",
+        "x",
+        None,
+        False,
+        [(None, ["stop", "x"]), ("&&", ["del", "x"])]
+    ),
+    (
+        "rm /path/{0}.txt",
+        "a'b",
+        None,
+        False,
+        [(None, ["rm", "/path/a'b.txt"])]
+    ),
+    ("rm '{0}' \"{0}\"", "a b", None, False, [(None, ["rm", "a b", "a b"])]),
+    (
+        "net del {0} --sub {1}:item.network.ID,item.subnet.ID",
+        None,
+        {"item.network.ID": "n1", "item.subnet.ID": "s 1"},
+        False,
+        [(None, ["net", "del", "n1", "--sub", "s 1"])]
+    ),
+    (
+        "del {}/{}:item.network.ID, item.subnet.ID",
+        None,
+        {"item.network.ID": "n1", "item.subnet.ID": "s1"},
+        False,
+        [(None, ["del", "n1/s1"])]
+    ),
+    ("echo a:b {}", "x", None, False, [(None, ["echo", "a:b", "x"])]),
+]
+
+
+def check_command(folder):
+    for _line, _steps in _command_lines:
+        _expect(split_command(_line), _steps, "steps of {!r}".format(_line))
+        _expect(
+            split_command(join_command(_steps)),
+            _steps,
+            "steps of joined {!r}".format(_line)
+        )
+    for _line in _invalid_command_lines:
+        try:
+            split_command(_line)
+        except CommandInvalid:
+            continue
+        raise AssertionError("{!r} is not rejected".format(_line))
+
+    for _template, _value, _variables, _chunk, _steps in _command_templates:
+        _cache = DataCache()
+        for _name, _variable in (_variables or {}).items():
+            _cache.__setattr__(_name, _variable)
+        _cmd = CommandTemplate(_template).render(
+            _value,
+            cache=_cache,
+            chunk=_chunk
+        )
+        _what = "{!r} of {!r}".format(_template, _value)
+        _expect(_cmd.steps, _steps, "steps of " + _what)
+        # line is what is logged and what session engine sends
+        _expect(split_command(_cmd), _steps, "line of " + _what)
+
+    # 'python:' actions are filled in as is, they split own arguments
+    _expect(
+        CommandTemplate("python:m.f {} 'b c'").render("a"),
+        "python:m.f a 'b c'",
+        "python action"
+    )
+
+
+_table_listing = """Listing servers
++----+------+--------+
+| ID | Name | Status |
++----+------+--------+
+| 1  | a    | ACTIVE |
+|    | b    |        |
+| 2  | c    | ERROR  |
++----+------+--------+
+"""
+
+# format, options of parser, listing, items
+_listings = [
+    (
+        "json",
+        {},
+        '[{"ID": "a", "Name": "x, ]y"},\n {"ID": 12}, 345, "s]"]\n',
+        [{"ID": "a", "Name": "x, ]y"}, {"ID": 12}, 345, "s]"]
+    ),
+    ("json", {}, " [ ] ", []),
+    ("raw", {}, "a\r\nb\n\nc", ["a", "b", "", "c"]),
+    (
+        "table",
+        {"key": "ID"},
+        _table_listing,
+        [
+            {"ID": "1", "Name": "a\nb", "Status": "ACTIVE"},
+            {"ID": "2", "Name": "c", "Status": "ERROR"}
+        ]
+    ),
+    (
+        "table",
+        {"fields": ["Name"], "key": "ID"},
+        _table_listing,
+        [{"ID": "1", "Name": "a\nb"}, {"ID": "2", "Name": "c"}]
+    ),
+    (
+        "csv",
+        {"fields": ["Name"], "key": "ID"},
+        'ID,Name,Status\n1,"a\nb",OK\n\n2,"c ""q"", d",OK\n',
+        [{"ID": "1", "Name": "a\nb"}, {"ID": "2", "Name": 'c "q", d'}]
+    ),
+    (
+        "value",
+        {"columns": ["ID", "Name"], "key": "ID"},
+        "1 a b\n2 c\n",
+        [{"ID": "1", "Name": "a b"}, {"ID": "2", "Name": "c"}]
+    ),
+]
+
+_broken_listings = [
+    ("json", {}, "[1, 2", JSONParsingFailed),
+    ("json", {}, '{"ID": 1}', JSONParsingFailed),
+    ("csv", {}, 'ID\n"a\n', OutputParsingFailed),
+    ("table", {"key": "ID"}, "| Name |\n| a |\n", OutputParsingFailed),
+    ("value", {"columns": ["ID", "Name"]}, "1\n", OutputParsingFailed),
+]
+
+
+def _parse_chunks(output_format, options, listing, size):
+    _parser = get_parser(output_format, **options)
+    _items = []
+    for _start in range(0, len(listing), size):
+        _items.extend(_parser.feed(listing[_start:_start + size]))
+    _items.extend(_parser.close())
+    return _items
+
+
+def check_parser(folder):
+    for _format, _options, _listing, _items in _listings:
+        # chunk of each size splits records at each place
+        for _size in range(1, len(_listing) + 1):
+            _expect(
+                _parse_chunks(_format, _options, _listing, _size),
+                _items,
+                "{} items of {}b chunks".format(_format, _size)
+            )
+    for _format, _options, _listing, _error in _broken_listings:
+        for _size in (1, len(_listing)):
+            try:
+                _parse_chunks(_format, _options, _listing, _size)
+            except _error:
+                continue
+            raise AssertionError("{} listing {!r} is not rejected".format(
+                _format,
+                _listing
+            ))
+
+
+def check_filter(folder):
+    _expect(
+        parse_rules("^tempest-\n\n  @Status = ^ERROR$\n@bad rule\n"),
+        [(None, "^tempest-"), ("Status", "^ERROR$"), (None, "@bad rule")],
+        "parsed rules"
+    )
+    _expect(parse_rules(None), [], "no rules")
+
+    _items = [
+        {"Name": "tempest-a", "Status": "ACTIVE"},
+        {"Name": "tempest-b", "Status": "ERROR"},
+        {"Name": "keep-tempest-c", "Status": "ERROR"},
+        {"Name": "c-tempest", "Status": "ACTIVE", "Owner": "tempest-x"},
+        {"Name": None, "Status": "ACTIVE"},
+    ]
+    # common rules look at filter field, '*' is any field
+    _filter = ItemFilter(
+        [(None, "^tempest-")],
+        exclude=[("Status", "^ERROR$")],
+        default_field="Name"
+    )
+    _expect(_filter.filter(_items), _items[:1], "name rules")
+    _expect(_filter.fields, {"Name", "Status"}, "fields of rules")
+    _filter = ItemFilter([(None, "^tempest-")], default_field="*")
+    _expect(
+        _filter.filter(_items),
+        [_items[0], _items[1], _items[3]],
+        "rules of any field"
+    )
+    _expect(_filter.fields, None, "fields of any field rules")
+
+    # prefixes and regexes of a field are combined
+    _filter = ItemFilter(
+        [("Name", "^c-")],
+        include_prefixes=[("Name", "tempest-")],
+        exclude_prefixes=[("Status", "ERR")],
+        default_field="Name"
+    )
+    _expect(_filter.filter(_items), [_items[0], _items[3]], "prefixes")
+
+    # raw items are strings, field rules are dropped
+    _filter = ItemFilter(
+        [(None, "^tempest-"), ("Name", "^keep")],
+        exclude_prefixes=[(None, "tempest-b")],
+        raw=True
+    )
+    _expect(
+        _filter.filter(["tempest-a", "tempest-b", "keep-a", "a-tempest-"]),
+        ["tempest-a"],
+        "raw items"
+    )
+
+    _expect(
+        KeyFilter({"tempest-b"}, key="Name").filter(_items),
+        [_items[1]],
+        "items by key"
+    )
+    _expect(
+        KeyFilter({"b"}).filter(["a", "b"]),
+        ["b"],
+        "raw items by key"
+    )
+
+
+def check_scheduler(folder):
+    # no 'depends_on' waits for the previous section, empty one is none
+    _dependencies = resolve_dependencies(
+        ["a", "b", "c", "d"],
+        {"a": None, "b": None, "c": [], "d": ["a", "c"]}
+    )
+    _expect(
+        _dependencies,
+        {"a": [], "b": ["a"], "c": [], "d": ["a", "c"]},
+        "dependencies"
+    )
+    _expect(get_ancestors(_dependencies, "d"), {"a", "c"}, "ancestors")
+
+    for _declared in (
+            {"a": ["a"]},
+            {"a": ["b"], "b": ["a"]},
+            {"a": ["c"], "b": None, "c": None}
+    ):
+        try:
+            resolve_dependencies(["a", "b", "c"], _declared)
+        except SectionDependencyCycle:
+            continue
+        raise AssertionError("cycle of {!r} is not rejected".format(
+            _declared
+        ))
+
+    # ready sections start in the order of the list
+    _order = []
+    SectionScheduler(
+        ["a", "b", "c"],
+        {"a": ["c"], "b": [], "c": []}
+    ).run(lambda _section: _order.append(_section) or 0)
+    _expect(_order, ["b", "c", "a"], "order of sections")
+
+    # section starts once its dependencies are done, two at once at most
+    _lock = threading.Lock()
+    _events = []
+    _running = [0, 0]
+
+    def _runner(section):
+        with _lock:
+            _events.append(("start", section))
+            _running[0] += 1
+            _running[1] = max(_running)
+        time.sleep(0.05)
+        with _lock:
+            _events.append(("end", section))
+            _running[0] -= 1
+        return 0
+
+    _dependencies = {"a": [], "b": [], "c": ["a"], "d": ["a", "b"], "e": []}
+    _results = SectionScheduler(
+        sorted(_dependencies),
+        _dependencies,
+        concurrency=2
+    ).run(_runner)
+    _expect(_results, dict.fromkeys(_dependencies, 0), "results")
+    _expect(_running[1], 2, "sections at once")
+    for _section, _depends_on in _dependencies.items():
+        for _dependency in _depends_on:
+            _expect(
+                _events.index(("end", _dependency))
+                < _events.index(("start", _section)),
+                True,
+                "'{}' started after '{}'".format(_section, _dependency)
+            )
+
+    # nothing new starts after a section failed
+    _order = []
+
+    def _failing(section):
+        _order.append(section)
+        raise RuntimeError(section)
+
+    try:
+        SectionScheduler(["a", "b"], {"b": ["a"]}).run(_failing)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("failure of section is not raised")
+    _expect(_order, ["a"], "sections run after failure")
+
+
+def _sweep(folder, name, cli, text, args=(), env=None):
+    # sweep of generated profile in own process, like benchmarks run it
+    _profile = os.path.join(folder, "{}.profile".format(name))
+    with open(_profile, "w") as _file:
+        _file.write(_common_options.format(
+            name=name,
+            cli=cli,
+            bench_dir=bench_dir,
+            concurrency=1,
+            prefetch_sections=0
+        ))
+        _file.write(text)
+    _env = dict(os.environ, PYTHONPATH=root_dir)
+    _env.update(env or {})
+    _process = subprocess.Popen(
+        [sys.executable, sweep_script, "--sweep"] + list(args) + [_profile],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=_env,
+        cwd=folder
+    )
+    _output = _process.communicate()[0]
+    _expect(_process.returncode, 0, "rc of sweep, output:\n" + _output)
+    return _output
+
+
+def _read_deleted(filename):
+    with open(filename) as _file:
+        return [_line.split("\t")[0] for _line in _file]
+
+
+def check_journal(folder):
+    _cli = write_cli(folder, sys.executable)
+    _section = """
+[01-Servers]
+list_action = {cli} list server --count 10 --keep 2
+key = ID
+sweep_action = {cli} delete {{}}
+""".format(cli=_cli)
+    _journal = os.path.join(folder, "sweep.journal")
+    _deleted = os.path.join(folder, "journal-deleted")
+    _sweep(
+        folder,
+        "journal",
+        _cli,
+        _section,
+        args=["--journal", _journal],
+        env={"FAKECLI_DELETE_LOG": _deleted}
+    )
+    _all = _read_deleted(_deleted)
+    _expect(len(set(_all)), 10, "items swept")
+
+    # run is cut after a few items, while a record was written
+    with open(_journal) as _file:
+        _records = [json.loads(_line) for _line in _file]
+    _kept = []
+    _swept = []
+    for _record in _records:
+        if _record["record"] == "items":
+            if len(_swept) >= 4:
+                break
+            _swept.extend(_record["items"])
+        if _record["record"] != "section":
+            _kept.append(_record)
+    _expect(0 < len(_swept) < 10, True, "items swept before the cut")
+    with open(_journal, "w") as _file:
+        for _record in _kept:
+            _file.write(json.dumps(_record) + "\n")
+        _file.write('{"record": "items", "sec')
+
+    _resumed = os.path.join(folder, "journal-deleted-resumed")
+    _sweep(
+        folder,
+        "journal",
+        _cli,
+        _section,
+        args=["--resume", _journal],
+        env={"FAKECLI_DELETE_LOG": _resumed}
+    )
+    _again = _read_deleted(_resumed)
+    _expect(sorted(set(_swept) & set(_again)), [], "items swept again")
+    _expect(sorted(set(_swept) | set(_again)), sorted(set(_all)), "items")
+    # resumed run goes on after last complete record
+    with open(_journal) as _file:
+        _records = [json.loads(_line) for _line in _file]
+    _expect(
+        (_records[-1]["record"], _records[-1]["rc"]),
+        ("section", 0),
+        "last record of resumed journal"
+    )
+
+
+def check_scripts(folder):
+    _cli = write_cli(folder, sys.executable)
+    _trace = os.path.join(folder, "scripts.trace")
+    _sweep(folder, "scripts", _cli, """pre_script = echo global-pre >> {trace}
+post_script = echo global-post >> {trace}
+
+[01-First]
+list_action = {cli} list server --count 1
+key = ID
+sweep_action = {cli} delete {{}}
+post_script = echo section-post t1 >> {trace}
+
+[02-Second]
+list_action = {cli} list volume --count 1
+key = ID
+sweep_action = {cli} delete {{}}
+""".format(cli=_cli, trace=_trace))
+    with open(_trace) as _file:
+        _expect(
+            _file.read().splitlines(),
+            ["global-pre", "section-post t1", "global-post"],
+            "scripts run"
+        )
+
+
+_checks = [
+    ("session", check_session),
+    ("python", check_python),
+    ("command", check_command),
+    ("parser", check_parser),
+    ("filter", check_filter),
+    ("scheduler", check_scheduler),
+    ("journal", check_journal),
+    ("scripts", check_scripts),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="checks.py")
+    parser.add_argument(
+        "--checks",
+        default=",".join(_name for _name, _ in _checks),
+        help="Comma separated checks to run"
+    )
+    options = parser.parse_args()
+    _selected = options.checks.split(",")
+
+    _failed = 0
+    _folder = tempfile.mkdtemp(prefix="janitor-checks-")
+    try:
+        for _name, _check in _checks:
+            if _name not in _selected:
+                continue
+            try:
+                _check(_folder)
+            except Exception:
+                _failed += 1
+                print("{}: FAILED".format(_name))
+                traceback.print_exc()
+            else:
+                print("{}: ok".format(_name))
+    finally:
+        shutil.rmtree(_folder)
+    return _failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+Simulated cloud CLI for benchmarks, stands in for openstack/cinder.
+
+Listings are generated, not stored, so item IDs are the same for each
+call and deletes need no state. Behaviour is set by environment:
+    FAKECLI_STARTUP     seconds to start, like CLI imports and auth
+    FAKECLI_LATENCY     seconds for each API call
+    FAKECLI_FAIL_RATE   share of deletes that fail, 0..1
+    FAKECLI_SPAWN_LOG   file to count processes started
+    FAKECLI_DELETE_LOG  file to count deleted items
+    FAKECLI_DELETE_DELAY  seconds before deleted items leave listings,
+                        unset keeps them listed; needs delete log
+
+Usage:
+    fakecli.py list <resource> [--count N] [--keep N] [--format FORMAT]
+                               [--parent ID] [--parents RES:N[,RES:N]]
+                               [--page-size N]
+    fakecli.py delete <id> [<id> ...]
+    fakecli.py repl
+Listing has 'count' items named 'tempest-*' and 'keep' more that should
+not be matched by filters. Child items are listed for a '--parent' or
+for all parents at once, with reference in 'Parent' field. '--parents'
+is the chain of listings above, i.e. 'network:4,subnet:8' for ports
+of 8 subnets in each of 4 networks. With '--page-size' listing is
+printed by pages, each one is an API call with its own latency.
+Formats are 'json', 'raw' with names only, and 'table', 'csv' or 'value'
+of ID, Name, Status and Parent columns, like openstack client prints.
+In 'repl' mode commands are read from stdin one per line,
+'echo <text> $?' prints text and return code of the previous command.
+"""
+from __future__ import print_function
+
+import json
+import os
+import random
+import sys
+import time
+
+# columns of table, csv and value listings
+_columns = ("ID", "Name", "Status")
+
+
+def _get_float(name, default=0.0):
+    return float(os.environ.get(name, default))
+
+
+def _append(name, text):
+    _filename = os.environ.get(name)
+    if _filename:
+        with open(_filename, "a") as _file:
+            _file.write(text)
+
+
+def _take_option(args, name, default=None):
+    if name in args:
+        _index = args.index(name)
+        _value = args[_index + 1]
+        del args[_index:_index + 2]
+        return _value
+    return default
+
+
+def _get_deleted():
+    # items deleted long enough ago to be gone from listings
+    _delay = os.environ.get("FAKECLI_DELETE_DELAY")
+    _filename = os.environ.get("FAKECLI_DELETE_LOG")
+    if _delay is None or not _filename or not os.path.exists(_filename):
+        return set()
+    _gone_before = time.time() - float(_delay)
+    _deleted = set()
+    with open(_filename) as _file:
+        for _line in _file:
+            _id, _, _when = _line.rstrip("\n").partition("\t")
+            if _when and float(_when) <= _gone_before:
+                _deleted.add(_id)
+    return _deleted
+
+
+def make_items(resource, count, keep=0, parent=None):
+    _items = []
+    _prefix = resource if parent is None else "{}-{}".format(resource, parent)
+    for _index in range(count + keep):
+        _name = "tempest-" if _index < count else "production-"
+        _item = {
+            "ID": "{}-{}".format(_prefix, _index),
+            "Name": "{}{}-{}".format(_name, resource, _index),
+            "Status": "ACTIVE"
+        }
+        if parent is not None:
+            _item["Parent"] = parent
+        _items.append(_item)
+    return _items
+
+
+def _get_columns(items):
+    if items and "Parent" in items[0]:
+        return _columns + ("Parent", )
+    return _columns
+
+
+def _table_border(widths):
+    return "+" + "+".join("-" * (_width + 2) for _width in widths) + "+\n"
+
+
+def _table_row(values, widths):
+    return "|" + "|".join(
+        " {} ".format(_value.ljust(_width))
+        for _value, _width in zip(values, widths)
+    ) + "|\n"
+
+
+def _csv_row(values):
+    return ",".join('"{}"'.format(_value) for _value in values) + "\n"
+
+
+def write_listing(output, items, pages, output_format):
+    """
+    Print listing page by page, each page after the first one
+    takes its own latency
+
+    :param items: all items of the listing
+    :param pages: items split in pages
+    :param output_format: 'json', 'raw', 'table', 'csv' or 'value'
+    """
+    _names = _get_columns(items)
+    _widths = [
+        max([len(_column)] + [len(_item[_column]) for _item in items])
+        for _column in _names
+    ]
+    if output_format == "json":
+        output.write("[")
+    elif output_format == "table" and items:
+        output.write(_table_border(_widths))
+        output.write(_table_row(_names, _widths))
+        output.write(_table_border(_widths))
+    elif output_format == "csv":
+        output.write(_csv_row(_names))
+    for _number, _page in enumerate(pages):
+        if _number > 0:
+            time.sleep(_get_float("FAKECLI_LATENCY"))
+        _rows = [[_item[_column] for _column in _names] for _item in _page]
+        if output_format == "raw":
+            for _item in _page:
+                output.write(_item["Name"] + "\n")
+        elif output_format == "table":
+            output.write("".join(_table_row(_row, _widths) for _row in _rows))
+        elif output_format == "csv":
+            output.write("".join(_csv_row(_row) for _row in _rows))
+        elif output_format == "value":
+            output.write("".join(" ".join(_row) + "\n" for _row in _rows))
+        else:
+            if _number > 0 and _page:
+                output.write(", ")
+            output.write(", ".join(json.dumps(_item) for _item in _page))
+        output.flush()
+    if output_format == "json":
+        output.write("]\n")
+    elif output_format == "table" and items:
+        output.write(_table_border(_widths))
+
+
+def list_items(resource, args):
+    """
+    Generate listing for arguments of 'list' command
+
+    :return: list of item dicts
+    """
+    _count = int(_take_option(args, "--count", 10))
+    _keep = int(_take_option(args, "--keep", 0))
+    _parent = _take_option(args, "--parent")
+    _parents = _take_option(args, "--parents")
+
+    if _parents is not None:
+        _parent_ids = [None]
+        for _level in _parents.split(","):
+            _parent_resource, _parent_count = _level.split(":")
+            _parent_ids = [
+                _item["ID"]
+                for _id in _parent_ids
+                for _item in make_items(
+                    _parent_resource,
+                    int(_parent_count),
+                    parent=_id
+                )
+            ]
+        _items = []
+        for _id in _parent_ids:
+            _items.extend(make_items(resource, _count, _keep, parent=_id))
+    else:
+        _items = make_items(resource, _count, _keep, parent=_parent)
+    _deleted = _get_deleted()
+    # raw listings are deleted by name
+    return [
+        _item for _item in _items
+        if _item["ID"] not in _deleted and _item["Name"] not in _deleted
+    ]
+
+
+def delete_items(ids):
+    """
+    Simulate deletion of items
+
+    :return: error message or None
+    """
+    # items are deleted one by one, ones before the failed one are gone
+    _failed = None
+    if random.random() < _get_float("FAKECLI_FAIL_RATE"):
+        _failed = random.randrange(len(ids))
+    _when = time.time()
+    _append("FAKECLI_DELETE_LOG", "".join(
+        "{}\t{}\n".format(_id, _when) for _id in ids[:_failed]
+    ))
+    if _failed is not None:
+        return "Conflict: {} is in use (HTTP 409)".format(ids[_failed])
+    return None
+
+
+def run(args, output, error):
+    """
+    Run single command
+
+    :param args: list of arguments
+    :param output: file for output
+    :param error: file for errors
+    :return: return code
+    """
+    if not args:
+        error.write("No command given\n")
+        return 2
+    _command = args.pop(0)
+    time.sleep(_get_float("FAKECLI_LATENCY"))
+
+    if _command == "list":
+        _resource = args.pop(0)
+        _format = _take_option(args, "--format", "json")
+        _page_size = int(_take_option(args, "--page-size", 0))
+        _items = list_items(_resource, args)
+        if _page_size > 0:
+            _pages = [
+                _items[_index:_index + _page_size]
+                for _index in range(0, len(_items), _page_size)
+            ]
+        else:
+            _pages = [_items]
+        write_listing(output, _items, _pages, _format)
+        return 0
+    elif _command == "delete":
+        _error = delete_items(args)
+        if _error is not None:
+            error.write(_error + "\n")
+            return 1
+        return 0
+
+    error.write("Unknown command '{}'\n".format(_command))
+    return 2
+
+
+def repl():
+    _rc = 0
+    while True:
+        _line = sys.stdin.readline()
+        if not _line:
+            return 0
+        _args = _line.split()
+        if not _args:
+            continue
+        if _args[0] == "echo":
+            print(" ".join(_args[1:]).replace("$?", str(_rc)))
+        else:
+            _rc = run(_args, sys.stdout, sys.stderr)
+        # errors first, reader expects them before the reply ends
+        sys.stderr.flush()
+        sys.stdout.flush()
+
+
+def main():
+    _append("FAKECLI_SPAWN_LOG", ".")
+    time.sleep(_get_float("FAKECLI_STARTUP"))
+    _args = sys.argv[1:]
+    if _args[:1] == ["repl"]:
+        return repl()
+    return run(_args, sys.stdout, sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+In process counterpart of fakecli.py for 'python:' actions,
+same listings and failures without starting processes.
+
+Profile options:
+    python_path = <benchmarks folder>
+    python_session = fakecloud.connect
+    list_action = python:fakecloud.list_items vm --count 100
+    sweep_action = python:fakecloud.delete {}
+"""
+import time
+
+import fakecli
+
+
+class Connection(object):
+    """
+    Stands for SDK connection, startup cost is paid once
+    """
+    def __init__(self):
+        fakecli._append("FAKECLI_SPAWN_LOG", ".")
+        time.sleep(fakecli._get_float("FAKECLI_STARTUP"))
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        time.sleep(fakecli._get_float("FAKECLI_LATENCY"))
+
+
+def connect():
+    return Connection()
+
+
+def list_items(session, resource, *args):
+    session.call()
+    return fakecli.list_items(resource, list(args))
+
+
+def delete(session, *ids):
+    session.call()
+    _error = fakecli.delete_items(ids)
+    if _error is not None:
+        raise RuntimeError(_error)
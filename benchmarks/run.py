@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+"""
+Benchmarks of sweep runs against simulated cloud CLI (fakecli.py).
+
+Each scenario is a generated profile, it runs once for each engine
+and reports wall time, time to the first delete, throughput of swept
+items, peak RSS of the sweeper and processes spawned for commands.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --scenarios flat,raw --engines blocking \\
+        --latency 0.05 --fail-rate 0.1 --json bench.json
+
+Scenarios:
+    flat    single section, JSON listing, one item per sweep command
+    batch   same listing swept in batches
+    python  same listing with in process 'python:' actions
+    tree    action_map of three levels, childs listed per parent
+            and joined by reference field
+    raw     large raw listing, few items match the filter
+    table   large listing printed as table, only used columns are parsed
+    value   same listing printed as bare values with no header
+    paged   listing printed by pages, each page takes 'latency'
+    pipeline  same paged listing, items swept while it is listed
+    sections  three sections one after another, paged listings
+    prefetch  same sections, next one is listed while one is swept
+    targets   paged listing of quarter size for four targets at once
+
+Sweeper is run with the python given by '--python', it should have
+janitor dependencies installed. Sweeper log is written as configured
+in janitor/etc/janitor.conf.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(bench_dir)
+sweep_script = os.path.join(root_dir, "janitor", "sweep.py")
+
+_common_options = """[sweeper]
+banner = "Benchmark: {name}"
+presort_sections = True
+common_filter = ^tempest-
+retry = 3
+timeout = 10
+max_timeout = 100
+retry_jitter = True
+retry_conflict = HTTP 409
+conflict_timeout = 20
+concurrency = {concurrency}
+sweep_batch_size = 1
+section_concurrency = 1
+process_budget = 0
+command_timeout = 0
+keep_output = False
+output_capture_limit = 65536
+default_protected_run = False
+default_format_parser = json
+default_filter_field = Name
+session_program = {cli}
+session_cmd = {cli} repl
+session_marker = echo {{}} $?
+session_pool_size = {concurrency}
+python_path = {bench_dir}
+python_session = fakecloud.connect
+python_pool_size = {concurrency}
+prefetch_sections = {prefetch_sections}
+"""
+
+_flat_section = """
+[01-Servers]
+list_action = {cli} list server --count {count} --keep {keep}
+key = ID
+sweep_action = {cli} delete {{}}
+"""
+
+_batch_section = _flat_section + """sweep_batch_size = 20
+"""
+
+_python_section = """
+[01-Servers]
+list_action = python:fakecloud.list_items server --count {count} --keep {keep}
+key = ID
+sweep_action = python:fakecloud.delete {{}}
+"""
+
+_tree_section = """
+[01-Networks]
+action_map = network.subnet.port
+network_list_action = {cli} list network --count {parents} --keep 2
+network_key = ID
+network_sweep_action = {cli} delete {{}}
+subnet_list_action = {cli} list subnet --count {parents}
+subnet_as_child_options = --parent {{}}:item.network.ID
+subnet_key = ID
+subnet_sweep_action = {cli} delete {{}}
+port_list_action = {cli} list port --count {childs} --parents {chain}
+port_join_field = Parent
+port_key = ID
+port_sweep_action = {cli} delete {{}}
+"""
+
+_paged_section = """
+[01-Servers]
+list_action = {cli} list server --count {count} --page-size {page_size}
+key = ID
+sweep_action = {cli} delete {{}}
+"""
+
+_pipeline_section = _paged_section + """pipeline = True
+"""
+
+_sections_section = """
+[01-Servers]
+list_action = {cli} list server --count {count} --page-size {page_size}
+key = ID
+sweep_action = {cli} delete {{}}
+
+[02-Volumes]
+list_action = {cli} list volume --count {count} --page-size {page_size}
+key = ID
+sweep_action = {cli} delete {{}}
+depends_on =
+
+[03-Images]
+list_action = {cli} list image --count {count} --page-size {page_size}
+key = ID
+sweep_action = {cli} delete {{}}
+depends_on =
+"""
+
+
+_raw_section = """
+[01-Files]
+output_format = raw
+filter_field = *
+list_action = {cli} list file --format raw --count {count} --keep {keep}
+key = *
+sweep_action = {cli} delete {{}}
+sweep_batch_size = 50
+"""
+
+_table_section = """
+[01-Ports]
+output_format = {fmt}
+output_columns = ID, Name, Status
+list_action = {cli} list port --format {fmt} --count {count} --keep {keep}
+key = ID
+sweep_action = {cli} delete {{}}
+sweep_batch_size = 50
+"""
+
+
+def _scenarios(scale):
+    # profile section and number of items it should sweep
+    _count = 200 * scale
+    _parents = 4 * scale
+    _childs = 10
+    return {
+        "flat": (_flat_section, dict(count=_count, keep=_count // 10)),
+        "batch": (_batch_section, dict(count=_count, keep=_count // 10)),
+        "python": (_python_section, dict(count=_count, keep=_count // 10)),
+        "tree": (_tree_section, dict(
+            parents=_parents,
+            childs=_childs,
+            chain="network:{0},subnet:{0}".format(_parents)
+        )),
+        "raw": (_raw_section, dict(count=_count, keep=_count * 100)),
+        "table": (_table_section, dict(
+            count=_count,
+            keep=_count * 100,
+            fmt="table"
+        )),
+        "value": (_table_section, dict(
+            count=_count,
+            keep=_count * 100,
+            fmt="value"
+        )),
+        "paged": (_paged_section, dict(count=_count, page_size=20)),
+        "pipeline": (_pipeline_section, dict(count=_count, page_size=20)),
+        "sections": (_sections_section, dict(
+            count=_count // 4,
+            page_size=10
+        )),
+        "prefetch": (_sections_section, dict(
+            count=_count // 4,
+            page_size=10,
+            prefetch_sections=1
+        )),
+        "targets": (_paged_section, dict(
+            count=_count // 4,
+            page_size=20,
+            targets=4
+        ))
+    }
+
+
+def _expected(name, values):
+    if name == "tree":
+        _parents = values["parents"]
+        return _parents + _parents ** 2 * (1 + values["childs"])
+    if name in ("sections", "prefetch"):
+        return values["count"] * 3
+    if name == "targets":
+        return values["count"] * values["targets"]
+    return values["count"]
+
+
+def _first_delete(filename):
+    # time of the first delete, deletes are logged as 'ID\tTIME'
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as _file:
+        _times = [
+            float(_line.rstrip("\n").partition("\t")[2]) for _line in _file
+        ]
+    return min(_times) if _times else None
+
+
+def _count_swept(filename):
+    # items deleted again by retries are counted once
+    if not os.path.exists(filename):
+        return 0
+    with open(filename) as _file:
+        return len(set(_line.partition("\t")[0] for _line in _file))
+
+
+def _count_lines(filename, char="\n"):
+    if not os.path.exists(filename):
+        return 0
+    with open(filename) as _file:
+        return _file.read().count(char)
+
+
+def write_cli(folder, python):
+    # single executable, so session engine could match its commands
+    _cli = os.path.join(folder, "fakecli")
+    with open(_cli, "w") as _file:
+        _file.write("#!/bin/sh\nexec {} {} \"$@\"\n".format(
+            python,
+            os.path.join(bench_dir, "fakecli.py")
+        ))
+    os.chmod(_cli, os.stat(_cli).st_mode | stat.S_IXUSR)
+    return _cli
+
+
+def run_scenario(name, engine, folder, cli, options):
+    """
+    Generate profile and run sweep with it
+
+    :return: dict of results
+    """
+    _section, _values = _scenarios(options.scale)[name]
+    _run_dir = tempfile.mkdtemp(
+        prefix="{}-{}-".format(name, engine),
+        dir=folder
+    )
+    _profile = os.path.join(_run_dir, "bench.profile")
+    _format = dict(
+        name=name,
+        cli=cli,
+        bench_dir=bench_dir,
+        concurrency=options.concurrency,
+        prefetch_sections=0
+    )
+    _format.update(_values)
+    with open(_profile, "w") as _file:
+        _file.write(_common_options.format(**_format))
+        _file.write(_section.format(**_format))
+
+    _spawn_log = os.path.join(_run_dir, "spawns")
+    _delete_log = os.path.join(_run_dir, "deleted")
+    _delete_logs = [_delete_log]
+    _env = dict(os.environ)
+    _env.update({
+        "PYTHONPATH": root_dir,
+        "FAKECLI_STARTUP": str(options.startup),
+        "FAKECLI_LATENCY": str(options.latency),
+        "FAKECLI_FAIL_RATE": str(options.fail_rate),
+        "FAKECLI_SPAWN_LOG": _spawn_log,
+        "FAKECLI_DELETE_LOG": _delete_log
+    })
+
+    _argv = [
+        options.python,
+        sweep_script,
+        "--sweep",
+        "--engine",
+        engine,
+        "--metrics-json",
+        os.path.join(_run_dir, "metrics.json"),
+        _profile
+    ]
+    if "targets" in _values:
+        # same profile for each target, each one in own process;
+        # targets list the same items, so each one has own delete log
+        _targets = os.path.join(_run_dir, "bench.targets")
+        _delete_logs = [
+            "{}-{}".format(_delete_log, _index)
+            for _index in range(_values["targets"])
+        ]
+        with open(_targets, "w") as _file:
+            for _index, _log in enumerate(_delete_logs):
+                _file.write(
+                    "[target-{0}]\nBENCH_TARGET = {0}\n"
+                    "FAKECLI_DELETE_LOG = {1}\n\n".format(_index, _log)
+                )
+        _argv[-1:-1] = [
+            "--targets",
+            _targets,
+            "--target-output",
+            os.path.join(_run_dir, "targets")
+        ]
+    with open(os.path.join(_run_dir, "output"), "w") as _output:
+        _started = time.time()
+        _process = subprocess.Popen(
+            _argv,
+            stdout=_output,
+            stderr=subprocess.STDOUT,
+            cwd=_run_dir,
+            env=_env
+        )
+        # rusage of sweeper and the processes it waited for
+        _, _status, _usage = os.wait4(_process.pid, 0)
+        _duration = time.time() - _started
+
+    _swept = sum(_count_swept(_log) for _log in _delete_logs)
+    _firsts = [
+        _time for _time in map(_first_delete, _delete_logs)
+        if _time is not None
+    ]
+    _first = min(_firsts) if _firsts else None
+    return {
+        "scenario": name,
+        "engine": engine,
+        "return_code": os.WEXITSTATUS(_status),
+        "seconds": round(_duration, 3),
+        "first_delete_seconds": round(_first - _started, 3)
+        if _first is not None else None,
+        "expected": _expected(name, _values),
+        "swept": _swept,
+        "items_per_second": round(_swept / _duration, 1),
+        # kilobytes on Linux
+        "peak_rss_kb": _usage.ru_maxrss,
+        "spawns": _count_lines(_spawn_log, "."),
+        "cpu_seconds": round(_usage.ru_utime + _usage.ru_stime, 3)
+    }
+
+
+def print_results(results):
+    _columns = (
+        ("scenario", "{:<8}"),
+        ("engine", "{:<9}"),
+        ("return_code", "{:>3}"),
+        ("seconds", "{:>9}"),
+        ("first_delete_seconds", "{:>7}"),
+        ("swept", "{:>7}"),
+        ("expected", "{:>8}"),
+        ("items_per_second", "{:>9}"),
+        ("peak_rss_kb", "{:>9}"),
+        ("spawns", "{:>7}"),
+        ("cpu_seconds", "{:>8}")
+    )
+    _titles = ("scenario", "engine", "rc", "seconds", "first", "swept",
+               "expected", "items/s", "rss, kb", "spawns", "cpu, s")
+    print(" ".join(
+        _format.format(_title)
+        for (_, _format), _title in zip(_columns, _titles)
+    ))
+    for _result in results:
+        print(" ".join(
+            _format.format(
+                "-" if _result[_name] is None else _result[_name]
+            )
+            for _name, _format in _columns
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="run.py")
+    parser.add_argument(
+        "--scenarios",
+        default="flat,batch,python,tree,raw,table,value,paged,pipeline,"
+                "sections,prefetch,targets",
+        help="Comma separated scenarios to run"
+    )
+    parser.add_argument(
+        "--engines",
+        default="blocking,session,asyncio",
+        help="Comma separated engines to run each scenario with"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        help="Multiplier of listing sizes"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Sweep commands executed at once"
+    )
+    parser.add_argument(
+        "--startup",
+        type=float,
+        default=0.05,
+        help="Seconds for fake CLI to start"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Seconds for each fake API call"
+    )
+    parser.add_argument(
+        "--fail-rate",
+        type=float,
+        default=0.0,
+        help="Share of failed deletes, 0..1"
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Python to run sweeper and fake CLI with"
+    )
+    parser.add_argument(
+        "--json",
+        default=None,
+        help="Save results to a file as JSON"
+    )
+    parser.add_argument(
+        "--keep-files",
+        action="store_true",
+        default=False,
+        help="Keep generated profiles, logs and metrics of each run"
+    )
+    options = parser.parse_args()
+
+    _folder = tempfile.mkdtemp(prefix="janitor-bench-")
+    _cli = write_cli(_folder, options.python)
+    _results = []
+    try:
+        for _name in options.scenarios.split(","):
+            for _engine in options.engines.split(","):
+                _result = run_scenario(_name, _engine, _folder, _cli, options)
+                _results.append(_result)
+                print("{} ({}): {}s, rc={}".format(
+                    _name,
+                    _engine,
+                    _result["seconds"],
+                    _result["return_code"]
+                ), file=sys.stderr)
+    finally:
+        if options.keep_files:
+            print("Files kept in '{}'".format(_folder), file=sys.stderr)
+        else:
+            shutil.rmtree(_folder)
+
+    print_results(_results)
+    if options.json is not None:
+        with open(options.json, "w") as _file:
+            json.dump(_results, _file, indent=2)
+    return 1 if any(_r["return_code"] != 0 for _r in _results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
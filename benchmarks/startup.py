@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+Startup time of cheap sweeper invocations, the ones done by scripts
+and shell completion.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 50 --limit 100 --json startup.json
+
+Cases:
+    python      interpreter alone, the floor for others
+    import      'import janitor.sweeper', as library users do
+    list        'sweep.py --list-sections' of a small profile
+    stat        'sweep.py --stat-only', one listing of fake CLI
+                that answers at once
+
+Each case runs '--runs' times, minimum, median and maximum of
+wall time are reported in milliseconds. With '--limit' return code
+is 1 when median of 'list' or 'stat' is above it. Import of the
+package should not create sweeper log, this is checked as well.
+
+Modules are expected to be compiled already; with
+PYTHONDONTWRITEBYTECODE set each run compiles the package again
+and times are about twice as long.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from run import root_dir, sweep_script, write_cli
+
+_profile = """[sweeper]
+banner = "Benchmark: startup"
+presort_sections = True
+common_filter = ^tempest-
+retry = 1
+timeout = 10
+concurrency = 1
+default_protected_run = False
+default_format_parser = json
+default_filter_field = Name
+
+[01-Servers]
+list_action = {cli} list server --count 20 --keep 2
+key = ID
+sweep_action = {cli} delete {{}}
+
+[02-Volumes]
+depends_on = 01-Servers
+list_action = {cli} list volume --count 20 --keep 2
+key = ID
+sweep_action = {cli} delete {{}}
+"""
+
+# cases checked against '--limit'
+_limited = ("list", "stat")
+
+
+def _cases(python, profile):
+    return (
+        ("python", [python, "-c", "pass"]),
+        ("import", [python, "-c", "import janitor.sweeper"]),
+        ("list", [python, sweep_script, "--list-sections", profile]),
+        ("stat", [python, sweep_script, "--stat-only", "--section",
+                  "01-Servers", profile])
+    )
+
+
+def _log_files(folder):
+    return set(
+        _name for _name in os.listdir(folder) if _name.endswith(".log")
+    )
+
+
+def run_case(name, argv, runs, folder, env):
+    """
+    Run command 'runs' times
+
+    :return: dict of results
+    """
+    _times = []
+    _rc = 0
+    with open(os.devnull, "w") as _null:
+        for _ in range(runs):
+            _started = time.time()
+            _rc = max(_rc, subprocess.call(
+                argv,
+                stdout=_null,
+                stderr=_null,
+                cwd=folder,
+                env=env
+            ))
+            _times.append((time.time() - _started) * 1000)
+    _times.sort()
+    return {
+        "case": name,
+        "return_code": _rc,
+        "runs": runs,
+        "min_ms": round(_times[0], 1),
+        "median_ms": round(_times[len(_times) // 2], 1),
+        "max_ms": round(_times[-1], 1)
+    }
+
+
+def print_results(results):
+    _columns = (
+        ("case", "{:<8}"),
+        ("return_code", "{:>3}"),
+        ("runs", "{:>5}"),
+        ("min_ms", "{:>8}"),
+        ("median_ms", "{:>8}"),
+        ("max_ms", "{:>8}")
+    )
+    _titles = ("case", "rc", "runs", "min, ms", "med, ms", "max, ms")
+    print(" ".join(
+        _format.format(_title)
+        for (_, _format), _title in zip(_columns, _titles)
+    ))
+    for _result in results:
+        print(" ".join(
+            _format.format(_result[_name]) for _name, _format in _columns
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="startup.py")
+    parser.add_argument(
+        "--cases",
+        default="python,import,list,stat",
+        help="Comma separated cases to run"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=20,
+        help="Runs of each case"
+    )
+    parser.add_argument(
+        "--limit",
+        type=float,
+        default=None,
+        help="Milliseconds, median of 'list' and 'stat' should be below"
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Python to run sweeper and fake CLI with"
+    )
+    parser.add_argument(
+        "--json",
+        default=None,
+        help="Save results to a file as JSON"
+    )
+    options = parser.parse_args()
+
+    _folder = tempfile.mkdtemp(prefix="janitor-startup-")
+    _cli = write_cli(_folder, options.python)
+    _profile_path = os.path.join(_folder, "startup.profile")
+    with open(_profile_path, "w") as _file:
+        _file.write(_profile.format(cli=_cli))
+    _env = dict(os.environ)
+    _env.update({
+        "PYTHONPATH": root_dir,
+        "FAKECLI_STARTUP": "0",
+        "FAKECLI_LATENCY": "0"
+    })
+
+    _package_dir = os.path.join(root_dir, "janitor")
+    _results = []
+    _failed = False
+    try:
+        for _name, _argv in _cases(options.python, _profile_path):
+            if _name not in options.cases.split(","):
+                continue
+            _logs = _log_files(_package_dir)
+            _result = run_case(_name, _argv, options.runs, _folder, _env)
+            _results.append(_result)
+            if _name == "import" and _log_files(_package_dir) != _logs:
+                print("import: log file created", file=sys.stderr)
+                _failed = True
+            if options.limit is not None and _name in _limited \
+                    and _result["median_ms"] > options.limit:
+                print("{}: median {}ms is above {}ms".format(
+                    _name,
+                    _result["median_ms"],
+                    options.limit
+                ), file=sys.stderr)
+                _failed = True
+    finally:
+        shutil.rmtree(_folder)
+
+    print_results(_results)
+    if options.json is not None:
+        with open(options.json, "w") as _file:
+            json.dump(_results, _file, indent=2)
+    if _failed or any(_r["return_code"] != 0 for _r in _results):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
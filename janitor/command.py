@@ -0,0 +1,313 @@
+import re
+import string
+
+from pyaction import is_python_action
+from utils.exception import CommandInvalid
+
+# operators that chain steps of a command,
+# step after '&&' runs only if previous one succeeded
+chain_any = ";"
+chain_success = "&&"
+
+_blanks = " \t\r\n"
+# chars that keep special meaning after backslash in double quotes
+_double_quote_escapes = "\\\"$`"
+_find_unsafe = re.compile(r"[^\w@%+=:,./-]").search
+_formatter = string.Formatter()
+
+
+def quote_word(word):
+    # word as shell reads it, quoted only if needed
+    if not word:
+        return "''"
+    if _find_unsafe(word) is None:
+        return word
+    return "'" + word.replace("'", "'\"'\"'") + "'"
+
+
+def split_command(line):
+    """
+    Split command line into words of its steps, quotes and backslash
+    escapes are handled like shell does. Steps are chained by ';' and
+    '&&', there is no other shell syntax, no variables or pipes.
+
+    :param line: command line
+    :return: list of (operator, words), operator of the first step is None
+    """
+    _steps = []
+    _words = []
+    _word = []
+    _in_word = False
+    _operator = None
+    _index = 0
+    _length = len(line)
+    while _index < _length:
+        _char = line[_index]
+        if _char in _blanks:
+            if _in_word:
+                _words.append("".join(_word))
+                _word = []
+                _in_word = False
+        elif _char == "'":
+            _end = line.find("'", _index + 1)
+            if _end < 0:
+                raise CommandInvalid(line, "no closing quote")
+            _word.append(line[_index + 1:_end])
+            _in_word = True
+            _index = _end
+        elif _char == '"':
+            _index += 1
+            while _index < _length and line[_index] != '"':
+                if line[_index] == "\\" and _index + 1 < _length \
+                        and line[_index + 1] in _double_quote_escapes:
+                    _index += 1
+                _word.append(line[_index])
+                _index += 1
+            if _index >= _length:
+                raise CommandInvalid(line, "no closing quote")
+            _in_word = True
+        elif _char == "\\":
+            _index += 1
+            if _index < _length and line[_index] != "\n":
+                _word.append(line[_index])
+                _in_word = True
+        elif _char == chain_any or line.startswith(chain_success, _index):
+            if _in_word:
+                _words.append("".join(_word))
+                _word = []
+                _in_word = False
+            _next = chain_any if _char == chain_any else chain_success
+            if not _words:
+                raise CommandInvalid(
+                    line,
+                    "nothing to run before '{}'".format(_next)
+                )
+            _steps.append((_operator, _words))
+            _words = []
+            _operator = _next
+            _index += len(_next) - 1
+        else:
+            _word.append(_char)
+            _in_word = True
+        _index += 1
+
+    if _in_word:
+        _words.append("".join(_word))
+    if _words:
+        _steps.append((_operator, _words))
+    elif _operator == chain_success:
+        raise CommandInvalid(line, "nothing to run after '&&'")
+    return _steps
+
+
+def join_command(steps):
+    """
+    Command line of the steps, quoted so it splits back to same words
+
+    :param steps: list of (operator, words)
+    :return: command line
+    """
+    _parts = []
+    for _operator, _words in steps:
+        if _operator == chain_any:
+            _parts.append(";")
+        elif _operator == chain_success:
+            _parts.append(" &&")
+        if _parts:
+            _parts.append(" ")
+        _parts.append(" ".join(quote_word(_word) for _word in _words))
+    return "".join(_parts)
+
+
+class Command(str):
+    """
+    Command line that has its steps already split,
+    engines run the steps without parsing the line again
+
+    :param steps: list of (operator, words)
+    :param line: command line of the steps, if it is known already
+    """
+    def __new__(cls, steps, line=None):
+        _command = str.__new__(
+            cls,
+            join_command(steps) if line is None else line
+        )
+        _command.steps = steps
+        return _command
+
+
+def get_steps(cmd):
+    """
+    Steps of the command, a line that is not compiled is split now
+
+    :param cmd: Command or command line
+    :return: list of (operator, words)
+    """
+    if isinstance(cmd, Command):
+        return cmd.steps
+    return split_command(cmd)
+
+
+def is_step_skipped(operator, results):
+    # '&&' step runs only after success of the previous one that ran
+    return operator == chain_success and bool(results) \
+        and results[-1][2] != 0
+
+
+def join_results(results):
+    """
+    Result of a chain is output and errors of its steps,
+    return code is the one of the last step that ran
+
+    :param results: list of (output, error, return code) of steps run
+    :return: tuple of output, error, return code
+    """
+    if len(results) == 1:
+        return results[0]
+    return (
+        "".join(_result[0] or "" for _result in results),
+        "".join(_result[1] or "" for _result in results),
+        results[-1][2]
+    )
+
+
+def split_variables(template):
+    """
+    Split off variables, declared as 'cmd {0} {1}:item.a.key,item.b.key'
+
+    :param template: action template from profile
+    :return: format string and tuple of variables, None if none declared
+    """
+    _format, _, _variables = template.rpartition(":")
+    if not _format or not _variables.strip().startswith("item."):
+        return template, None
+    return _format, tuple(
+        _variable.strip() for _variable in _variables.split(",")
+    )
+
+
+def _compile_slot(word, auto):
+    # fields get explicit numbers, as auto numbering goes through
+    # whole template and not a single word; word that is just a field
+    # is the number of its value
+    _parts = []
+    _fields = []
+    for _literal, _field, _spec, _conversion in _formatter.parse(word):
+        _parts.append(_literal.replace("{", "{{").replace("}", "}}"))
+        if _field is None:
+            continue
+        if _field == "" or _field[0] in ".[":
+            _field = str(auto[0]) + _field
+            auto[0] += 1
+        _fields.append(_field)
+        _parts.append("{" + _field)
+        if _conversion:
+            _parts.append("!" + _conversion)
+        if _spec:
+            _parts.append(":" + _spec)
+        _parts.append("}")
+    _format = "".join(_parts)
+    if len(_fields) == 1 and _fields[0].isdigit() \
+            and _format == "{" + _fields[0] + "}":
+        return int(_fields[0])
+    return _format
+
+
+class CommandTemplate(object):
+    """
+    Action template compiled once for a section,
+    each item only fills its slots. 'cmd {}' takes item value,
+    'cmd {0} {1}:item.a.key,item.b.key' takes values of item
+    and its parents from item cache.
+
+    :param template: action template from profile
+    """
+    __slots__ = ("template", "format_string", "variables", "steps",
+                 "line_format")
+
+    def __init__(self, template):
+        self.template = template
+        self.format_string, self.variables = split_variables(template)
+        self.steps = None
+        self.line_format = None
+        if is_python_action(template):
+            # 'python:' actions split own arguments
+            return
+
+        # each step is operator, its words and slots, slot is position
+        # of a word with braces and its compiled form
+        self.steps = []
+        _auto = [0]
+        _line = []
+        for _operator, _words in split_command(self.format_string):
+            _slots = []
+            _quoted = []
+            for _position, _word in enumerate(_words):
+                if "{" not in _word and "}" not in _word:
+                    _quoted.append(
+                        quote_word(_word).replace("{", "{{").replace("}", "}}")
+                    )
+                    continue
+                _slot = _compile_slot(_word, _auto)
+                _slots.append((_position, _slot))
+                if _line is not None and isinstance(_slot, int):
+                    _quoted.append("{" + str(_slot) + "}")
+                else:
+                    # quoting of the word depends on values in it
+                    _line = None
+            self.steps.append((_operator, _words, _slots))
+            if _line is not None:
+                _line.append(join_command([(_operator, [])]))
+                _line.append(" ".join(_quoted))
+        if _line is not None:
+            # words that are single value each, line is formatted at once
+            self.line_format = "".join(_line)
+
+    def render(self, value, cache=None, chunk=False):
+        """
+        Command for the item value or a chunk of values
+
+        :param value: item value, values of a chunk joined by space
+        :param cache: DataCache of the item, needed for variables
+        :param chunk: value is a chunk, each value is own argument
+        :return: Command, or command line for 'python:' actions
+        """
+        if self.variables is not None:
+            _args = tuple(cache.__getattr__(_var) for _var in self.variables)
+        else:
+            _args = (value,)
+        if self.steps is None:
+            return self.format_string.format(*_args)
+
+        if self.line_format is not None and not chunk:
+            _values = [str(_arg) for _arg in _args]
+            _steps = []
+            for _operator, _words, _slots in self.steps:
+                _argv = list(_words)
+                for _position, _index in _slots:
+                    _argv[_position] = _values[_index]
+                _steps.append((_operator, _argv))
+            return Command(_steps, line=self.line_format.format(
+                *[quote_word(_value) for _value in _values]
+            ))
+
+        # values of a chunk are separate arguments
+        _steps = []
+        for _operator, _words, _slots in self.steps:
+            _argv = []
+            _slots = dict(_slots)
+            for _position, _word in enumerate(_words):
+                if _position not in _slots:
+                    _argv.append(_word)
+                    continue
+                _slot = _slots[_position]
+                if isinstance(_slot, int):
+                    _filled = str(_args[_slot])
+                else:
+                    _filled = _slot.format(*_args)
+                if chunk:
+                    _argv.extend(_filled.split())
+                else:
+                    _argv.append(_filled)
+            _steps.append((_operator, _argv))
+        return Command(_steps)
@@ -1,7 +1,21 @@
 import utils
 
 utils = utils
-logger, logger_cli = utils.logger.setup_loggers(
-    "janitor",
-    log_fname=utils.config.sweeper.get_logfile_path()
-)
+logger, logger_cli = utils.logger.setup_loggers("janitor")
+
+_file_handler = None
+
+
+def setup_file_log(log_fname=None):
+    """
+    Send log to file, by default the one set in 'etc/janitor.conf'.
+    Nothing is written to disk until this is called.
+
+    :param log_fname: log file name
+    """
+    global _file_handler
+    if _file_handler is not None:
+        return
+    if log_fname is None:
+        log_fname = utils.config.get_sweeper_config().get_logfile_path()
+    _file_handler = utils.logger.add_file_handler(logger, log_fname)
@@ -0,0 +1,348 @@
+import errno
+import json
+import logging
+import os
+import Queue
+import socket
+import threading
+import traceback
+
+from common import logger, logger_cli
+from utils.exception import DaemonRequestFailed, SweeperException
+
+# options that are used to build Sweeper, others are for a single run
+sweeper_options = (
+    "filter_regex",
+    "bash_action",
+    "concurrency",
+    "section_concurrency",
+    "process_budget",
+    "engine",
+    "metrics_json",
+    "metrics_prometheus"
+)
+
+# options with file names, made absolute by client
+path_options = (
+    "profile",
+    "plan",
+    "apply",
+    "journal",
+    "resume",
+    "metrics_json",
+    "metrics_prometheus"
+)
+
+_read_chunk_size = 65536
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message) + "\n")
+
+
+def _read_lines(connection):
+    # messages are JSON objects, one per line
+    _buffer = ""
+    while True:
+        _chunk = connection.recv(_read_chunk_size)
+        if not _chunk:
+            return
+        _buffer += _chunk
+        while "\n" in _buffer:
+            _line, _buffer = _buffer.split("\n", 1)
+            if _line.strip():
+                yield json.loads(_line)
+
+
+class _Job(object):
+    """
+    Queued run of a profile, shared by all requests with same options
+    """
+    def __init__(self, key, options):
+        self.key = key
+        self.options = options
+        self.subscribers = []
+
+
+class _ProgressHandler(logging.Handler):
+    """
+    Sends CLI log records to clients waiting for the running job
+    """
+    def __init__(self, daemon):
+        logging.Handler.__init__(self)
+        self.daemon = daemon
+
+    def emit(self, record):
+        self.daemon.publish({
+            "type": "log",
+            "level": record.levelno,
+            "message": record.getMessage()
+        })
+
+
+class SweeperDaemon(object):
+    """
+    Long living process that runs profiles on request from clients
+    connected to a Unix socket. Loaded profiles are kept along with
+    its engines, sessions and environment, and loaded again when
+    profile file changes. Runs are done one at a time, in order;
+    request for a run that is queued already joins it.
+
+    :param path: Unix socket path
+    :param factory: callable(options) that loads Sweeper for a profile
+    :param runner: callable(sweep, options) that does a run
+    """
+    def __init__(self, path, factory, runner):
+        self.path = path
+        self.factory = factory
+        self.runner = runner
+        self._sweepers = {}
+        self._queue = []
+        self._running = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._socket = None
+
+    @staticmethod
+    def _get_key(options):
+        return json.dumps(options, sort_keys=True)
+
+    def publish(self, message):
+        with self._condition:
+            _subscribers = list(self._running.subscribers) \
+                if self._running is not None else []
+        for _queue in _subscribers:
+            _queue.put(message)
+
+    def submit(self, options):
+        """
+        Queue a run, or join the queued one with same options
+
+        :param options: dict of CLI options of the run
+        :return: Queue that gets progress messages and the result
+        """
+        _key = self._get_key(options)
+        _messages = Queue.Queue()
+        with self._condition:
+            for _job in self._queue:
+                if _job.key == _key:
+                    logger.info("Request joined queued run of '{}'".format(
+                        options["profile"]
+                    ))
+                    _job.subscribers.append(_messages)
+                    return _messages
+            _ahead = len(self._queue) + (1 if self._running else 0)
+            _job = _Job(_key, options)
+            _job.subscribers.append(_messages)
+            self._queue.append(_job)
+            self._condition.notify_all()
+        _messages.put({
+            "type": "log",
+            "level": logging.DEBUG,
+            "message": "# Queued, {} runs ahead".format(_ahead)
+        })
+        return _messages
+
+    def _get_sweeper(self, options):
+        # loaded profile is reused while its file is not changed
+        _profile = options["profile"]
+        _mtime = os.stat(_profile).st_mtime
+        _options = dict(
+            (_name, options.get(_name)) for _name in sweeper_options
+        )
+        _options["profile"] = _profile
+        _key = self._get_key(_options)
+        # status requests read loaded sweepers from other threads
+        with self._condition:
+            _cached = self._sweepers.get(_key)
+        if _cached is not None and _cached[0] == _mtime:
+            _cached[1].reset()
+            return _cached[1]
+        if _cached is not None:
+            logger_cli.info("# Profile '{}' changed, loading it again".format(
+                _profile
+            ))
+            _cached[1].engine.close()
+        _sweep = self.factory(options)
+        with self._condition:
+            self._sweepers[_key] = (_mtime, _sweep)
+        return _sweep
+
+    def _run_job(self, job):
+        _result = {"type": "result", "error": None, "rc": 0}
+        try:
+            _sweep = self._get_sweeper(job.options)
+            self.runner(_sweep, job.options)
+            _result["rc"] = _sweep.last_return_code
+        except (SweeperException, OSError, IOError) as e:
+            logger.error(traceback.format_exc())
+            _result["error"] = str(e)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            _result["error"] = "{}: {}".format(e.__class__.__name__, e)
+        return _result
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait(0.5)
+                if self._stopped:
+                    return
+                self._running = self._queue.pop(0)
+            logger.info("Run of '{}' started for {} requests".format(
+                self._running.options["profile"],
+                len(self._running.subscribers)
+            ))
+            _result = self._run_job(self._running)
+            with self._condition:
+                _job, self._running = self._running, None
+            for _messages in _job.subscribers:
+                _messages.put(_result)
+
+    def _status(self):
+        with self._condition:
+            return {
+                "type": "result",
+                "error": None,
+                "running": self._running.options["profile"]
+                if self._running else None,
+                "queued": [_job.options["profile"] for _job in self._queue],
+                "loaded": sorted(set(
+                    _sweep.profilepath
+                    for _, _sweep in self._sweepers.values()
+                ))
+            }
+
+    def _serve(self, connection):
+        try:
+            for _request in _read_lines(connection):
+                _command = _request.get("command")
+                if _command == "run":
+                    _messages = self.submit(_request["options"])
+                    while True:
+                        _message = _messages.get()
+                        _send(connection, _message)
+                        if _message["type"] == "result":
+                            break
+                elif _command == "status":
+                    _send(connection, self._status())
+                elif _command == "stop":
+                    _send(connection, {"type": "result", "error": None})
+                    self.stop()
+                else:
+                    _send(connection, {
+                        "type": "result",
+                        "error": "Unknown command '{}'".format(_command)
+                    })
+        except (socket.error, ValueError) as e:
+            # client is gone, its run goes on for others
+            logger.warn("Client connection failed: {}".format(e))
+        finally:
+            connection.close()
+
+    def _bind(self):
+        if os.path.exists(self.path):
+            _probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                _probe.connect(self.path)
+            except socket.error:
+                # left by daemon that is not running anymore
+                os.remove(self.path)
+            else:
+                _probe.close()
+                raise DaemonRequestFailed(
+                    self.path,
+                    "another daemon is listening"
+                )
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the owner could connect
+        _umask = os.umask(0o077)
+        try:
+            self._socket.bind(self.path)
+        finally:
+            os.umask(_umask)
+        self._socket.listen(16)
+        self._socket.settimeout(0.5)
+
+    def _accept(self):
+        # connections are served in own threads, runs wait in queue
+        try:
+            while not self._stopped:
+                try:
+                    _connection, _ = self._socket.accept()
+                except socket.timeout:
+                    continue
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                _connection.settimeout(None)
+                _thread = threading.Thread(
+                    target=self._serve,
+                    args=(_connection,)
+                )
+                _thread.daemon = True
+                _thread.start()
+        except Exception:
+            logger.error(traceback.format_exc())
+            logger_cli.error("# Daemon can't accept requests, stopping")
+            self.stop()
+
+    def serve_forever(self):
+        """
+        Accept requests until stopped or interrupted
+        """
+        self._bind()
+        _handler = _ProgressHandler(self)
+        logger_cli.addHandler(_handler)
+        _acceptor = threading.Thread(target=self._accept)
+        _acceptor.daemon = True
+        _acceptor.start()
+        logger_cli.info("# Listening on '{}'".format(self.path))
+        try:
+            # runs are done in main thread, so Ctrl-C interrupts them
+            self._worker()
+        finally:
+            self.stop()
+            _acceptor.join()
+            self._socket.close()
+            os.remove(self.path)
+            logger_cli.removeHandler(_handler)
+            with self._condition:
+                _sweepers = self._sweepers.values()
+            for _, _sweep in _sweepers:
+                _sweep.engine.close()
+            logger_cli.info("# Daemon stopped")
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+def request(path, message):
+    """
+    Send request to daemon, CLI log messages are printed as they come
+
+    :param path: Unix socket path
+    :param message: request dict
+    :return: result message
+    """
+    _connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        _connection.connect(path)
+    except socket.error as e:
+        raise DaemonRequestFailed(path, e)
+    try:
+        _send(_connection, message)
+        for _message in _read_lines(_connection):
+            if _message["type"] == "log":
+                logger_cli.log(_message["level"], _message["message"])
+            elif _message["type"] == "result":
+                if _message.get("error"):
+                    raise DaemonRequestFailed(path, _message["error"])
+                return _message
+    finally:
+        _connection.close()
+    raise DaemonRequestFailed(path, "daemon closed connection")
@@ -0,0 +1,588 @@
+import os
+import threading
+
+from subprocess import Popen, PIPE
+from time import sleep, time
+
+from command import get_steps, is_step_skipped, join_command, join_results
+from common import logger
+from pyaction import PythonActions, is_python_action
+from retry import RetryPolicy, permanent, retryable
+from session import CLISession, SessionPool
+from utils.exception import EngineNotAvailable, FailedToOpenProcess
+from utils.pool import ordered_map
+
+timeout_return_code = -9
+stream_chunk_size = 65536
+
+
+class ActionContext(object):
+    """
+    Section details that engine needs to run its commands
+
+    :param section: section name
+    :param level: action_map level name, section name if there is no map
+    :param action: 'list' or 'sweep'
+    :param service: service tag for rate limits
+    :param environment: PrimedEnvironment for processes, None is current
+    """
+    __slots__ = ("section", "level", "action", "service", "environment")
+
+    def __init__(
+            self,
+            section=None,
+            level=None,
+            action=None,
+            service=None,
+            environment=None
+    ):
+        self.section = section
+        self.level = level
+        self.action = action
+        self.service = service
+        self.environment = environment
+
+    def get_env(self):
+        if self.environment is None:
+            return None
+        return self.environment.get()
+
+
+default_context = ActionContext()
+
+
+def counting(consumer, counter):
+    # consumer that counts bytes passed through it
+    def _consume(chunk):
+        counter[0] += len(chunk)
+        consumer(chunk)
+    return _consume
+
+
+def log_process_result(pid, cmd, output, error, rc):
+    logger.debug(
+        "process [{}] '{}' returned\n"
+        "--- start output ---\n{}\n--- end output ---\n"
+        "Error: '{}'\n"
+        "Return code: {}".format(
+            pid,
+            cmd,
+            output,
+            error,
+            rc
+        )
+    )
+
+
+class ProcessEngine(object):
+    """
+    Base class for engines that execute action commands.
+    Engine is the single place where process limits and retries applied.
+    Failed commands are not retried right away, they are put into
+    a queue that is drained after all of the commands had its first run.
+
+    :param process_budget: max processes running at once, 0 is no limit
+    :param timeout: seconds before process is killed, 0 is no timeout
+    :param retry_policy: RetryPolicy instance, no retries if None
+    :param rate_limiter: RateLimiter instance, no limits if None
+    :param python_actions: PythonActions instance for 'python:' actions
+    :param metrics: MetricsCollector instance, None is no metrics
+    """
+    name = None
+    # stream consumer could wait, output is read by the calling thread
+    consumer_may_block = True
+
+    def __init__(
+            self,
+            process_budget=0,
+            timeout=0,
+            retry_policy=None,
+            rate_limiter=None,
+            python_actions=None,
+            metrics=None
+    ):
+        self.process_budget = process_budget
+        self.timeout = timeout
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        if python_actions is None:
+            python_actions = PythonActions()
+        self.python_actions = python_actions
+        self.metrics = metrics
+        self._cancelled = False
+
+    def _reserve(self, context):
+        # seconds to wait for the service rate limit
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.reserve(context.service)
+
+    def _record(self, context, result):
+        # errors that could mean overload tighten adaptive rate limit
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(
+                context.service,
+                self.retry_policy.classify(result[2], result[1]) == retryable
+            )
+
+    def _observe(self, context, queued, started, result, output_bytes):
+        if self.metrics is None:
+            return
+        if output_bytes is None:
+            _output = result[0]
+            output_bytes = len(_output) if isinstance(_output, str) else 0
+        self.metrics.observe_command(
+            context,
+            time() - started,
+            started - queued,
+            result[2],
+            output_bytes
+        )
+
+    def execute(self, cmd, retry=False, context=None):
+        """
+        Execute single command and wait for it
+
+        :param cmd: command string
+        :param retry: retry failed command
+        :param context: ActionContext of the command section
+        :return: tuple of output, error, return code
+        """
+        return self.execute_many([cmd], retry=retry, context=context)[0]
+
+    def execute_stream(self, cmd, consumer, capture_limit=0, context=None,
+                       use_budget=True):
+        """
+        Execute single command, passing its output to consumer
+        by chunks as soon as it is read
+
+        :param cmd: command string
+        :param consumer: callable that gets each chunk of output
+        :param capture_limit: bytes of output to keep for logging
+        :param context: ActionContext of the command section
+        :param use_budget: command takes a slot of 'process_budget',
+                           consumer that waits for other commands
+                           should not hold one
+        :return: tuple of captured output, error, return code
+        """
+        raise NotImplementedError
+
+    def execute_many(
+            self,
+            cmds,
+            concurrency=1,
+            retry=False,
+            context=None,
+            on_result=None
+    ):
+        """
+        Execute commands with up to 'concurrency' at once
+
+        :param cmds: list of command strings
+        :param concurrency: number of commands running at once
+        :param retry: retry failed commands
+        :param context: ActionContext of the command section
+        :param on_result: callable(cmd, result) called as soon as
+                          each run of a command is finished
+        :return: list of (output, error, return code) in order of 'cmds'
+        """
+        _results = self._execute_batch(cmds, concurrency, context, on_result)
+        if retry:
+            self._drain_retries(
+                cmds,
+                _results,
+                concurrency,
+                context,
+                on_result
+            )
+        return _results
+
+    def _execute_batch(self, cmds, concurrency, context=None,
+                       on_result=None):
+        """
+        Execute commands once with up to 'concurrency' at once
+
+        :return: list of (output, error, return code) in order of 'cmds'
+        """
+        raise NotImplementedError
+
+    def _defer(self, queue, index, attempt, result):
+        _policy = self.retry_policy
+        _failure = _policy.classify(result[2], result[1])
+        if _failure is None:
+            return
+        elif _failure == permanent:
+            logger.debug("Permanent failure ({}), no retries: {}".format(
+                result[2],
+                result[1]
+            ))
+            return
+        elif attempt > _policy.retry_count:
+            return
+
+        _delay = _policy.get_delay(attempt, _failure)
+        queue.append((time() + _delay / 1000, index, attempt))
+
+    def _drain_retries(self, cmds, results, concurrency, context=None,
+                       on_result=None):
+        # retry failed commands in rounds, all due ones at once
+        _queue = []
+        for _index, _result in enumerate(results):
+            self._defer(_queue, _index, 1, _result)
+
+        while _queue and not self._cancelled:
+            _queue.sort()
+            _wait = _queue[0][0] - time()
+            if _wait > 0:
+                sleep(_wait)
+
+            _now = time()
+            _due = [_item for _item in _queue if _item[0] <= _now]
+            _queue = [_item for _item in _queue if _item[0] > _now]
+            logger.warn(
+                "Retrying {} failed commands, {} more in queue".format(
+                    len(_due),
+                    len(_queue)
+                )
+            )
+
+            _results = self._execute_batch(
+                [cmds[_index] for _, _index, _ in _due],
+                concurrency,
+                context,
+                on_result
+            )
+            for (_, _index, _attempt), _result in zip(_due, _results):
+                if self.metrics is not None:
+                    self.metrics.observe_retry(context or default_context)
+                results[_index] = _result
+                self._defer(_queue, _index, _attempt + 1, _result)
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def reset(self):
+        """
+        Make cancelled engine usable for the next run
+        """
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop all commands in progress
+        """
+        raise NotImplementedError
+
+    def close(self):
+        self.python_actions.close()
+
+
+class BlockingEngine(ProcessEngine):
+    """
+    Default engine, each command blocks calling thread.
+    Concurrency is handled by a thread pool.
+    """
+    name = "blocking"
+
+    def __init__(self, **kwargs):
+        super(BlockingEngine, self).__init__(**kwargs)
+        if self.process_budget > 0:
+            self._budget = threading.BoundedSemaphore(self.process_budget)
+        else:
+            self._budget = None
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_stream(process, consumer, capture_limit):
+        # stderr is read in background to not block the process
+        _err = []
+        _err_reader = threading.Thread(
+            target=lambda: _err.append(process.stderr.read())
+        )
+        _err_reader.daemon = True
+        _err_reader.start()
+
+        _captured = []
+        _captured_size = 0
+        while True:
+            _chunk = os.read(process.stdout.fileno(), stream_chunk_size)
+            if not _chunk:
+                break
+            if _captured_size < capture_limit:
+                _captured.append(_chunk[:capture_limit - _captured_size])
+                _captured_size += len(_captured[-1])
+            consumer(_chunk)
+
+        process.wait()
+        _err_reader.join()
+        return "".join(_captured), "".join(_err)
+
+    def _run(self, cmd, consumer=None, capture_limit=0, context=None):
+        if self._cancelled:
+            return None, "Cancelled", timeout_return_code
+        if is_python_action(cmd):
+            # in process, output is structured data
+            return self.python_actions.call(cmd)
+
+        # chained steps run one after another, no shell is started
+        _results = []
+        for _operator, _argv in get_steps(cmd):
+            if is_step_skipped(_operator, _results):
+                continue
+            _results.append(
+                self._run_step(_argv, consumer, capture_limit, context)
+            )
+            if _results[-1][2] == timeout_return_code:
+                # cancelled or timed out, rest of the chain is dropped
+                break
+        if not _results:
+            raise FailedToOpenProcess(cmd, "nothing to run")
+        return join_results(_results)
+
+    def _run_step(self, argv, consumer=None, capture_limit=0, context=None):
+        if self._cancelled:
+            return None, "Cancelled", timeout_return_code
+
+        _cmd = join_command([(None, argv)])
+        _env = context.get_env()
+        try:
+            _process = Popen(argv, stdout=PIPE, stderr=PIPE, env=_env)
+        except OSError as e:
+            raise FailedToOpenProcess(_cmd, e.strerror)
+
+        with self._lock:
+            self._processes.add(_process)
+
+        _timer = None
+        _timed_out = []
+        if self.timeout > 0:
+            def _kill():
+                _timed_out.append(True)
+                _process.kill()
+            _timer = threading.Timer(self.timeout, _kill)
+            _timer.start()
+
+        try:
+            if consumer is None:
+                _output, _err = _process.communicate()
+            else:
+                _output, _err = self._read_stream(
+                    _process,
+                    consumer,
+                    capture_limit
+                )
+        except Exception:
+            _process.kill()
+            _process.wait()
+            raise
+        finally:
+            if _timer is not None:
+                _timer.cancel()
+            with self._lock:
+                self._processes.discard(_process)
+        _rc = _process.returncode
+
+        if _timed_out:
+            _err = "Timed out after {}s\n{}".format(self.timeout, _err)
+            _rc = timeout_return_code
+
+        # log it
+        log_process_result(_process.pid, _cmd, _output, _err, _rc)
+        return _output, _err, _rc
+
+    def _run_in_budget(self, cmd, consumer=None, capture_limit=0,
+                       context=None, use_budget=True):
+        if context is None:
+            context = default_context
+        _queued = time()
+        _bytes = None
+        if consumer is not None:
+            _bytes = [0]
+            consumer = counting(consumer, _bytes)
+        # rate limit wait does not hold a process slot
+        _delay = self._reserve(context)
+        if _delay > 0:
+            sleep(_delay)
+        if self._budget is None or not use_budget:
+            _started = time()
+            _result = self._run(cmd, consumer, capture_limit, context)
+        else:
+            with self._budget:
+                _started = time()
+                _result = self._run(cmd, consumer, capture_limit, context)
+        self._record(context, _result)
+        self._observe(
+            context,
+            _queued,
+            _started,
+            _result,
+            _bytes[0] if _bytes else None
+        )
+        return _result
+
+    def execute_stream(self, cmd, consumer, capture_limit=0, context=None,
+                       use_budget=True):
+        return self._run_in_budget(
+            cmd,
+            consumer,
+            capture_limit,
+            context,
+            use_budget=use_budget
+        )
+
+    def _execute_batch(self, cmds, concurrency, context=None,
+                       on_result=None):
+        def _execute(cmd):
+            _result = self._run_in_budget(cmd, context=context)
+            if on_result is not None:
+                on_result(cmd, _result)
+            return _result
+
+        return list(ordered_map(_execute, cmds, concurrency=concurrency))
+
+    def cancel(self):
+        self._cancelled = True
+        with self._lock:
+            for _process in self._processes:
+                try:
+                    _process.kill()
+                except OSError:
+                    pass
+
+
+class SessionEngine(BlockingEngine):
+    """
+    Engine that feeds commands of a declared CLI to its long living
+    interactive sessions, so CLI startup and auth are done once for
+    a session instead of once for each command.
+    Sections with own environment have own sessions, sessions are
+    restarted when its environment is refreshed.
+    Other commands are run as processes, just like in 'blocking' engine.
+
+    :param session_program: commands starting with it use sessions
+    :param session_cmd: command to start a session, default is program
+    :param session_marker: command that prints '{}' marker in a session
+    :param session_prompt: prompt printed by a session, if any
+    :param session_pool_size: sessions running at once
+    """
+    name = "session"
+
+    def __init__(
+            self,
+            session_program=None,
+            session_cmd=None,
+            session_marker="echo {}",
+            session_prompt=None,
+            session_pool_size=1,
+            **kwargs
+    ):
+        super(SessionEngine, self).__init__(**kwargs)
+        self.session_program = session_program
+        self.session_argv = (session_cmd or session_program or "").split()
+        self.session_marker = session_marker
+        self.session_prompt = session_prompt
+        self.session_pool_size = session_pool_size
+        # pool for each environment
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def _get_pool(self, environment):
+        with self._pools_lock:
+            if environment not in self._pools:
+                def _start():
+                    _generation = None
+                    _env = None
+                    if environment is not None:
+                        _generation = environment.generation
+                        _env = environment.get()
+                    _session = CLISession(
+                        self.session_argv,
+                        marker_cmd=self.session_marker,
+                        prompt=self.session_prompt,
+                        env=_env
+                    )
+                    _session.generation = _generation
+                    return _session
+
+                def _is_stale(session):
+                    return environment is not None \
+                        and session.generation != environment.generation
+
+                self._pools[environment] = SessionPool(
+                    _start,
+                    size=self.session_pool_size,
+                    is_stale=_is_stale
+                )
+            return self._pools[environment]
+
+    def _run_step(self, argv, consumer=None, capture_limit=0, context=None):
+        if self.session_program is None or argv[0] != self.session_program:
+            return super(SessionEngine, self)._run_step(
+                argv,
+                consumer,
+                capture_limit,
+                context
+            )
+        if self._cancelled:
+            return None, "Cancelled", timeout_return_code
+
+        # environment is refreshed before stale sessions are checked
+        context.get_env()
+        _output, _err, _rc = self._get_pool(context.environment).execute(
+            join_command([(None, argv[1:])]),
+            timeout=self.timeout,
+            consumer=consumer,
+            capture_limit=capture_limit
+        )
+        log_process_result(
+            "session",
+            join_command([(None, argv)]),
+            _output,
+            _err,
+            _rc
+        )
+        return _output, _err, _rc
+
+    def _close_pools(self):
+        with self._pools_lock:
+            _pools = self._pools.values()
+        for _pool in _pools:
+            _pool.close()
+
+    def cancel(self):
+        super(SessionEngine, self).cancel()
+        self._close_pools()
+
+    def close(self):
+        super(SessionEngine, self).close()
+        self._close_pools()
+
+
+_engines = {
+    BlockingEngine.name: BlockingEngine,
+    SessionEngine.name: SessionEngine
+}
+
+
+def get_engine(name, **kwargs):
+    """
+    Create execution engine by its name
+
+    :param name: 'blocking', 'session' or 'asyncio'
+    :return: ProcessEngine instance
+    """
+    if name == "asyncio" and name not in _engines:
+        try:
+            from engine_asyncio import AsyncioEngine
+        except ImportError as e:
+            raise EngineNotAvailable(name, e)
+        _engines[name] = AsyncioEngine
+
+    if name not in _engines:
+        raise EngineNotAvailable(name, "unknown engine")
+
+    return _engines[name](**kwargs)
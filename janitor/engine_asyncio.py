@@ -0,0 +1,313 @@
+import threading
+from time import time
+
+import trollius as asyncio
+
+from trollius import From, Return
+from trollius.subprocess import PIPE
+from trollius.unix_events import SafeChildWatcher
+
+from command import get_steps, is_step_skipped, join_command, join_results
+from common import logger
+from engine import ProcessEngine, counting, default_context
+from engine import log_process_result
+from engine import stream_chunk_size, timeout_return_code
+from pyaction import is_python_action
+from utils.exception import FailedToOpenProcess
+
+# seconds between checks of running processes for exit
+reap_interval = 0.005
+
+
+class PollingChildWatcher(SafeChildWatcher):
+    """
+    Child watcher that checks running processes from the loop thread.
+    On Python 2 SIGCHLD handler runs only in the main thread, which
+    mostly sleeps in waits for results, so exits were seen up to 50ms
+    late and processes were not started in their place meanwhile.
+
+    :param interval: seconds between checks, done only while processes run
+    """
+    def __init__(self, interval=reap_interval):
+        super(PollingChildWatcher, self).__init__()
+        self.interval = interval
+        self._timer = None
+
+    def attach_loop(self, loop):
+        # no signal handler, so loop could run in any thread
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._loop = loop
+        self._schedule()
+
+    def add_child_handler(self, pid, callback, *args):
+        super(PollingChildWatcher, self).add_child_handler(
+            pid,
+            callback,
+            *args
+        )
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None and self._callbacks \
+                and self._loop is not None:
+            self._timer = self._loop.call_later(self.interval, self._poll)
+
+    def _poll(self):
+        self._timer = None
+        self._do_waitpid_all()
+        self._schedule()
+
+
+class AsyncioEngine(ProcessEngine):
+    """
+    Engine that runs all commands as non-blocking subprocesses
+    on a single event loop, so hundreds of commands could be in flight
+    without a thread for each of them.
+    Loop runs in a background thread, calling threads just wait
+    for the results. Exits of processes are polled by the loop,
+    one engine at a time could run them.
+    """
+    name = "asyncio"
+    # consumer runs in the loop thread, waiting there stops all commands
+    consumer_may_block = False
+
+    def __init__(self, **kwargs):
+        super(AsyncioEngine, self).__init__(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        _watcher = PollingChildWatcher()
+        _watcher.attach_loop(self._loop)
+        asyncio.set_child_watcher(_watcher)
+
+        if self.process_budget > 0:
+            self._budget = asyncio.Semaphore(
+                self.process_budget,
+                loop=self._loop
+            )
+        else:
+            self._budget = None
+        self._processes = set()
+
+        self._thread = threading.Thread(target=self._loop.run_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @asyncio.coroutine
+    def _read_stream(self, process, consumer, capture_limit):
+        _err_reader = asyncio.ensure_future(
+            process.stderr.read(),
+            loop=self._loop
+        )
+
+        _captured = []
+        _captured_size = 0
+        while True:
+            _chunk = yield From(process.stdout.read(stream_chunk_size))
+            if not _chunk:
+                break
+            if _captured_size < capture_limit:
+                _captured.append(_chunk[:capture_limit - _captured_size])
+                _captured_size += len(_captured[-1])
+            consumer(_chunk)
+
+        _err = yield From(_err_reader)
+        yield From(process.wait())
+        raise Return(("".join(_captured), _err))
+
+    @asyncio.coroutine
+    def _run(self, cmd, consumer=None, capture_limit=0, context=None):
+        if self._cancelled:
+            raise Return((None, "Cancelled", timeout_return_code))
+        if is_python_action(cmd):
+            # in process, blocking calls are done in executor threads
+            _result = yield From(self._loop.run_in_executor(
+                None,
+                self.python_actions.call,
+                cmd
+            ))
+            raise Return(_result)
+
+        _env = None
+        if context.environment is not None:
+            # environment could run its script, not on the loop thread
+            _env = yield From(self._loop.run_in_executor(
+                None,
+                context.get_env
+            ))
+
+        # chained steps run one after another, no shell is started
+        _results = []
+        for _operator, _argv in get_steps(cmd):
+            if is_step_skipped(_operator, _results):
+                continue
+            _result = yield From(
+                self._run_step(_argv, _env, consumer, capture_limit)
+            )
+            _results.append(_result)
+            if _result[2] == timeout_return_code:
+                # cancelled or timed out, rest of the chain is dropped
+                break
+        if not _results:
+            raise FailedToOpenProcess(cmd, "nothing to run")
+        raise Return(join_results(_results))
+
+    @asyncio.coroutine
+    def _run_step(self, argv, env, consumer=None, capture_limit=0):
+        if self._cancelled:
+            raise Return((None, "Cancelled", timeout_return_code))
+
+        _cmd = join_command([(None, argv)])
+        try:
+            _process = yield From(asyncio.create_subprocess_exec(
+                *argv,
+                stdout=PIPE,
+                stderr=PIPE,
+                env=env,
+                loop=self._loop
+            ))
+        except OSError as e:
+            raise FailedToOpenProcess(_cmd, e.strerror)
+
+        self._processes.add(_process)
+        if consumer is None:
+            _communicate = _process.communicate()
+        else:
+            _communicate = self._read_stream(_process, consumer, capture_limit)
+        try:
+            if self.timeout > 0:
+                _output, _err = yield From(asyncio.wait_for(
+                    _communicate,
+                    self.timeout,
+                    loop=self._loop
+                ))
+            else:
+                _output, _err = yield From(_communicate)
+            _rc = _process.returncode
+        except asyncio.TimeoutError:
+            _process.kill()
+            yield From(_process.wait())
+            _output = None
+            _err = "Timed out after {}s".format(self.timeout)
+            _rc = timeout_return_code
+        except Exception:
+            # consumer failed to handle output
+            _process.kill()
+            yield From(_process.wait())
+            raise
+        finally:
+            self._processes.discard(_process)
+
+        # log it
+        log_process_result(_process.pid, _cmd, _output, _err, _rc)
+        raise Return((_output, _err, _rc))
+
+    @asyncio.coroutine
+    def _run_in_budget(self, cmd, consumer=None, capture_limit=0,
+                       context=None, use_budget=True):
+        if context is None:
+            context = default_context
+        _queued = time()
+        _bytes = None
+        if consumer is not None:
+            _bytes = [0]
+            consumer = counting(consumer, _bytes)
+        # rate limit wait does not hold a process slot
+        _delay = self._reserve(context)
+        if _delay > 0:
+            yield From(asyncio.sleep(_delay, loop=self._loop))
+        if self._budget is None or not use_budget:
+            _started = time()
+            _result = yield From(
+                self._run(cmd, consumer, capture_limit, context)
+            )
+        else:
+            with (yield From(self._budget)):
+                _started = time()
+                _result = yield From(
+                    self._run(cmd, consumer, capture_limit, context)
+                )
+        self._record(context, _result)
+        self._observe(
+            context,
+            _queued,
+            _started,
+            _result,
+            _bytes[0] if _bytes else None
+        )
+        raise Return(_result)
+
+    @asyncio.coroutine
+    def _execute(self, cmd, semaphore, context, on_result):
+        with (yield From(semaphore)):
+            _result = yield From(self._run_in_budget(cmd, context=context))
+        if on_result is not None:
+            on_result(cmd, _result)
+        raise Return(_result)
+
+    @asyncio.coroutine
+    def _execute_many(self, cmds, concurrency, context, on_result):
+        _semaphore = asyncio.Semaphore(max(concurrency, 1), loop=self._loop)
+        # tasks are created in order, so commands start in order
+        _tasks = [
+            asyncio.ensure_future(
+                self._execute(cmd, _semaphore, context, on_result),
+                loop=self._loop
+            )
+            for cmd in cmds
+        ]
+        _results = yield From(asyncio.gather(*_tasks, loop=self._loop))
+        raise Return(_results)
+
+    def _wait_for(self, coro):
+        # schedule coroutine on the loop thread and wait for it
+        _done = threading.Event()
+        _future = []
+
+        def _start():
+            _task = asyncio.ensure_future(coro, loop=self._loop)
+            _future.append(_task)
+            _task.add_done_callback(lambda f: _done.set())
+
+        self._loop.call_soon_threadsafe(_start)
+        # short waits keep calling thread interruptible
+        while not _done.wait(0.5):
+            pass
+        return _future[0].result()
+
+    def execute_stream(self, cmd, consumer, capture_limit=0, context=None,
+                       use_budget=True):
+        # consumer is called from the loop thread
+        return self._wait_for(self._run_in_budget(
+            cmd,
+            consumer,
+            capture_limit,
+            context,
+            use_budget=use_budget
+        ))
+
+    def _execute_batch(self, cmds, concurrency, context=None,
+                       on_result=None):
+        if not cmds:
+            return []
+        return list(self._wait_for(
+            self._execute_many(cmds, concurrency, context, on_result)
+        ))
+
+    def _kill_all(self):
+        for _process in list(self._processes):
+            try:
+                _process.kill()
+            except OSError:
+                pass
+
+    def cancel(self):
+        self._cancelled = True
+        self._loop.call_soon_threadsafe(self._kill_all)
+
+    def close(self):
+        logger.debug("Stopping event loop of '{}' engine".format(self.name))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        super(AsyncioEngine, self).close()
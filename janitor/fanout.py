@@ -0,0 +1,273 @@
+import ConfigParser
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import traceback
+from time import time
+
+from common import logger, logger_cli
+from utils.exception import TargetsInvalid
+from utils.file import write_str_to_file
+
+# seconds, main process waits for results in short steps to stay
+# interruptible
+_poll_interval = 0.5
+
+# errors of a target shown in summary, all of them are in the report
+_errors_shown = 5
+
+# set in target process by initializer
+_load = None
+_run = None
+_output_dir = None
+
+
+def read_targets(filename):
+    """
+    Read targets, each section is a target and its options are
+    environment variables set for it. Options of 'DEFAULT' section
+    are common to all targets.
+
+    :param filename: targets file
+    :return: list of (name, environment) pairs, in order of the file
+    """
+    _config = ConfigParser.RawConfigParser()
+    # variable names are case sensitive
+    _config.optionxform = str
+    try:
+        with open(filename) as _file:
+            _config.readfp(_file)
+    except (IOError, ConfigParser.Error) as e:
+        raise TargetsInvalid(filename, e)
+
+    _targets = []
+    for _name in _config.sections():
+        if os.sep in _name:
+            raise TargetsInvalid(
+                filename,
+                "target name '{}' has '{}' in it".format(_name, os.sep)
+            )
+        _targets.append((_name, dict(_config.items(_name))))
+    if not _targets:
+        raise TargetsInvalid(filename, "no targets found")
+    return _targets
+
+
+class _TargetFormatter(logging.Formatter):
+    # outputs of targets interleave, each line is marked with target
+    def __init__(self, target):
+        logging.Formatter.__init__(self, "%(message)s")
+        self.prefix = "[{}] ".format(target)
+
+    def format(self, record):
+        return "\n".join(
+            self.prefix + _line
+            for _line in logging.Formatter.format(self, record).split("\n")
+        )
+
+
+def _redirect_output(target):
+    # output of the target goes to own file or is marked with its name
+    for _handler in list(logger_cli.handlers):
+        logger_cli.removeHandler(_handler)
+    if _output_dir is not None:
+        _handler = logging.FileHandler(
+            os.path.join(_output_dir, "{}.log".format(target)),
+            mode="w"
+        )
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+    else:
+        _handler = logging.StreamHandler()
+        _handler.setFormatter(_TargetFormatter(target))
+    logger_cli.addHandler(_handler)
+
+
+def _init_target_process(load, run, output_dir):
+    global _load, _run, _output_dir
+    _load = load
+    _run = run
+    _output_dir = output_dir
+    # idle process is stopped by main one, interrupt is for targets
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _summarize(sweep, report):
+    # counts and errors of sections that were run
+    for _section in sweep.sweep_items_list:
+        if _section not in sweep.section_results:
+            continue
+        _summary = sweep.get_section_summary(_section)
+        for _error in _summary.pop("errors"):
+            _error["section"] = _section
+            report["errors"].append(_error)
+        _summary["section"] = _section
+        report["sections"].append(_summary)
+    report["return_code"] = sweep.last_return_code
+    if sweep.metrics is not None:
+        report["metrics"] = sweep.metrics.to_dict()
+
+
+def _run_target(target):
+    # body of target process, profile is loaded in its environment
+    _name, _environment = target
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    _redirect_output(_name)
+    os.environ.update(_environment)
+    _started = time()
+    _report = {
+        "target": _name,
+        "return_code": 0,
+        "sections": [],
+        "errors": [],
+        "metrics": None
+    }
+    sweep = None
+    try:
+        sweep = _load()
+        # metrics of targets go to the report, not to own files
+        sweep.metrics_json = None
+        sweep.metrics_prometheus = None
+        try:
+            _run(sweep)
+        finally:
+            sweep.engine.close()
+    except KeyboardInterrupt:
+        _report["errors"].append({"error": "interrupted"})
+    except Exception as e:
+        for line in traceback.format_exc().splitlines():
+            logger.error("{}: {}".format(_name, line))
+        logger_cli.error("ERROR: {}".format(getattr(e, "message", e)))
+        _report["errors"].append({"error": str(getattr(e, "message", e))})
+    if sweep is not None:
+        _summarize(sweep, _report)
+    if _report["return_code"] == 0 and _report["errors"]:
+        _report["return_code"] = 1
+    _report["duration"] = round(time() - _started, 3)
+    return _report
+
+
+def run_targets(targets, load, run, concurrency=4, output_dir=None):
+    """
+    Run profile for each target in own process, up to 'concurrency'
+    targets at once, and merge its results
+
+    :param targets: list of (name, environment) pairs
+    :param load: callable that returns Sweeper, called in target process
+                 once its environment is set
+    :param run: callable(sweep) that runs sections of the Sweeper
+    :param concurrency: targets running at once
+    :param output_dir: folder for output of each target, None is to
+                       print it marked with target name
+    :return: report dict
+    """
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    _started = time()
+    _pool = multiprocessing.Pool(
+        processes=max(1, min(concurrency, len(targets))),
+        initializer=_init_target_process,
+        initargs=(load, run, output_dir),
+        # fresh process for each target, environment is not carried over
+        maxtasksperchild=1
+    )
+    _results = {}
+    try:
+        _iterator = _pool.imap_unordered(_run_target, targets)
+        while len(_results) < len(targets):
+            try:
+                _result = _iterator.next(_poll_interval)
+            except multiprocessing.TimeoutError:
+                continue
+            _results[_result["target"]] = _result
+            logger_cli.info("# {}: done in {}s, rc {} ({}/{})".format(
+                _result["target"],
+                _result["duration"],
+                _result["return_code"],
+                len(_results),
+                len(targets)
+            ))
+        _pool.close()
+    except KeyboardInterrupt:
+        logger_cli.warn("\n# Interrupted, stopping targets")
+        _pool.terminate()
+        raise
+    finally:
+        _pool.join()
+
+    _report = {
+        "created": time(),
+        "duration": round(time() - _started, 3),
+        "targets": [_results[_name] for _name, _ in targets],
+        "total": {
+            "targets": len(targets),
+            "failed_targets": 0,
+            "listed": 0,
+            "matched": 0,
+            "swept": 0,
+            "failed": 0
+        }
+    }
+    _total = _report["total"]
+    for _result in _report["targets"]:
+        if _result["return_code"] != 0:
+            _total["failed_targets"] += 1
+        for _section in _result["sections"]:
+            for _name in ("listed", "matched", "swept", "failed"):
+                _total[_name] += _section[_name]
+    return _report
+
+
+def _first_line(text):
+    return (text or "").strip().split("\n")[0]
+
+
+def print_report(report):
+    """
+    Show counts and first errors of each target, then totals
+    """
+    logger_cli.info("\n### Targets")
+    for _result in report["targets"]:
+        _counts = dict(listed=0, matched=0, swept=0, failed=0)
+        for _section in _result["sections"]:
+            for _name in _counts:
+                _counts[_name] += _section[_name]
+        logger_cli.info(
+            "# {}: rc {}, listed {listed}, matched {matched}, "
+            "swept {swept}, failed {failed}, {}s".format(
+                _result["target"],
+                _result["return_code"],
+                _result["duration"],
+                **_counts
+            )
+        )
+        _errors = _result["errors"]
+        for _error in _errors[:_errors_shown]:
+            if "section" in _error:
+                logger_cli.error("\t{}: '{}' ({}) {}".format(
+                    _error["section"],
+                    _error["item"],
+                    _error["return_code"],
+                    _first_line(_error["error"])
+                ))
+            else:
+                logger_cli.error("\t{}".format(_first_line(_error["error"])))
+        if len(_errors) > _errors_shown:
+            logger_cli.error("\t... {} more".format(
+                len(_errors) - _errors_shown
+            ))
+    logger_cli.info(
+        "# Total: {targets} targets, {failed_targets} failed, "
+        "listed {listed}, matched {matched}, swept {swept}, "
+        "failed {failed}, {duration}s".format(
+            duration=report["duration"],
+            **report["total"]
+        )
+    )
+
+
+def write_report(filename, report):
+    # errors could be objects of python actions
+    write_str_to_file(filename, json.dumps(report, indent=2, default=str))
+    logger_cli.info("# Targets report saved to '{}'".format(filename))
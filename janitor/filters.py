@@ -0,0 +1,183 @@
+import re
+
+from common import logger
+
+_field_rule_prefix = "@"
+
+
+def parse_rules(text):
+    """
+    Parse multiline profile value into filter rules.
+    Each line is a rule. Line like '@field=rule' applies only to that field,
+    other lines apply to filter field of a section or to all of the fields.
+
+    :param text: option value or None
+    :return: list of (field, rule) tuples, field is None for common rules
+    """
+    _rules = []
+    if text is None:
+        return _rules
+    for _line in text.splitlines():
+        _line = _line.strip()
+        if len(_line) == 0:
+            continue
+        if _line.startswith(_field_rule_prefix) and "=" in _line:
+            _field, _rule = _line[1:].split("=", 1)
+            _rules.append((_field.strip(), _rule.strip()))
+        else:
+            _rules.append((None, _line))
+    return _rules
+
+
+class FieldMatcher(object):
+    """
+    All regexes and literal prefixes for a field combined in one matcher
+    """
+    __slots__ = ("regex", "prefixes")
+
+    def __init__(self, patterns, prefixes):
+        if patterns:
+            self.regex = re.compile(
+                "|".join(["(?:{})".format(_p) for _p in patterns])
+            )
+        else:
+            self.regex = None
+        self.prefixes = tuple(prefixes) if prefixes else None
+
+    def __call__(self, value):
+        if not isinstance(value, basestring):
+            return False
+        if self.prefixes is not None and value.startswith(self.prefixes):
+            return True
+        if self.regex is not None and self.regex.match(value) is not None:
+            return True
+        return False
+
+
+class ItemFilter(object):
+    """
+    Filter compiled once for a section.
+    Item is selected if any of include rules matches
+    and none of exclude rules does.
+
+    :param include: list of (field, regex) rules
+    :param exclude: list of (field, regex) rules
+    :param include_prefixes: list of (field, prefix) rules
+    :param exclude_prefixes: list of (field, prefix) rules
+    :param default_field: field for common rules, None or '*' is any field
+    :param raw: items are strings, field rules are not used
+    """
+    def __init__(
+            self,
+            include,
+            exclude=None,
+            include_prefixes=None,
+            exclude_prefixes=None,
+            default_field=None,
+            raw=False
+    ):
+        if default_field == "*":
+            default_field = None
+        self.default_field = default_field
+        self.raw = raw
+        self._include = self._compile(include, include_prefixes)
+        self._exclude = self._compile(exclude, exclude_prefixes)
+        self.match = self._build_matcher()
+
+    def _compile(self, rules, prefixes):
+        _fields = {}
+        for _field, _rule in rules or []:
+            _fields.setdefault(_field, ([], []))[0].append(_rule)
+        for _field, _prefix in prefixes or []:
+            _fields.setdefault(_field, ([], []))[1].append(_prefix)
+
+        _matchers = []
+        for _field, (_patterns, _prefixes) in _fields.items():
+            if self.raw and _field is not None:
+                logger.warn(
+                    "Filter rules for field '{}' ignored for raw "
+                    "output".format(_field)
+                )
+                continue
+            if _field is None:
+                _field = self.default_field
+            _matchers.append((_field, FieldMatcher(_patterns, _prefixes)))
+        return _matchers
+
+    @property
+    def fields(self):
+        """
+        Fields that rules look at, None if rules look at any field
+        """
+        _fields = set()
+        for _field, _matcher in self._include + self._exclude:
+            if _field is None:
+                return None
+            _fields.add(_field)
+        return _fields
+
+    def _build_matcher(self):
+        _include = self._include
+        _exclude = self._exclude
+
+        if self.raw:
+            _include = [_matcher for _field, _matcher in _include]
+            _exclude = [_matcher for _field, _matcher in _exclude]
+
+            def _match(item):
+                for _matcher in _include:
+                    if _matcher(item):
+                        break
+                else:
+                    return False
+                for _matcher in _exclude:
+                    if _matcher(item):
+                        return False
+                return True
+
+            return _match
+
+        def _any(matchers, item):
+            for _field, _matcher in matchers:
+                if _field is None:
+                    for _value in item.itervalues():
+                        if _matcher(_value):
+                            return True
+                elif _matcher(item.get(_field)):
+                    return True
+            return False
+
+        def _match(item):
+            return _any(_include, item) and not _any(_exclude, item)
+
+        return _match
+
+    def filter(self, items):
+        """
+        Select matching items from a batch
+
+        :param items: list of parsed items
+        :return: list of matched items
+        """
+        _match = self.match
+        return [_item for _item in items if _match(_item)]
+
+
+class KeyFilter(object):
+    """
+    Selects items with key value from a set, i.e. items not gone yet
+
+    :param keys: set of key values
+    :param key: key field, None for raw items
+    """
+    def __init__(self, keys, key=None):
+        self.keys = keys
+        self.key = key
+
+    def filter(self, items):
+        if self.key is None:
+            return [_item for _item in items if _item in self.keys]
+        return [
+            _item for _item in items
+            if _item.get(self.key) in self.keys
+        ]
@@ -0,0 +1,36 @@
+class SweepItem(object):
+    """
+    Listed item reduced to what sweep needs, the rest of listed
+    object is dropped right after filtering
+
+    :param value: key value, used in sweep commands
+    :param name: filter field value, shown along with key value
+    :param parent: SweepItem of upper level this one is listed for
+    """
+    __slots__ = ("value", "name", "parent")
+
+    def __init__(self, value, name=None, parent=None):
+        self.value = value
+        self.name = name
+        self.parent = parent
+
+    def __repr__(self):
+        return "SweepItem({!r})".format(self.value)
+
+
+class SweepResult(object):
+    """
+    Result of sweep command for a single item
+
+    :param return_code: return code of the command
+    :param cmd: command executed
+    :param output: output of the command
+    :param error: error output of the command
+    """
+    __slots__ = ("return_code", "cmd", "output", "error")
+
+    def __init__(self, return_code, cmd, output, error):
+        self.return_code = return_code
+        self.cmd = cmd
+        self.output = output
+        self.error = error
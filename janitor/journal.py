@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+
+from common import logger, logger_cli
+from plan import get_profile_checksum
+from utils.exception import JournalInvalid
+
+journal_version = 1
+
+# seconds between syncs to disk, even if batch is not full
+_sync_interval = 1.0
+
+# bytes read at once looking for the end of last complete record
+_read_block = 65536
+
+
+def _cut_torn_record(filename):
+    # record cut by a crash is dropped, so appended ones start on own line
+    if not os.path.exists(filename):
+        return
+    with open(filename, "r+b") as _file:
+        _file.seek(0, os.SEEK_END)
+        _end = _position = _file.tell()
+        _keep = 0
+        while _position > 0:
+            _step = min(_read_block, _position)
+            _position -= _step
+            _file.seek(_position)
+            _index = _file.read(_step).rfind("\n")
+            if _index >= 0:
+                _keep = _position + _index + 1
+                break
+        if _keep < _end:
+            logger.warn("Journal '{}': incomplete last record dropped, "
+                        "{} bytes".format(filename, _end - _keep))
+            _file.truncate(_keep)
+
+
+class Journal(object):
+    """
+    Append-only record of a run, one JSON object per line:
+    listing of each section before its sweep, items swept as soon as
+    its commands succeed, failed items and result of each section.
+    Every record goes to the OS at once, so killed run loses nothing;
+    records are synced to disk in batches of 'sync_batch'.
+
+    :param filename: journal file
+    :param sync_batch: records written before sync to disk
+    :param append: continue existing journal, otherwise start new one
+    """
+    def __init__(self, filename, sync_batch=100, append=False):
+        self.filename = filename
+        self.sync_batch = max(sync_batch, 1)
+        if append:
+            _cut_torn_record(filename)
+        self._file = open(filename, "a" if append else "w")
+        self._unsynced = 0
+        self._synced = time.time()
+        self._lock = threading.Lock()
+
+    def _write(self, record, sync=False):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record, separators=(',', ':')))
+            self._file.write("\n")
+            self._file.flush()
+            self._unsynced += 1
+            if sync or self._unsynced >= self.sync_batch \
+                    or time.time() - self._synced >= _sync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced = time.time()
+
+    def start(self, profile):
+        """
+        Mark start of a run, resumed runs add own marks
+
+        :param profile: profile file of the run
+        """
+        self._write({
+            "record": "start",
+            "version": journal_version,
+            "created": time.time(),
+            "profile": profile,
+            "profile_checksum": get_profile_checksum(profile)
+        }, sync=True)
+
+    def record_listing(self, plan):
+        """
+        :param plan: section plan, as from Sweeper.get_section_plan
+        """
+        self._write({
+            "record": "listing",
+            "section": plan["section"],
+            "plan": plan
+        })
+
+    def record_items(self, section, level, items, rc):
+        self._write({
+            "record": "items",
+            "section": section,
+            "level": level,
+            "items": items,
+            "rc": rc
+        })
+
+    def record_section(self, section, rc):
+        self._write({
+            "record": "section",
+            "section": section,
+            "rc": rc
+        }, sync=True)
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+
+
+class JournalState(object):
+    """
+    Progress of previous runs read from a journal
+
+    :param sections: dict of section -> return code of finished sections
+    :param listings: dict of section -> plan of listed sections
+    :param swept: dict of section -> level -> set of swept items
+    """
+    def __init__(self, sections, listings, swept):
+        self.sections = sections
+        self.listings = listings
+        self.swept = swept
+
+    def is_done(self, section):
+        return self.sections.get(section) == 0
+
+    def get_swept(self, section):
+        return self.swept.get(section, {})
+
+
+def read_journal(filename, profile):
+    """
+    Read progress from journal of interrupted run
+
+    :param filename: journal file
+    :param profile: profile of this run, should be the same
+    :return: JournalState
+    """
+    try:
+        with open(filename) as _file:
+            _lines = _file.read().split("\n")
+    except IOError as e:
+        raise JournalInvalid(filename, e)
+
+    _records = []
+    for _number, _line in enumerate(_lines, 1):
+        if not _line.strip():
+            continue
+        try:
+            _records.append(json.loads(_line))
+        except ValueError:
+            # last record could be cut by the crash
+            logger.warn("Journal '{}': line {} is not complete".format(
+                filename,
+                _number
+            ))
+
+    if not _records or _records[0].get("record") != "start":
+        raise JournalInvalid(filename, "no start record")
+    _start = _records[0]
+    if _start.get("version") != journal_version:
+        raise JournalInvalid(
+            filename,
+            "version {} is not supported".format(_start.get("version"))
+        )
+    if _start["profile_checksum"] != get_profile_checksum(profile):
+        raise JournalInvalid(
+            filename,
+            "profile changed since journal was started"
+        )
+
+    _sections = {}
+    _listings = {}
+    _swept = {}
+    for _record in _records:
+        _type = _record.get("record")
+        if _type == "section":
+            _sections[_record["section"]] = _record["rc"]
+        elif _type == "listing":
+            _listings[_record["section"]] = _record["plan"]
+            # section is listed again, previous result does not apply
+            _sections.pop(_record["section"], None)
+            _swept.pop(_record["section"], None)
+        elif _type == "items" and _record["rc"] == 0:
+            _swept.setdefault(_record["section"], {}).setdefault(
+                _record["level"],
+                set()
+            ).update(_record["items"])
+
+    logger_cli.info(
+        "# Journal '{}': {} sections done, {} listed, {} items swept".format(
+            filename,
+            len([_rc for _rc in _sections.values() if _rc == 0]),
+            len(_listings),
+            sum(
+                len(_items)
+                for _levels in _swept.values()
+                for _items in _levels.values()
+            )
+        )
+    )
+    return JournalState(_sections, _listings, _swept)
@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+from time import time
+
+from common import logger_cli
+from utils.file import write_str_to_file
+
+# seconds
+default_buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_prefix = "janitor_"
+
+
+class Histogram(object):
+    """
+    Count of observed values for each upper bound, plus sum and count
+
+    :param buckets: sorted upper bounds
+    """
+    __slots__ = ("buckets", "counts", "sum", "count", "min", "max")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for _index, _bound in enumerate(self.buckets):
+            if value <= _bound:
+                self.counts[_index] += 1
+                break
+        self.sum += value
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self):
+        # count of values less or equal to each bound, '+Inf' is last
+        _total = 0
+        _result = []
+        for _bound, _count in zip(self.buckets, self.counts):
+            _total += _count
+            _result.append((_bound, _total))
+        _result.append(("+Inf", self.count))
+        return _result
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "buckets": [
+                [str(_bound), _count] for _bound, _count in self.cumulative()
+            ]
+        }
+
+
+class CommandStats(object):
+    """
+    Aggregated results of commands of a single action on a level
+    """
+    __slots__ = ("duration", "return_codes", "retries", "output_bytes",
+                 "wait")
+
+    def __init__(self, buckets):
+        self.duration = Histogram(buckets)
+        self.return_codes = {}
+        self.retries = 0
+        self.output_bytes = 0
+        self.wait = 0.0
+
+    def to_dict(self):
+        return {
+            "duration": self.duration.to_dict(),
+            "return_codes": dict(
+                (str(_rc), _count)
+                for _rc, _count in self.return_codes.iteritems()
+            ),
+            "failed": sum(
+                _count for _rc, _count in self.return_codes.iteritems()
+                if _rc != 0
+            ),
+            "retries": self.retries,
+            "output_bytes": self.output_bytes,
+            "wait_seconds": round(self.wait, 6)
+        }
+
+
+def _labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(
+            _name,
+            str(_value).replace("\\", "\\\\").replace('"', '\\"')
+        )
+        for _name, _value in sorted(labels.items())
+    )
+
+
+class MetricsCollector(object):
+    """
+    Timings of commands and stages of a run.
+    Commands are aggregated by section, action_map level and action,
+    stage is wall time of listing or sweeping of a section or its level.
+
+    :param buckets: upper bounds of duration histograms, seconds
+    """
+    def __init__(self, buckets=default_buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.started = time()
+        self._commands = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, context):
+        _key = (context.section, context.level, context.action)
+        if _key not in self._commands:
+            self._commands[_key] = CommandStats(self.buckets)
+        return self._commands[_key]
+
+    def observe_command(self, context, duration, wait, rc, output_bytes):
+        """
+        Account single run of a command
+
+        :param context: ActionContext of the command
+        :param duration: seconds command was running
+        :param wait: seconds command waited for rate limit and budget
+        :param rc: return code
+        :param output_bytes: size of output
+        """
+        with self._lock:
+            _stats = self._get_stats(context)
+            _stats.duration.observe(duration)
+            _stats.return_codes[rc] = _stats.return_codes.get(rc, 0) + 1
+            _stats.output_bytes += output_bytes
+            _stats.wait += wait
+
+    def observe_retry(self, context):
+        with self._lock:
+            self._get_stats(context).retries += 1
+
+    @property
+    def empty(self):
+        # nothing was run, i.e. sections were only listed from profile
+        with self._lock:
+            return not self._commands and not self._stages
+
+    def observe_stage(self, section, level, action, duration, rc):
+        """
+        Account wall time of listing or sweeping
+
+        :param section: section name
+        :param level: action_map level, None for whole section
+        :param action: 'list', 'sweep' or 'wait'
+        :param duration: seconds
+        :param rc: return code of the stage
+        """
+        with self._lock:
+            self._stages[(section, level or "", action)] = (duration, rc)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "created": time(),
+                "duration": round(time() - self.started, 6),
+                "commands": [
+                    dict(
+                        section=_section,
+                        level=_level,
+                        action=_action,
+                        **_stats.to_dict()
+                    )
+                    for (_section, _level, _action), _stats
+                    in sorted(self._commands.items())
+                ],
+                "stages": [
+                    {
+                        "section": _section,
+                        "level": _level,
+                        "action": _action,
+                        "duration": round(_duration, 6),
+                        "return_code": _rc
+                    }
+                    for (_section, _level, _action), (_duration, _rc)
+                    in sorted(self._stages.items())
+                ]
+            }
+
+    def to_prometheus(self):
+        _report = self.to_dict()
+        _lines = []
+
+        def _metric(name, kind, help_text, samples):
+            _lines.append("# HELP {}{} {}".format(_prefix, name, help_text))
+            _lines.append("# TYPE {}{} {}".format(_prefix, name, kind))
+            for _suffix, _labels_text, _value in samples:
+                if _labels_text:
+                    _labels_text = "{" + _labels_text + "}"
+                _lines.append("{}{}{}{} {}".format(
+                    _prefix,
+                    name,
+                    _suffix,
+                    _labels_text,
+                    _value
+                ))
+
+        _histogram = []
+        _codes = []
+        _retries = []
+        _bytes = []
+        _wait = []
+        for _item in _report["commands"]:
+            _common = dict(
+                section=_item["section"],
+                level=_item["level"],
+                action=_item["action"]
+            )
+            _duration = _item["duration"]
+            for _bound, _count in _duration["buckets"]:
+                _histogram.append(
+                    ("_bucket", _labels(le=_bound, **_common), _count)
+                )
+            _histogram.append(("_sum", _labels(**_common), _duration["sum"]))
+            _histogram.append(
+                ("_count", _labels(**_common), _duration["count"])
+            )
+            for _rc, _count in sorted(_item["return_codes"].items()):
+                _codes.append(("", _labels(rc=_rc, **_common), _count))
+            _retries.append(("", _labels(**_common), _item["retries"]))
+            _bytes.append(("", _labels(**_common), _item["output_bytes"]))
+            _wait.append(("", _labels(**_common), _item["wait_seconds"]))
+
+        _metric(
+            "command_duration_seconds",
+            "histogram",
+            "Time commands were running",
+            _histogram
+        )
+        _metric(
+            "command_exit_total",
+            "counter",
+            "Commands finished, by return code",
+            _codes
+        )
+        _metric(
+            "command_retries_total",
+            "counter",
+            "Retries of failed commands",
+            _retries
+        )
+        _metric(
+            "command_output_bytes_total",
+            "counter",
+            "Output produced by commands",
+            _bytes
+        )
+        _metric(
+            "command_wait_seconds_total",
+            "counter",
+            "Time commands waited for rate limits and process budget",
+            _wait
+        )
+        _metric(
+            "stage_duration_seconds",
+            "gauge",
+            "Wall time of listing and sweeping of sections and levels",
+            [
+                ("", _labels(
+                    section=_stage["section"],
+                    level=_stage["level"],
+                    action=_stage["action"]
+                ), _stage["duration"])
+                for _stage in _report["stages"]
+            ]
+        )
+        _metric(
+            "stage_return_code",
+            "gauge",
+            "Return code of listing and sweeping of sections and levels",
+            [
+                ("", _labels(
+                    section=_stage["section"],
+                    level=_stage["level"],
+                    action=_stage["action"]
+                ), _stage["return_code"])
+                for _stage in _report["stages"]
+            ]
+        )
+        _metric(
+            "run_duration_seconds",
+            "gauge",
+            "Wall time of the run",
+            [("", "", _report["duration"])]
+        )
+        _metric(
+            "run_timestamp_seconds",
+            "gauge",
+            "End time of the run",
+            [("", "", _report["created"])]
+        )
+        return "\n".join(_lines) + "\n"
+
+    def write_json(self, filename):
+        write_str_to_file(filename, json.dumps(self.to_dict(), indent=2))
+        logger_cli.info("# Metrics saved to '{}'".format(filename))
+
+    def write_prometheus(self, filename):
+        # collector could read the file at any time, replace it at once
+        _temporary = "{}.{}.tmp".format(filename, os.getpid())
+        write_str_to_file(_temporary, self.to_prometheus())
+        os.rename(_temporary, filename)
+        logger_cli.info("# Metrics saved to '{}'".format(filename))
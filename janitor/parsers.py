@@ -0,0 +1,336 @@
+import csv
+import json
+
+from utils.exception import JSONParsingFailed, OutputParsingFailed
+
+
+class StreamParser(object):
+    """
+    Base class for parsers of listing output that is fed by chunks.
+    'feed' and 'close' return list of items completed so far,
+    so only unparsed tail of the output is kept in memory.
+    """
+    def feed(self, chunk):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class RawParser(StreamParser):
+    """
+    Each line of output is an item
+    """
+    def __init__(self):
+        self._tail = ""
+
+    def feed(self, chunk):
+        _lines = (self._tail + chunk).split("\n")
+        self._tail = _lines.pop()
+        return [_line.rstrip("\r") for _line in _lines]
+
+    def close(self):
+        _tail, self._tail = self._tail, ""
+        if len(_tail) > 0:
+            return [_tail.rstrip("\r")]
+        return []
+
+
+class JSONArrayParser(StreamParser):
+    """
+    Parses top level JSON array element by element
+    """
+    _whitespace = " \t\r\n"
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def _skip(self, position, chars):
+        while position < len(self._buffer) \
+                and self._buffer[position] in chars:
+            position += 1
+        return position
+
+    def _parse(self, closed=False):
+        _items = []
+        _position = self._skip(0, self._whitespace)
+        if not self._started:
+            if _position >= len(self._buffer):
+                self._buffer = ""
+                return _items
+            if self._buffer[_position] != "[":
+                raise JSONParsingFailed()
+            self._started = True
+            _position += 1
+
+        while not self._finished:
+            _position = self._skip(_position, self._whitespace + ",")
+            if _position >= len(self._buffer):
+                break
+            if self._buffer[_position] == "]":
+                self._finished = True
+                _position += 1
+                break
+            try:
+                _item, _end = self._decoder.raw_decode(
+                    self._buffer,
+                    _position
+                )
+            except ValueError:
+                if closed:
+                    raise JSONParsingFailed()
+                # element is not complete yet
+                break
+            if _end >= len(self._buffer) and not closed \
+                    and not isinstance(_item, (dict, list)):
+                # number could be continued in the next chunk
+                break
+            _items.append(_item)
+            _position = _end
+
+        self._buffer = self._buffer[_position:]
+        return _items
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        return self._parse()
+
+    def close(self):
+        _items = self._parse(closed=True)
+        if not self._finished:
+            raise JSONParsingFailed()
+        return _items
+
+
+class ColumnParser(StreamParser):
+    """
+    Base class for parsers of tabular output, each row is an item.
+    Positions of needed columns are resolved once from the header,
+    then only those cells are taken from each row, so items are dicts
+    with just the fields a level uses.
+
+    :param fields: columns kept in items, None is to keep all of them
+    :param columns: names of columns in order, for output with no header
+    :param key: column that each item must have
+    """
+    output_format = None
+    # cell of first column in split row
+    _offset = 0
+
+    def __init__(self, fields=None, columns=None, key=None):
+        self._tail = ""
+        self._key = key
+        self._fields = None
+        if fields is not None:
+            self._fields = set(fields)
+            if key is not None:
+                self._fields.add(key)
+        self._columns = None
+        self._picks = None
+        self._need = 0
+        self._splits = -1
+        if columns is not None:
+            self._resolve(columns)
+
+    def _resolve(self, columns):
+        # picks are (cell index, column name) of kept columns
+        if self._key is not None and self._key not in columns:
+            raise OutputParsingFailed(
+                self.output_format,
+                "no '{}' column in '{}'".format(self._key, ", ".join(columns))
+            )
+        self._columns = columns
+        self._picks = [
+            (_index + self._offset, _name)
+            for _index, _name in enumerate(columns)
+            if self._fields is None or _name in self._fields
+        ]
+        # cells after the last needed one are not split
+        self._need = self._picks[-1][0] + 1 if self._picks else 0
+        self._splits = self._need
+
+    def _pick(self, cells):
+        if len(cells) < self._need:
+            raise OutputParsingFailed(
+                self.output_format,
+                "row has {} of {} columns".format(
+                    len(cells) - self._offset,
+                    len(self._columns)
+                )
+            )
+        return {_name: cells[_index].strip() for _index, _name in self._picks}
+
+    def _parse(self, lines):
+        raise NotImplementedError
+
+    def _finish(self):
+        return []
+
+    def feed(self, chunk):
+        _lines = (self._tail + chunk).split("\n")
+        self._tail = _lines.pop()
+        return self._parse(_lines)
+
+    def close(self):
+        _tail, self._tail = self._tail, ""
+        _items = self._parse([_tail]) if _tail else []
+        _items.extend(self._finish())
+        return _items
+
+
+class TableParser(ColumnParser):
+    """
+    Table drawn by openstack client, '+---+' borders and '| a | b |' rows.
+    First row is the header. Row with empty key cell continues
+    multiline cells of the previous one.
+    """
+    output_format = "table"
+    _offset = 1
+
+    def __init__(self, fields=None, columns=None, key=None):
+        # names come from the header of the table
+        super(TableParser, self).__init__(fields=fields, key=key)
+        # last row is held until it is known to have no continuation
+        self._pending = None
+
+    def _parse(self, lines):
+        _items = []
+        for _line in lines:
+            _line = _line.strip()
+            if not _line.startswith("|"):
+                # borders, blank lines and messages around the table
+                if _line.startswith("+") and self._pending is not None:
+                    _items.append(self._pending)
+                    self._pending = None
+                continue
+            if self._picks is None:
+                self._resolve([
+                    _cell.strip() for _cell in _line.split("|")[1:-1]
+                ])
+                continue
+            _item = self._pick(_line.split("|", self._splits))
+            if self._pending is not None and self._key is not None \
+                    and not _item[self._key]:
+                for _name, _value in _item.iteritems():
+                    if _value:
+                        self._pending[_name] += "\n" + _value
+                continue
+            if self._pending is not None:
+                _items.append(self._pending)
+            self._pending = _item
+        return _items
+
+    def _finish(self):
+        _pending, self._pending = self._pending, None
+        return [_pending] if _pending is not None else []
+
+
+class CSVParser(ColumnParser):
+    """
+    Comma separated values, first row is the header.
+    Quoted values could span several lines.
+    """
+    output_format = "csv"
+
+    def __init__(self, fields=None, columns=None, key=None):
+        # names come from the header row
+        super(CSVParser, self).__init__(fields=fields, key=key)
+        # lines of a row that is not complete yet
+        self._record = []
+        self._quotes = 0
+
+    def _parse(self, lines):
+        _records = []
+        for _line in lines:
+            if not self._record and not _line.strip():
+                continue
+            self._record.append(_line)
+            self._quotes += _line.count('"')
+            if self._quotes % 2 == 0:
+                _records.append("\n".join(self._record))
+                self._record = []
+                self._quotes = 0
+        _items = []
+        for _cells in csv.reader(_records):
+            if self._picks is None:
+                self._resolve([_cell.strip() for _cell in _cells])
+                continue
+            _items.append(self._pick(_cells))
+        return _items
+
+    def _finish(self):
+        if self._record:
+            raise OutputParsingFailed(self.output_format, "no closing quote")
+        return []
+
+
+class ValueParser(ColumnParser):
+    """
+    Values of a row separated by space with no header or quoting,
+    like 'openstack ... -f value' prints them. Names of columns are
+    given in their order, only the last column could have spaces.
+    """
+    output_format = "value"
+
+    def __init__(self, fields=None, columns=None, key=None):
+        if not columns:
+            raise OutputParsingFailed(
+                self.output_format,
+                "names of columns are not set"
+            )
+        super(ValueParser, self).__init__(
+            fields=fields,
+            columns=columns,
+            key=key
+        )
+        self._splits = min(self._splits, len(columns) - 1)
+
+    def _parse(self, lines):
+        _items = []
+        for _line in lines:
+            _line = _line.rstrip("\r")
+            if not _line:
+                continue
+            _items.append(self._pick(_line.split(" ", self._splits)))
+        return _items
+
+
+_parsers = {
+    "json": JSONArrayParser,
+    "raw": RawParser
+}
+
+_column_parsers = {
+    "table": TableParser,
+    "csv": CSVParser,
+    "value": ValueParser
+}
+
+# formats with dict items, fields are taken by name
+keyed_formats = ("json", ) + tuple(_column_parsers)
+
+
+def is_keyed_format(output_format):
+    return output_format in keyed_formats
+
+
+def get_parser(output_format, fields=None, columns=None, key=None):
+    """
+    Create stream parser for output format, unknown formats are raw
+
+    :param output_format: 'json', 'raw', 'table', 'csv' or 'value'
+    :param fields: columns kept by column parsers, None is all of them
+    :param columns: names of columns for 'value' output
+    :param key: column each row of column parsers must have
+    :return: StreamParser instance
+    """
+    if output_format in _column_parsers:
+        return _column_parsers[output_format](
+            fields=fields,
+            columns=columns,
+            key=key
+        )
+    return _parsers.get(output_format, RawParser)()
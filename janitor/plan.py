@@ -0,0 +1,69 @@
+import hashlib
+import json
+import time
+
+from common import logger_cli
+from utils.exception import PlanInvalid
+from utils.file import read_file, write_str_to_file
+
+plan_version = 1
+
+
+def get_profile_checksum(profile):
+    return hashlib.md5(read_file(profile)).hexdigest()
+
+
+def write_plan(filename, sweep, sections):
+    """
+    Save listed items of sections with its sweep commands
+
+    :param filename: plan file to write
+    :param sweep: Sweeper instance with sections listed
+    :param sections: list of sections to save, in order of execution
+    """
+    _plan = {
+        "version": plan_version,
+        "created": time.time(),
+        "profile": sweep.profilepath,
+        "profile_checksum": get_profile_checksum(sweep.profilepath),
+        "sections": [sweep.get_section_plan(section) for section in sections]
+    }
+    write_str_to_file(filename, json.dumps(_plan, separators=(',', ':')))
+    logger_cli.info("# Plan for {} sections saved to '{}'".format(
+        len(sections),
+        filename
+    ))
+
+
+def read_plan(filename, sweep, max_age=None):
+    """
+    Load plan and make sure it still could be applied
+
+    :param filename: plan file to read
+    :param sweep: Sweeper instance with the same profile used for plan
+    :param max_age: seconds since plan creation, None is no limit
+    :return: dict of section -> section plan, list of sections in order
+    """
+    try:
+        _plan = json.loads(read_file(filename))
+    except (IOError, ValueError) as e:
+        raise PlanInvalid(filename, e)
+
+    if _plan.get("version") != plan_version:
+        raise PlanInvalid(
+            filename,
+            "version {} is not supported".format(_plan.get("version"))
+        )
+
+    # quick staleness check
+    if _plan["profile_checksum"] != get_profile_checksum(sweep.profilepath):
+        raise PlanInvalid(filename, "profile changed since plan was created")
+    _age = time.time() - _plan["created"]
+    if max_age is not None and _age > max_age:
+        raise PlanInvalid(
+            filename,
+            "plan is {:.0f}s old, limit is {}s".format(_age, max_age)
+        )
+
+    _sections = [_section["section"] for _section in _plan["sections"]]
+    return dict(zip(_sections, _plan["sections"])), _sections
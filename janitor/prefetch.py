@@ -0,0 +1,138 @@
+import sys
+import threading
+
+from common import logger, logger_cli
+from scheduler import get_ancestors
+
+# states of a prefetched section
+_queued = "queued"
+_listing = "listing"
+_done = "done"
+_taken = "taken"
+
+
+class ListingPrefetcher(object):
+    """
+    Lists upcoming sections in background while current ones sweep.
+    When section's turn comes, its listing is ready or being done,
+    so listing time is hidden behind sweep of previous sections.
+    Listing of a section is done ahead only if it is 'eligible'
+    and sections it depends on are finished, as their sweep
+    could change its listing.
+
+    :param sweep: Sweeper instance
+    :param sections: sections in order of execution
+    :param eligible: sections that could be listed ahead
+    :param dependencies: graph from resolve_dependencies
+    :param lookahead: eligible sections listed ahead of the current one
+    :param concurrency: listings running in background at once
+    """
+    def __init__(self, sweep, sections, eligible, dependencies,
+                 lookahead=1, concurrency=1):
+        self.sweep = sweep
+        self.sections = list(sections)
+        self.eligible = set(eligible)
+        # sections of this run that should finish first
+        self._ancestors = dict(
+            (_section, get_ancestors(dependencies, _section)
+             & set(self.sections))
+            for _section in self.sections
+        )
+        self._finished = set()
+        self.lookahead = lookahead
+        self._budget = threading.Semaphore(max(concurrency, 1))
+        self._states = {}
+        self._results = {}
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def _upcoming(self, section):
+        # eligible sections after given one, up to lookahead,
+        # ones still waiting for dependencies are checked on next call
+        _index = self.sections.index(section)
+        return [
+            _section for _section in self.sections[_index + 1:]
+            if _section in self.eligible
+        ][:self.lookahead]
+
+    def _is_ready(self, section):
+        return self._ancestors[section] <= self._finished
+
+    def _prefetch(self, section):
+        with self._budget:
+            with self._condition:
+                # section could be taken while waiting for a slot
+                if self._states[section] != _queued:
+                    return
+                self._states[section] = _listing
+            logger_cli.debug("## prefetching '{}'".format(section))
+            try:
+                _result = (self.sweep.list_action(section, prefetch=True),
+                           None)
+            except Exception:
+                _result = (1, sys.exc_info())
+            with self._condition:
+                self._results[section] = _result
+                self._states[section] = _done
+                self._condition.notify_all()
+
+    def _start(self, section):
+        with self._condition:
+            for _section in self._upcoming(section):
+                if _section in self._states or not self._is_ready(_section):
+                    continue
+                self._states[_section] = _queued
+                _thread = threading.Thread(
+                    target=self._prefetch,
+                    args=(_section,)
+                )
+                _thread.daemon = True
+                _thread.start()
+                self._threads.append(_thread)
+
+    def list_action(self, section):
+        """
+        Listing of the section, done ahead or right now;
+        upcoming sections are started to be listed
+
+        :return: return code of the listing
+        """
+        self._start(section)
+        with self._condition:
+            _state = self._states.get(section)
+            if _state in (None, _queued):
+                # not started yet, it is listed right away
+                self._states[section] = _taken
+                _state = None
+            while _state == _listing:
+                # short waits keep main thread interruptible
+                self._condition.wait(0.5)
+                _state = self._states[section]
+            if _state == _done:
+                self._states[section] = _taken
+        if _state is None:
+            return self.sweep.list_action(section)
+
+        logger.debug("Using prefetched listing of '{}'".format(section))
+        rc, _error = self._results.pop(section)
+        if _error is not None:
+            raise _error[0], _error[1], _error[2]
+        return self.sweep.take_prefetched(section, rc)
+
+    def finish(self, section):
+        """
+        Section is done, sections that depend on it could be listed ahead
+        """
+        with self._condition:
+            self._finished.add(section)
+
+    def close(self):
+        """
+        Drop listings that are not started, wait for running ones
+        """
+        with self._condition:
+            for _section, _state in self._states.items():
+                if _state == _queued:
+                    self._states[_section] = _taken
+        for _thread in self._threads:
+            _thread.join()
@@ -0,0 +1,178 @@
+import calendar
+import os
+import threading
+from datetime import datetime
+from subprocess import PIPE, Popen
+from time import time
+
+from common import logger
+from utils.exception import PrimingFailed
+
+_shell = "/bin/sh"
+_timestamp_format = "%Y-%m-%dT%H:%M:%S"
+
+
+def parse_expires(value):
+    """
+    Parse token expiration time, i.e. '2018-05-04T13:00:00+0000'
+
+    :param value: ISO 8601 time in UTC
+    :return: seconds since epoch or None
+    """
+    try:
+        return calendar.timegm(
+            datetime.strptime(value[:19], _timestamp_format).timetuple()
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def run_script(script, env=None):
+    """
+    Run shell script and capture environment it leaves
+
+    :param script: shell commands, one per line
+    :param env: environment to start with, None is current one
+    :return: dict of environment after the script
+    """
+    _marker = "__janitor_{}__".format(os.urandom(16).encode("hex"))
+    try:
+        _process = Popen(
+            [_shell, "-c", "{}\necho {}\nenv -0".format(script, _marker)],
+            stdout=PIPE,
+            stderr=PIPE,
+            env=env
+        )
+    except OSError as e:
+        raise PrimingFailed(script, e.strerror)
+    _output, _err = _process.communicate()
+    if _process.returncode != 0 or _marker not in _output:
+        raise PrimingFailed(
+            script,
+            "({}) {}".format(_process.returncode, _err.strip())
+        )
+
+    _env = {}
+    for _line in _output.split(_marker + "\n", 1)[1].split("\0"):
+        if "=" in _line:
+            _name, _value = _line.split("=", 1)
+            _env[_name] = _value
+    return _env
+
+
+class PrimedEnvironment(object):
+    """
+    Environment for commands, prepared once by 'pre_script' instead of
+    doing the same in each command, i.e. getting auth token.
+    Script runs on first use and again when environment is due to
+    refresh: after 'refresh' seconds or 'margin' seconds before
+    the time in 'expires_var' variable set by the script.
+    Environment of a section is built on top of the common one,
+    and is refreshed along with it.
+
+    :param script: shell commands, None uses base environment as is
+    :param base: PrimedEnvironment to start with, None is current one
+    :param refresh: seconds before script runs again, 0 is never
+    :param expires_var: variable with expiration time set by script
+    :param margin: seconds before expiration to refresh
+    """
+    def __init__(
+            self,
+            script=None,
+            base=None,
+            refresh=0,
+            expires_var=None,
+            margin=300
+    ):
+        self.script = script
+        self.base = base
+        self.refresh = refresh
+        self.expires_var = expires_var
+        self.margin = margin
+        # incremented each time environment changes
+        self.generation = 0
+        self._env = None
+        self._base_generation = None
+        self._due = None
+        self._lock = threading.Lock()
+
+    def _is_due(self):
+        if self._env is None:
+            return True
+        if self.base is not None \
+                and self.base.generation != self._base_generation:
+            return True
+        return self._due is not None and time() >= self._due
+
+    def _prime(self, base_env):
+        if self.script:
+            _env = run_script(self.script, env=base_env)
+        else:
+            _env = dict(base_env if base_env is not None else os.environ)
+
+        self._due = None
+        if self.refresh > 0:
+            self._due = time() + self.refresh
+        if self.expires_var is not None:
+            _expires = parse_expires(_env.get(self.expires_var))
+            if _expires is not None and \
+                    (self._due is None or _expires - self.margin < self._due):
+                self._due = _expires - self.margin
+
+        # only names are logged, values could be secrets
+        _previous = self._env or base_env or os.environ
+        _changed = sorted(
+            _name for _name, _value in _env.iteritems()
+            if _previous.get(_name) != _value
+        )
+        logger.info("Environment primed, changed: {}".format(
+            ", ".join(_changed) or "none"
+        ))
+        self._env = _env
+        self.generation += 1
+
+    def get(self):
+        """
+        Get environment, script runs if it is due
+
+        :return: dict of environment variables
+        """
+        _base_env = None
+        if self.base is not None:
+            _base_env = self.base.get()
+        with self._lock:
+            if self._is_due():
+                self._base_generation = \
+                    self.base.generation if self.base is not None else None
+                self._prime(_base_env)
+            return self._env
+
+    @property
+    def primed(self):
+        return self._env is not None
+
+    def run(self, script):
+        """
+        Run script in this environment, if it was used.
+        Environment stays primed, i.e. for 'post_script' of a section
+        that uses common environment of other sections.
+
+        :param script: shell commands, one per line
+        """
+        if not script or not self.primed:
+            return
+        run_script(script, env=self.get())
+
+    def finish(self, script):
+        """
+        Run 'post_script' in this environment, if it was used.
+        Environment is primed again on next use, as the script
+        could have revoked it.
+
+        :param script: shell commands, one per line
+        """
+        if not script or not self.primed:
+            return
+        with self._lock:
+            _env, self._env = self._env, None
+        run_script(script, env=_env)
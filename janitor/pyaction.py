@@ -0,0 +1,151 @@
+import importlib
+import shlex
+import sys
+import threading
+import traceback
+
+from common import logger
+from utils.exception import CommandInvalid, PythonActionNotFound
+
+python_action_prefix = "python:"
+
+# return code of python actions that raised an exception
+python_failed_return_code = 1
+
+
+def is_python_action(cmd):
+    return cmd.lstrip().startswith(python_action_prefix)
+
+
+def resolve(spec):
+    """
+    Import function by its dotted path
+
+    :param spec: 'package.module.func'
+    :return: callable
+    """
+    _module, _, _name = spec.rpartition(".")
+    if not _module:
+        raise PythonActionNotFound(spec, "module is not specified")
+    try:
+        return getattr(importlib.import_module(_module), _name)
+    except (ImportError, AttributeError) as e:
+        raise PythonActionNotFound(spec, e)
+
+
+class SessionObjectPool(object):
+    """
+    Objects shared by calls of python actions, i.e. SDK connection
+    or HTTP keep-alive pool. Objects are created on demand by 'factory'
+    up to 'size' of them, each one is used by a single call at a time.
+
+    :param factory: callable with no arguments, None passes None to calls
+    :param size: max objects created
+    """
+    def __init__(self, factory=None, size=1):
+        self.factory = factory
+        self.size = max(size, 1)
+        self._idle = []
+        self._created = []
+        self._creating = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        if self.factory is None:
+            return None
+        with self._condition:
+            while not self._idle \
+                    and len(self._created) + self._creating >= self.size:
+                self._condition.wait(0.5)
+            if self._idle:
+                return self._idle.pop()
+            # reserve a place while object is created
+            self._creating += 1
+
+        try:
+            _object = self.factory()
+        except Exception:
+            with self._condition:
+                self._creating -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._creating -= 1
+            self._created.append(_object)
+        return _object
+
+    def release(self, session):
+        if self.factory is None:
+            return
+        with self._condition:
+            self._idle.append(session)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            _created, self._created = self._created, []
+            self._idle = []
+        for _object in _created:
+            if hasattr(_object, "close"):
+                _object.close()
+
+
+class PythonActions(object):
+    """
+    Runs actions like 'python:module.func arg1 arg2' in process.
+    Function is called as func(session, arg1, arg2) with session object
+    from the pool. Return value is output of the action, list actions
+    should return list of items. Exception fails the action.
+
+    :param path: folders to import modules from, separated by ':'
+    :param session_factory: 'module.func' that creates session object
+    :param pool_size: max session objects
+    """
+    def __init__(self, path=None, session_factory=None, pool_size=1):
+        for _folder in (path or "").split(":"):
+            if _folder and _folder not in sys.path:
+                sys.path.insert(0, _folder)
+        self._functions = {}
+        self._lock = threading.Lock()
+        self.pool = SessionObjectPool(
+            resolve(session_factory) if session_factory else None,
+            size=pool_size
+        )
+
+    def _get_function(self, spec):
+        with self._lock:
+            if spec not in self._functions:
+                self._functions[spec] = resolve(spec)
+            return self._functions[spec]
+
+    def call(self, cmd):
+        """
+        Run python action
+
+        :param cmd: 'python:module.func args'
+        :return: tuple of output, error, return code
+        """
+        # arguments are quoted like in shell actions
+        try:
+            _args = shlex.split(cmd.strip()[len(python_action_prefix):])
+        except ValueError as e:
+            return None, CommandInvalid(cmd, e).message, \
+                python_failed_return_code
+        _function = self._get_function(_args.pop(0))
+
+        _session = self.pool.acquire()
+        try:
+            _output = _function(_session, *_args)
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            return None, "{}: {}".format(e.__class__.__name__, e), \
+                python_failed_return_code
+        finally:
+            self.pool.release(_session)
+        logger.debug("python action '{}' returned\n{}".format(cmd, _output))
+        if _output is None:
+            _output = ""
+        return _output, "", 0
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,191 @@
+import threading
+from collections import deque
+from time import time
+
+from common import logger
+
+# service tag for commands of sections without one
+default_service = "default"
+
+
+class TokenBucket(object):
+    """
+    Token bucket for a single service.
+    Each command takes a token, tokens are refilled at 'rate' per second
+    up to 'burst'. Instead of blocking, caller reserves a token and gets
+    time to wait for it, so both threads and coroutines could use it.
+    In adaptive mode rate is halved when share of failed commands
+    in a window rises above 'error_ratio', and grows back slowly
+    while commands succeed.
+
+    :param rate: tokens per second
+    :param burst: bucket size, commands that could start at once
+    :param adaptive: tighten rate on errors
+    :param min_rate: lowest rate in adaptive mode
+    :param window: number of results to decide on
+    :param error_ratio: share of failed results that tightens the rate
+    """
+    def __init__(
+            self,
+            rate,
+            burst=None,
+            adaptive=False,
+            min_rate=None,
+            window=20,
+            error_ratio=0.2
+    ):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(rate, 1))
+        self.adaptive = adaptive
+        self.min_rate = min_rate or self.max_rate / 16
+        self.error_ratio = error_ratio
+        self._results = deque(maxlen=window)
+        self._tokens = self.burst
+        self._updated = time()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.max_rate = float(rate)
+            self.rate = min(self.rate, self.max_rate)
+            self.min_rate = min(self.min_rate, self.max_rate)
+
+    def reserve(self):
+        """
+        Take a token
+
+        :return: seconds to wait before command could be started
+        """
+        with self._lock:
+            _now = time()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (_now - self._updated) * self.rate
+            )
+            self._updated = _now
+            # token could be borrowed, next callers wait longer
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def record(self, failed):
+        """
+        Account command result in adaptive mode
+
+        :param failed: command failed in a way that could mean overload
+        """
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._results.append(failed)
+            if len(self._results) < self._results.maxlen:
+                return
+            _ratio = float(sum(self._results)) / len(self._results)
+            _rate = self.rate
+            if _ratio >= self.error_ratio:
+                self.rate = max(self.min_rate, self.rate / 2)
+            elif _ratio == 0:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+            else:
+                return
+            self._results.clear()
+        if self.rate != _rate:
+            logger.info("Rate changed {:.2f} -> {:.2f}/s, errors {:.0%}".format(
+                _rate,
+                self.rate,
+                _ratio
+            ))
+
+
+class RateLimiter(object):
+    """
+    Token buckets keyed by service tag.
+    Services with no limit of its own share the default rate,
+    each in a separate bucket.
+
+    :param rate: default requests per second, 0 is no limit
+    :param burst: default bucket size, 0 is same as rate
+    :param adaptive: tighten rate of the service on errors
+    """
+    def __init__(self, rate=0, burst=0, adaptive=False):
+        self.rate = rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self._limits = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_limit(self, service, rate):
+        """
+        Declare limit for a service, lowest declared limit is used
+
+        :param service: service tag
+        :param rate: requests per second, 0 is no limit
+        """
+        if rate <= 0:
+            return
+        with self._lock:
+            if service in self._limits and self._limits[service] <= rate:
+                return
+            self._limits[service] = rate
+            if service in self._buckets:
+                self._buckets[service].set_rate(rate)
+
+    def _get_bucket(self, service):
+        if service is None:
+            service = default_service
+        with self._lock:
+            if service not in self._buckets:
+                _rate = self._limits.get(service, self.rate)
+                if _rate <= 0:
+                    self._buckets[service] = None
+                else:
+                    self._buckets[service] = TokenBucket(
+                        _rate,
+                        burst=self.burst,
+                        adaptive=self.adaptive
+                    )
+            return self._buckets[service]
+
+    def reserve(self, service):
+        """
+        Take a token for a command of a service
+
+        :param service: service tag or None
+        :return: seconds to wait before command could be started
+        """
+        _bucket = self._get_bucket(service)
+        if _bucket is None:
+            return 0
+        return _bucket.reserve()
+
+    def record(self, service, failed):
+        """
+        Account result of a command of a service
+
+        :param service: service tag or None
+        :param failed: command failed in a way that could mean overload
+        """
+        _bucket = self._get_bucket(service)
+        if _bucket is not None:
+            _bucket.record(failed)
+
+
+def parse_limits(text):
+    """
+    Parse multiline profile value into service limits.
+    Each line is 'service = rate'.
+
+    :param text: option value or None
+    :return: list of (service, rate) tuples
+    """
+    _limits = []
+    for _line in (text or "").splitlines():
+        _line = _line.strip()
+        if len(_line) == 0:
+            continue
+        _service, _rate = _line.split("=", 1)
+        _limits.append((_service.strip(), float(_rate)))
+    return _limits
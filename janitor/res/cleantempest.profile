@@ -12,19 +12,156 @@ common_filter = .*(rally_|tempest_|tempest-).*$
 retry = 3
 timeout = 2000
 
-# concurrency for sweep action, not implemented
+# failed items are retried after all others had its first run.
+# wait before first retry is 'timeout' ms, it doubles with each attempt
+# up to 'max_timeout' ms. Jitter spreads retries of many items in time.
+max_timeout = 60000
+retry_jitter = True
+
+# failures that are never retried and conflicts that wait longer,
+# starting from 'conflict_timeout' ms. One rule per line,
+# 'rc:N' is a return code, others are regexes for error output
+retry_permanent = rc:127
+    No .* with a name or ID of .* exists
+    [Nn]ot [Ff]ound
+retry_conflict = [Ii]n use
+    [Cc]onflict
+    HTTP 409
+conflict_timeout = 10000
+
+# concurrency for sweep action, can be overridden in each section
 concurrency = 1
 
-# additional script/commands, not implemented
-pre_script = $(export OS_ENDPOINT_TYPE=internal)
-post_script =
+# number of items passed to a single sweep action, separated by spaces
+# failed batches are retried item by item, only for items still listed
+sweep_batch_size = 1
+
+# sections executed at once, sections run once its 'depends_on' are done
+# section_concurrency = 4
+
+# limit of processes running at once for all sections, 0 is no limit.
+# Listings of pipelined sections are not counted, they wait for sweep
+# process_budget = 8
+
+# engine to run commands (blocking, session, asyncio)
+# 'asyncio' needs 'trollius' package installed, it runs commands with
+# no thread for each one, but is not faster than 'blocking'
+engine = blocking
+
+# 'session' engine feeds commands of 'session_program' to its interactive
+# sessions started with 'session_cmd', no startup cost for each command.
+# 'session_marker' command is sent after each command, reply ends with
+# the line that has the marker. Number printed after the marker is
+# a return code, otherwise command failed if it wrote errors.
+session_program = openstack
+session_cmd = openstack --os-interface internal
+session_marker = !echo {}
+session_prompt = (openstack)
+session_pool_size = 4
+
+# seconds before running command is killed, 0 is no timeout
+command_timeout = 0
+
+# keep whole listing output in memory, only matched items are kept otherwise
+keep_output = False
+
+# bytes of each command output kept for the log
+output_capture_limit = 65536
+
+# actions like 'python:module.func {}' are called in process as
+# func(session, *args), no process is started for them. List functions
+# return list of items, use 'json' output format for dicts.
+# Exception fails the action, 'command_timeout' is not applied.
+# 'python_session' is 'module.func' that creates object passed
+# as session, i.e. SDK connection; up to 'python_pool_size' are created.
+# Modules are imported from 'python_path' folders, separated by ':'.
+# python_path = /opt/janitor/actions
+# python_session = os_actions.connect
+# python_pool_size = 4
+
+# list and sweep commands per second for each service, 0 is no limit.
+# Sections are tagged with 'service', commands of sections without
+# a tag share the 'default' one. 'rate_burst' commands could start at once.
+# rate_limit = 10
+# rate_burst = 0
+# limits for particular services, one 'service = rate' per line
+# service_rate_limits = compute = 5
+#     volume = 5
+#     network = 10
+# halve the rate of a service when its commands start failing,
+# and raise it back slowly while they succeed
+# rate_adaptive = True
+
+# report timings, return codes, retries and output size of commands
+# for each section and action_map level, written at the end of the run.
+# JSON report and/or file for Prometheus node exporter textfile collector.
+# metrics_json = /var/log/janitor/metrics.json
+# metrics_prometheus = /var/lib/node_exporter/textfile_collector/janitor.prom
+# upper bounds of command duration histogram buckets, seconds
+# metrics_buckets = 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300
+
+# '--journal' records listings and swept items of the run, so the run
+# could be continued with '--resume' after it was killed. Records are
+# synced to disk each 'journal_sync_batch' of them or each second.
+journal_sync_batch = 100
 
-# default output format (raw, json)
+# resources deleted in background, i.e. servers and volumes, could be
+# waited for before dependent sections start. Listing of the section
+# is polled each 'wait_poll_interval' seconds until swept items are not
+# listed anymore, up to 'wait_timeout' seconds. Can be set in sections.
+wait_until_gone = False
+wait_poll_interval = 5
+wait_timeout = 300
+
+# sweep items while section is still listed, instead of after listing.
+# Listing waits when 'pipeline_queue_size' items are queued for sweep.
+# Sections with 'action_map' are not pipelined. Can be set in sections.
+pipeline = False
+pipeline_queue_size = 1000
+
+# list next sections in background while current one sweeps,
+# 'prefetch_sections' is how many are listed ahead, 0 is off.
+# Up to 'prefetch_concurrency' listings run at once. Sections are listed
+# ahead only once sections they depend on are done; section without
+# 'depends_on' depends on the previous one, so it is not listed ahead.
+# Listing done ahead could still miss items created by sweep of other
+# sections, set 'prefetch = False' in such sections.
+prefetch_sections = 0
+prefetch_concurrency = 1
+
+# shell script that prepares environment for all commands, it runs once
+# on first command and its exported variables are passed to every command.
+# 'post_script' runs in that environment at the end.
+# Sections could have own scripts, run on top of this one.
+# Token is issued once instead of authenticating in every command
+# pre_script = export OS_ENDPOINT_TYPE=internal
+#     eval $(openstack token issue -f shell -c id -c expires --prefix OS_TOKEN_)
+#     export OS_TOKEN=$OS_TOKEN_id OS_TOKEN_EXPIRES=$OS_TOKEN_expires
+#     export OS_AUTH_TYPE=v3token
+# post_script = openstack token revoke $OS_TOKEN
+# run script again after some seconds, 0 is never,
+# or some seconds before time in a variable set by the script
+pre_script_refresh = 0
+# pre_script_expires_var = OS_TOKEN_EXPIRES
+# pre_script_refresh_margin = 300
+
+# default output format (raw, json, table, csv, value)
 default_format_parser = json
 
 # default field for filtering
 default_filter_field = name
 
+# include/exclude rules, one per line, can be overridden in each section.
+# Item is selected if any include rule matches and none of exclude rules.
+# Rule like '@field=rule' applies to that field only, others apply to
+# filter field. Exclude rules from this section are used for all sections.
+# 'common_filter' is used if there are no include rules.
+# filter_include = ^tempest-
+#     ^rally_
+# filter_include_prefixes = tempest-
+# filter_exclude = .*-keep$
+# filter_exclude_prefixes = @ID=00000000-
+
 # Run next section by default only if all previous was successful
 default_protected_run = False
 
@@ -40,81 +177,158 @@ default_protected_run = False
 # name2_key = *
 # name1_sweep_action = file {}
 # name2_sweep_action = file {}
+# childs are listed for each parent item using 'as_child_options'
+# name2_as_child_options = --parent {}:item.name1.raw
+# or listed once and linked to parent items by a reference field,
+# 'join_to' is the level the field refers to, previous level by default
+# name2_join_field = parent_id
+# name2_join_to = name1
 
-# bash command to get list of objects to clean, no quotes
+# command to get list of objects to clean, no shell is started:
+# quotes work like in shell, but not variables, pipes or redirects
 # list_action = find . -maxdepth 1 -type f
 
-# openstack client has table heading, use this to parse data to dict
+# output of list action: 'json' array of dicts, 'raw' lines or
+# 'table', 'csv' and 'value' outputs of openstack client ('-f table').
+# Table and csv columns are named by the header; 'value' output has none,
+# so its columns are set in order, only the last one could have spaces.
+# Table cells should not have '|' in them. Only key, filter field,
+# join field and fields of filter rules are taken from rows of these,
+# unless 'keep_output' is set
+# output_format = value
+# output_columns = ID, Name, Status
+
+# field or column of item that is passed to sweep action
 key = ID
 
 # bash command for action on single object, brackets to mark argument placement
 # use indices if you place same argument multiple times, just like in Python :)
+# steps chained by ';' run one after another, step after '&&' runs
+# only if previous one succeeded. Command is parsed once on load,
+# items only fill in its placeholders, each one as single argument
 # sweep_action = file {}
 # sweep_action = file {0}; tail {0}
+# sweep_action = python:module.func {}
+
+# override [sweeper] concurrency for this section
+# concurrency = 4
+
+# sweep several items with one command, if the tool supports it
+# sweep_batch_size = 20
+
+# sections to wait for, comma separated. Empty value means no dependencies.
+# If not set, section waits for the previous one in the list.
+# 'protected_run' checks only sections listed here and their dependencies
+# depends_on = 04-Servers, 06-Volumes
+
+# service tag for rate limits, levels of action_map could override it.
+# 'rate_limit' declares limit for the service, lowest one is used
+# service = compute
+# rate_limit = 5
+
+# scripts for this section only, 'pre_script' runs on top of common one
+# pre_script = export OS_PROJECT_NAME=admin
+# post_script =
+
+# wait for swept items to disappear from listing, levels could override.
+# Levels listed for each parent need own 'wait_list_action' to be polled
+# wait_until_gone = True
+# name2_wait_list_action = find . -maxdepth 2 -type f
+
+# sweep items as they are listed, ignored with 'action_map'
+# pipeline = True
+# listing is not done ahead of time, it depends on previous sections
+# prefetch = False
 ############
 
 [01-Users]
 # Remove users
+service = identity
+depends_on =
 list_action = openstack user list
 key = ID
 sweep_action = openstack user delete {}
 
 [02-Roles]
 # Remove roles
+service = identity
+depends_on =
 list_action = openstack role list
 key = ID
 sweep_action = openstack role delete {}
 
 [03-Service]
 # Remove services
+service = identity
+depends_on =
 list_action = openstack service list
 key = ID
 sweep_action = openstack service delete {}
 
 [04-Servers]
 # Remove created instances
+service = compute
+depends_on =
 list_action = openstack server list --all
 key = ID
 sweep_action = openstack server delete {}
+# sweep_batch_size = 20
+# wait_until_gone = True
 
 [05-Snapshots]
 # Remove created snapshots
+service = volume
+depends_on =
 list_action = cinder snapshot-list --all
 key = ID
 sweep_action = cinder snapshot-reset-state {0}; cinder snapshot-delete {0} --force
 
 [06-Volumes]
 # Remove created volumes
+service = volume
+depends_on = 04-Servers, 05-Snapshots
 list_action = openstack volume list --all
 key = ID
 sweep_action = cinder reset-state {0}; openstack volume delete {0}
+# wait_until_gone = True
 
 [07-VolumeTypes]
 # Remove created volume types
+service = volume
+depends_on = 06-Volumes
 list_action = cinder type-list
 key = ID
 sweep_action = cinder type-delete {}
 
 [08-Images]
 # Remove created images
+service = image
+depends_on = 04-Servers
 list_action = openstack image list
 key = ID
 sweep_action = openstack image delete {}
+# sweep_batch_size = 20
 
 [09-SecurityGroups]
 # Remove created Security Groups
+service = network
+depends_on = 04-Servers
 list_action = openstack security group list --all
 key = ID
 sweep_action = openstack security group delete {}
 
 [10-KeyPairs]
 # Remove created SSH key pairs
+service = compute
+depends_on =
 list_action = openstack keypair list
 key = ID
 sweep_action = openstack keypair delete {}
 
 [11-Networks]
 # Remove created networks, and its subsidiaries
+service = network
+depends_on = 04-Servers
 action_map = network.subnet.port
 
 network_list_action = openstack network list
@@ -125,6 +339,8 @@ subnet_list_action = openstack subnet list
 subnet_key = ID
 subnet_sweep_action = openstack subnet delete {}:item.subnet.ID
 subnet_as_child_options = --network {}:item.network.ID
+# or list all subnets once and link them by network
+# subnet_join_field = Network
 
 port_list_action = openstack port list
 port_key = ID
@@ -133,30 +349,43 @@ port_as_child_options = --network {}:item.network.ID
 
 [12-Routers]
 # Remove created routers
+service = network
+depends_on = 11-Networks
 list_action = openstack router list
 key = ID
 sweep_action = openstack router delete {}
 
 [13-Regions]
 # Remove created regions
+service = identity
+depends_on =
 list_action = openstack region list
 key = ID
 sweep_action = openstack region delete {}
 
 [14-Stacks]
 # Remove created heat stacks, include nested
+service = orchestration
+depends_on = 06-Volumes, 12-Routers
 list_action = openstack stack list --nested
 key = ID
 sweep_action = openstack stack delete -y {}
+# wait_until_gone = True
 
 [15-Containers]
 # Remove any test containers
+service = object-store
+depends_on =
 list_action = openstack container list --all
 key = ID
 sweep_action = openstack container delete {}
 
 [16-Projects]
 # Remove projects, run only if all others were successful
+service = identity
+depends_on = 01-Users, 02-Roles, 03-Service, 07-VolumeTypes,
+    08-Images, 09-SecurityGroups, 10-KeyPairs, 13-Regions, 14-Stacks,
+    15-Containers
 protected_run = True
 list_action = openstack project list
 key = ID
@@ -0,0 +1,107 @@
+import random
+import re
+
+retryable = "retryable"
+permanent = "permanent"
+conflict = "conflict"
+
+_return_code_prefix = "rc:"
+
+
+def _compile_rules(text):
+    # lines like 'rc:2' are exit codes, others are regexes for error output
+    _codes = set()
+    _patterns = []
+    for _line in (text or "").splitlines():
+        _line = _line.strip()
+        if len(_line) == 0:
+            continue
+        if _line.startswith(_return_code_prefix):
+            _codes.add(int(_line[len(_return_code_prefix):]))
+        else:
+            _patterns.append("(?:{})".format(_line))
+    if _patterns:
+        return _codes, re.compile("|".join(_patterns))
+    return _codes, None
+
+
+class RetryPolicy(object):
+    """
+    Decides if failed command should be retried and when.
+    Failures are classified by exit code or error output:
+    'permanent' ones are never retried, 'conflict' ones (i.e. object
+    is still in use) wait longer than 'retryable' ones.
+    Delay grows exponentially with each attempt, jitter spreads retries
+    of many items in time.
+
+    :param retry_count: attempts to retry failed command
+    :param timeout: milliseconds to wait before first retry
+    :param max_timeout: milliseconds limit for a single wait
+    :param conflict_timeout: milliseconds before first retry of conflicts
+    :param jitter: randomize delays between half and full value
+    :param permanent: rules for permanent failures, one per line
+    :param conflict: rules for conflict failures, one per line
+    """
+    def __init__(
+            self,
+            retry_count=0,
+            timeout=0,
+            max_timeout=None,
+            conflict_timeout=None,
+            jitter=True,
+            permanent=None,
+            conflict=None
+    ):
+        self.retry_count = retry_count
+        self.timeout = timeout
+        self.max_timeout = max_timeout
+        if conflict_timeout is None:
+            conflict_timeout = timeout
+        self.conflict_timeout = conflict_timeout
+        self.jitter = jitter
+        self._permanent = _compile_rules(permanent)
+        self._conflict = _compile_rules(conflict)
+
+    @staticmethod
+    def _matches(rules, rc, error):
+        _codes, _regex = rules
+        if rc in _codes:
+            return True
+        if _regex is not None and error and _regex.search(error):
+            return True
+        return False
+
+    def classify(self, rc, error):
+        """
+        Get class of failure
+
+        :param rc: return code
+        :param error: error output
+        :return: None on success, 'permanent', 'conflict' or 'retryable'
+        """
+        if rc == 0:
+            return None
+        if self._matches(self._permanent, rc, error):
+            return permanent
+        if self._matches(self._conflict, rc, error):
+            return conflict
+        return retryable
+
+    def get_delay(self, attempt, failure_class=retryable):
+        """
+        Get delay before retry
+
+        :param attempt: number of retry, starting from 1
+        :param failure_class: result of 'classify'
+        :return: delay in milliseconds
+        """
+        if failure_class == conflict:
+            _delay = self.conflict_timeout
+        else:
+            _delay = self.timeout
+        _delay = _delay * (2 ** (attempt - 1))
+        if self.max_timeout is not None:
+            _delay = min(_delay, self.max_timeout)
+        if self.jitter:
+            _delay = random.uniform(_delay / 2.0, _delay)
+        return _delay
@@ -0,0 +1,160 @@
+import threading
+
+from common import logger
+from utils.exception import SectionDependencyCycle
+
+
+def resolve_dependencies(sections, declared):
+    """
+    Build dependency graph for sections.
+    Section with no 'depends_on' option waits for the previous
+    section in the list, just like sequential execution does.
+
+    :param sections: ordered list of section names
+    :param declared: dict of section -> list of dependencies or None
+    :return: dict of section -> list of dependencies
+    """
+    _dependencies = {}
+    _previous = None
+    for section in sections:
+        _declared = declared.get(section)
+        if _declared is None:
+            _dependencies[section] = [_previous] if _previous else []
+        else:
+            _dependencies[section] = list(_declared)
+        _previous = section
+
+    # make sure there is no loops
+    _order = []
+    _visiting = []
+
+    def _visit(section):
+        if section in _order:
+            return
+        if section in _visiting:
+            raise SectionDependencyCycle(
+                _visiting[_visiting.index(section):]
+            )
+        _visiting.append(section)
+        for dependency in _dependencies.get(section, []):
+            _visit(dependency)
+        _visiting.pop()
+        _order.append(section)
+
+    for section in sections:
+        _visit(section)
+
+    return _dependencies
+
+
+def get_ancestors(dependencies, section):
+    """
+    Get all sections that should be finished before given one
+
+    :param dependencies: graph from resolve_dependencies
+    :param section: section name
+    :return: set of section names
+    """
+    _ancestors = set()
+    _stack = list(dependencies.get(section, []))
+    while _stack:
+        _section = _stack.pop()
+        if _section not in _ancestors:
+            _ancestors.add(_section)
+            _stack.extend(dependencies.get(_section, []))
+    return _ancestors
+
+
+class SectionScheduler(object):
+    """
+    Runs sections as soon as all of its dependencies are finished,
+    up to 'concurrency' sections at once.
+    Dependencies on sections that are not scheduled are ignored.
+    Ready sections are started in the order of supplied list.
+    """
+    def __init__(self, sections, dependencies, concurrency=1):
+        self.sections = list(sections)
+        self.concurrency = max(concurrency, 1)
+        self.dependencies = {}
+        for section in self.sections:
+            self.dependencies[section] = [
+                _dep for _dep in dependencies.get(section, [])
+                if _dep in self.sections
+            ]
+
+        self.results = {}
+        self._running = []
+        self._errors = []
+        self._lock = threading.Condition()
+
+    def _is_ready(self, section):
+        for dependency in self.dependencies[section]:
+            if dependency not in self.results:
+                return False
+        return True
+
+    def _worker(self, runner, section):
+        try:
+            _rc = runner(section)
+        except Exception as e:
+            logger.error("Section '{}' failed: {}".format(section, e))
+            _rc = 1
+            self._errors.append(e)
+
+        with self._lock:
+            self.results[section] = _rc
+            self._running.remove(section)
+            self._lock.notify_all()
+
+    def run(self, runner):
+        """
+        Execute 'runner' for each section, blocks until all are done
+
+        :param runner: callable that gets section name and returns rc
+        :return: dict of section -> rc
+        """
+        _pending = list(self.sections)
+        _threads = []
+
+        with self._lock:
+            while _pending or self._running:
+                if self._errors:
+                    # do not start anything new after failure
+                    del _pending[:]
+                # start all ready sections while there is a free slot
+                for section in list(_pending):
+                    if len(self._running) >= self.concurrency:
+                        break
+                    if not self._is_ready(section):
+                        continue
+                    _pending.remove(section)
+                    self._running.append(section)
+                    logger.debug("Scheduling section '{}'".format(section))
+                    if self.concurrency == 1:
+                        # run inline, no need for a thread
+                        self._lock.release()
+                        try:
+                            self._worker(runner, section)
+                        finally:
+                            self._lock.acquire()
+                        # rescan pending sections from the start
+                        break
+                    _thread = threading.Thread(
+                        target=self._worker,
+                        args=(runner, section)
+                    )
+                    _thread.daemon = True
+                    _thread.start()
+                    _threads.append(_thread)
+
+                if self._running:
+                    # short waits keep main thread interruptible
+                    self._lock.wait(0.5)
+
+        for _thread in _threads:
+            _thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        return self.results
@@ -0,0 +1,292 @@
+import os
+import re
+import select
+import threading
+from subprocess import PIPE, Popen
+from time import time
+
+from common import logger
+from utils.exception import FailedToOpenProcess
+
+# return code of commands that lost its session
+session_failed_return_code = -1
+
+_read_chunk_size = 65536
+
+
+class CLISession(object):
+    """
+    Long living interactive session of a CLI tool.
+    Commands are written to its stdin one per line. Each command is
+    followed by a marker command, reply ends with the line that has
+    the marker printed. If number follows the marker it is used as
+    return code, otherwise command failed if it wrote to stderr.
+
+    :param argv: list, program and options to start the session
+    :param marker_cmd: command that prints its argument, '{}' is marker
+    :param prompt: prompt printed by session, removed from replies
+    :param env: environment for the session, None is current one
+    """
+    def __init__(self, argv, marker_cmd="echo {}", prompt=None, env=None):
+        self.argv = argv
+        self.marker_cmd = marker_cmd
+        self.prompt = prompt
+        self.commands_done = 0
+        # reason of the last failure
+        self.error = None
+        try:
+            self._process = Popen(
+                argv,
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=PIPE,
+                close_fds=True,
+                env=env
+            )
+        except OSError as e:
+            raise FailedToOpenProcess(" ".join(argv), e.strerror)
+        logger.debug("Session started, pid {}: '{}'".format(
+            self._process.pid,
+            " ".join(argv)
+        ))
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def _read_reply(self, marker, timeout, consumer=None, capture_limit=0):
+        # output is split in lines as it comes, each chunk is scanned
+        # once; complete lines before the marker one go to consumer
+        # right away, only 'capture_limit' bytes of them are kept then
+        _out_fd = self._process.stdout.fileno()
+        _err_fd = self._process.stderr.fileno()
+        _captured = []
+        _captured_size = 0
+        _err = []
+        _deadline = time() + timeout if timeout > 0 else None
+        _marker_line = re.compile(
+            r"^.*{}(?:\s+(-?\d+))?[^\n]*\n".format(re.escape(marker))
+        )
+        # parts of the line that is not complete yet, its last chars
+        # are kept to find marker split between chunks
+        _parts = []
+        _overlap = len(marker) - 1
+        _last = ""
+        _has_marker = False
+        _match = None
+
+        while _match is None:
+            _wait = None
+            if _deadline is not None:
+                _wait = _deadline - time()
+                if _wait <= 0:
+                    self.error = "Timed out after {}s".format(timeout)
+                    return None, None
+            _ready, _, _ = select.select([_out_fd, _err_fd], [], [], _wait)
+            if _err_fd in _ready:
+                _err.append(os.read(_err_fd, _read_chunk_size))
+            if _out_fd not in _ready:
+                continue
+            _chunk = os.read(_out_fd, _read_chunk_size)
+            if not _chunk:
+                self.error = "Session ended, rc={}".format(
+                    self._process.poll()
+                )
+                return None, None
+
+            _lines = []
+            _start = 0
+            while True:
+                _end = _chunk.find("\n", _start)
+                _piece = _chunk[_start:] if _end < 0 else \
+                    _chunk[_start:_end + 1]
+                if not _has_marker and marker in _last + _piece:
+                    _has_marker = True
+                if _end < 0:
+                    _parts.append(_piece)
+                    _last = (_last + _piece)[-_overlap:]
+                    break
+                _parts.append(_piece)
+                _line = "".join(_parts)
+                _parts = []
+                _last = ""
+                _start = _end + 1
+                if _has_marker:
+                    _match = _marker_line.match(_line)
+                    _tail = _chunk[_start:]
+                    break
+                _lines.append(_line)
+
+            _output = "".join(_lines)
+            if self.prompt:
+                _output = _output.replace(self.prompt, "")
+            if not _output:
+                continue
+            if consumer is None:
+                _captured.append(_output)
+            else:
+                consumer(_output)
+                if _captured_size < capture_limit:
+                    _captured.append(_output[:capture_limit - _captured_size])
+                    _captured_size += len(_captured[-1])
+
+        # errors are written before the marker, so it is in the pipe already
+        while select.select([_err_fd], [], [], 0)[0]:
+            _chunk = os.read(_err_fd, _read_chunk_size)
+            if not _chunk:
+                break
+            _err.append(_chunk)
+
+        _err = "".join(_err)
+        if _match.group(1) is not None:
+            _rc = int(_match.group(1))
+        else:
+            _rc = 1 if _err else 0
+        return ("".join(_captured), _err, _rc), _tail
+
+    def execute(self, cmd, timeout=0, consumer=None, capture_limit=0):
+        """
+        Run single command in the session
+
+        :param cmd: command line for the session, without program name
+        :param timeout: seconds to wait for reply, 0 is no timeout
+        :param consumer: callable that gets output by chunks as it comes
+        :param capture_limit: bytes of output returned if there is consumer
+        :return: tuple of output, error, return code
+                 or None if session failed and should be dropped
+        """
+        _marker = "__janitor_{}__".format(os.urandom(16).encode("hex"))
+        try:
+            self._process.stdin.write("{}\n{}\n".format(
+                cmd,
+                self.marker_cmd.format(_marker)
+            ))
+            self._process.stdin.flush()
+        except IOError as e:
+            self.error = "Session input closed: {}".format(e)
+            return None
+        _result, _tail = self._read_reply(
+            _marker,
+            timeout,
+            consumer=consumer,
+            capture_limit=capture_limit
+        )
+        if _result is None:
+            return None
+        if _tail.strip(self.prompt or "").strip():
+            # something is printed after the marker, replies are mixed
+            self.error = "Unexpected output after reply: {}".format(_tail)
+            return None
+        self.commands_done += 1
+        return _result
+
+    def close(self):
+        """
+        Stop the session
+        """
+        if not self.is_alive():
+            return
+        try:
+            self._process.kill()
+        except OSError:
+            pass
+        self._process.wait()
+        logger.debug("Session stopped, pid {}, {} commands done".format(
+            self._process.pid,
+            self.commands_done
+        ))
+
+
+class SessionPool(object):
+    """
+    Up to 'size' sessions started on demand and reused.
+    Failed sessions are dropped, new one is started in its place.
+
+    :param factory: callable that starts new CLISession
+    :param size: max sessions running at once
+    :param is_stale: callable, True if idle session should be restarted
+    """
+    def __init__(self, factory, size=1, is_stale=None):
+        self.factory = factory
+        self.size = max(size, 1)
+        self.is_stale = is_stale
+        self._idle = []
+        self._sessions = set()
+        self._starting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            if self.is_stale is not None:
+                for _session in [_s for _s in self._idle if self.is_stale(_s)]:
+                    self._idle.remove(_session)
+                    self._sessions.discard(_session)
+                    _session.close()
+            while not self._idle \
+                    and len(self._sessions) + self._starting >= self.size:
+                self._condition.wait(0.5)
+            if self._idle:
+                return self._idle.pop()
+            # reserve a place while session is starting
+            self._starting += 1
+
+        try:
+            _session = self.factory()
+        except Exception:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._starting -= 1
+            self._sessions.add(_session)
+        return _session
+
+    def release(self, session, failed=False):
+        with self._condition:
+            if failed or not session.is_alive():
+                self._sessions.discard(session)
+                session.close()
+                logger.warn("Session pid {} dropped: {}".format(
+                    session.pid,
+                    session.error
+                ))
+            else:
+                self._idle.append(session)
+            self._condition.notify()
+
+    def execute(self, cmd, timeout=0, consumer=None, capture_limit=0):
+        """
+        Run command in any idle session
+
+        :param cmd: command line for the session
+        :param timeout: seconds to wait for reply, 0 is no timeout
+        :param consumer: callable that gets output by chunks as it comes
+        :param capture_limit: bytes of output returned if there is consumer
+        :return: tuple of output, error, return code
+        """
+        _session = self.acquire()
+        _result = None
+        try:
+            _result = _session.execute(
+                cmd,
+                timeout=timeout,
+                consumer=consumer,
+                capture_limit=capture_limit
+            )
+        finally:
+            self.release(_session, failed=_result is None)
+        if _result is None:
+            return None, _session.error, session_failed_return_code
+        return _result
+
+    def close(self):
+        with self._condition:
+            _sessions = list(self._sessions)
+            self._sessions = set()
+            self._idle = []
+        for _session in _sessions:
+            _session.close()
@@ -4,7 +4,9 @@ import sys
 import traceback
 
 import janitor
-from common import logger, logger_cli
+from common import logger, logger_cli, setup_file_log
+from janitor.prefetch import ListingPrefetcher
+from janitor.scheduler import SectionScheduler
 from janitor.sweeper import Sweeper
 
 pkg_dir = os.path.dirname(__file__)
@@ -26,12 +28,115 @@ def help_message():
     return
 
 
+def apply_section(sweep, _section, section_plan):
+    # Execute sweep for items from plan, no listing
+    logger_cli.info("\n### {}".format(_section))
+    if sweep.is_section_dropped(_section):
+        return 0
+
+    _count = sweep.load_section_plan(_section, section_plan)
+    logger_cli.info("# {}: planned {}.".format(_section, _count))
+    return sweep.sweep_action(_section)
+
+
+def pipeline_section(sweep, _section):
+    # list and sweep at once, items are swept as they are listed
+    rc = sweep.pipeline_action(_section)
+    logger_cli.info("# {}: listed {}, matched {}.".format(
+        _section,
+        sweep.get_section_listed_count(_section),
+        len(sweep.get_section_filtered_output(_section) or [])
+    ))
+    return rc
+
+
+def is_sweeping(args):
+    # items are swept right after listing
+    return not args.stat_only and args.sweep and args.plan is None
+
+
+def process_section(sweep, _section, args, prefetcher=None):
+    # Execute as usual
+    logger_cli.info("\n### {}".format(_section))
+    if is_sweeping(args) and args.bash_action not in ['list'] \
+            and sweep.is_section_pipelined(_section):
+        return pipeline_section(sweep, _section)
+    # Collect all data, listing could be done ahead
+    if prefetcher is not None:
+        rc = prefetcher.list_action(_section)
+    else:
+        rc = sweep.list_action(_section)
+    if rc != 0:
+        logger_cli.error("\t({}) '{}'\n\tERROR: {}".format(
+            rc,
+            sweep.get_section_list_cmd(_section),
+            sweep.get_section_list_error(_section)
+        ))
+    elif args.bash_action not in ['list']:
+        _filtered_output = sweep.get_section_filtered_output(_section)
+        _count = len(_filtered_output or [])
+        logger_cli.info("# {}: listed {}, matched {}.".format(
+            _section,
+            sweep.get_section_listed_count(_section),
+            _count
+        ))
+
+        # Log collected data stats
+        if is_sweeping(args):
+            # Do sweep actions
+            rc = sweep.sweep_action(
+                _section
+            )
+
+    return rc
+
+
+def resume_section(sweep, _section, args):
+    # continue section from where interrupted run stopped
+    _state = sweep.journal_state
+    if _state.is_done(_section):
+        logger_cli.info("\n### {}\n# {}: done in previous run.".format(
+            _section,
+            _section
+        ))
+        return 0
+    if _section not in _state.listings:
+        return process_section(sweep, _section, args)
+
+    logger_cli.info("\n### {}".format(_section))
+    if sweep.is_section_dropped(_section):
+        return 0
+    _count = sweep.load_section_plan(
+        _section,
+        _state.listings[_section],
+        swept=_state.get_swept(_section)
+    )
+    logger_cli.info("# {}: {} left from previous run.".format(
+        _section,
+        _count
+    ))
+    return sweep.sweep_action(_section)
+
+
+def finishing(sweep, runner, prefetcher=None):
+    # section 'post_script' runs once the section is done
+    def _run(_section):
+        try:
+            return runner(_section)
+        finally:
+            sweep.finish_section(_section)
+            if prefetcher is not None:
+                prefetcher.finish(_section)
+    return _run
+
+
 # Main
 def sweeper_cli():
     _title = "Janitor:Sweeper CLI util"
     _cmd = "sweeper"
     parser = MyParser(prog=_cmd)
 
+    setup_file_log()
     logger_cli.info(_title)
     logger.info("=========> Sweep execution started")
 
@@ -56,6 +161,40 @@ def sweeper_cli():
         help="Do sweep action of all objects listed"
     )
 
+    parser.add_argument(
+        "--plan",
+        default=None,
+        help="List objects only and save items with its sweep commands "
+             "to a plan file"
+    )
+
+    parser.add_argument(
+        "--apply",
+        default=None,
+        help="Do sweep action of all objects from a plan file, no listing"
+    )
+
+    parser.add_argument(
+        "--max-plan-age",
+        type=int,
+        default=None,
+        help="Do not apply a plan that is older than this, in seconds"
+    )
+
+    parser.add_argument(
+        "--journal",
+        default=None,
+        help="Record listings and swept items to a journal file, "
+             "so interrupted sweep could be resumed"
+    )
+
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Continue interrupted sweep from its journal file, "
+             "sections and items done are skipped"
+    )
+
     parser.add_argument(
         "--bash-action",
         default=None,
@@ -68,17 +207,151 @@ def sweeper_cli():
         default=None, help="Overide profile default filter"
     )
 
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Override profile default of sweep commands executed at once"
+    )
+
+    parser.add_argument(
+        "--section-concurrency",
+        type=int,
+        default=None,
+        help="Override profile default of sections executed at once"
+    )
+
+    parser.add_argument(
+        "--process-budget",
+        type=int,
+        default=None,
+        help="Override profile default of processes running at once, "
+             "0 is no limit"
+    )
+
+    parser.add_argument(
+        "--engine",
+        default=None,
+        help="Override profile default engine to run commands. "
+             "Options: 'blocking', 'session', 'asyncio'"
+    )
+
+    parser.add_argument(
+        "--metrics-json",
+        default=None,
+        help="Override profile default file to save metrics report as JSON"
+    )
+
+    parser.add_argument(
+        "--metrics-prometheus",
+        default=None,
+        help="Override profile default file to save metrics report "
+             "for Prometheus textfile collector"
+    )
+
     parser.add_argument(
         "--section",
         default=None, help="Execute actions from specific section of a profile"
     )
 
+    parser.add_argument(
+        "--daemon",
+        default=None,
+        help="Run as daemon, accepting requests on this Unix socket. "
+             "Profiles are kept loaded between requests"
+    )
+
+    parser.add_argument(
+        "--connect",
+        default=None,
+        help="Send request to daemon listening on this Unix socket "
+             "instead of running here"
+    )
+
+    parser.add_argument(
+        "--daemon-status",
+        action="store_true", default=False,
+        help="Show runs and profiles of the daemon, use with --connect"
+    )
+
+    parser.add_argument(
+        "--stop-daemon",
+        action="store_true", default=False,
+        help="Stop the daemon, use with --connect"
+    )
+
+    parser.add_argument(
+        "--targets",
+        default=None,
+        help="Run profile for each target from this file in own process, "
+             "target sections set environment variables"
+    )
+
+    parser.add_argument(
+        "--target-concurrency",
+        type=int,
+        default=4,
+        help="Targets running at once, use with --targets"
+    )
+
+    parser.add_argument(
+        "--target-output",
+        default=None,
+        help="Folder to save output of each target to, use with --targets"
+    )
+
+    parser.add_argument(
+        "--targets-report",
+        default=None,
+        help="Save merged results of targets to a file as JSON, "
+             "use with --targets"
+    )
+
     parser.add_argument(
         'profile',
+        nargs='?',
         help="Action profile to execute"
     )
 
     args = parser.parse_args()
+    if args.resume is not None:
+        if args.plan is not None or args.apply is not None:
+            parser.error("--resume can't be used with --plan or --apply")
+        args.sweep = True
+    if args.targets is not None:
+        for _name in ("plan", "apply", "journal", "resume", "daemon",
+                      "connect"):
+            if getattr(args, _name) is not None:
+                parser.error("--targets can't be used with --{}".format(
+                    _name
+                ))
+
+    # daemon, plan, journal and fan-out modules are imported only when
+    # used, cheap calls like listing of sections should start fast
+    if args.daemon is not None:
+        from janitor.daemon import SweeperDaemon
+        SweeperDaemon(
+            args.daemon,
+            lambda options: load_sweeper(argparse.Namespace(**options)),
+            lambda sweep, options: run_sweep(
+                sweep,
+                argparse.Namespace(**options)
+            )
+        ).serve_forever()
+        return
+    if args.connect is not None and (args.daemon_status or args.stop_daemon):
+        from janitor.daemon import request
+        _result = request(
+            args.connect,
+            {"command": "status" if args.daemon_status else "stop"}
+        )
+        for _name in ("running", "queued", "loaded"):
+            if _name in _result:
+                logger_cli.info("# {}: {}".format(_name, _result[_name]))
+        return
+    if args.profile is None:
+        parser.error("profile is required")
 
     # Some info on current config values
     logger_cli.debug(
@@ -97,13 +370,86 @@ def sweeper_cli():
         logger_cli.error("Profile '{}' not found".format(args.profile))
         sys.exit(1)
 
+    if args.connect is not None:
+        from janitor.daemon import path_options, request
+        # daemon has own working folder, file names are made absolute
+        _options = dict(
+            (_name, _value) for _name, _value in vars(args).items()
+            if _name not in ("daemon", "connect", "daemon_status",
+                             "stop_daemon")
+        )
+        for _name in path_options:
+            if _options.get(_name) is not None:
+                _options[_name] = os.path.abspath(_options[_name])
+        request(args.connect, {"command": "run", "options": _options})
+        return
+
+    if args.targets is not None:
+        fan_out(args)
+        return
+
+    sweep = load_sweeper(args)
+    try:
+        run_sweep(sweep, args)
+    finally:
+        sweep.engine.close()
+
+
+def fan_out(args):
+    """
+    Run profile for each target from targets file, in own processes,
+    and show merged results
+
+    :param args: parsed CLI options
+    """
+    from janitor.fanout import print_report, read_targets, run_targets, \
+        write_report
+    _targets = read_targets(args.targets)
+    logger_cli.info("# Running {} targets, {} at once".format(
+        len(_targets),
+        args.target_concurrency
+    ))
+    _report = run_targets(
+        _targets,
+        lambda: load_sweeper(args),
+        lambda sweep: run_sweep(sweep, args),
+        concurrency=args.target_concurrency,
+        output_dir=args.target_output
+    )
+    print_report(_report)
+    if args.targets_report is not None:
+        write_report(args.targets_report, _report)
+
+
+def load_sweeper(args):
     # Load profile
-    sweep = Sweeper(
+    return Sweeper(
         args.filter_regex,
         args.profile,
-        args.bash_action
+        args.bash_action,
+        concurrency=args.concurrency,
+        section_concurrency=args.section_concurrency,
+        process_budget=args.process_budget,
+        engine=args.engine,
+        metrics_json=args.metrics_json,
+        metrics_prometheus=args.metrics_prometheus
     )
+
+
+def run_sweep(sweep, args):
+    """
+    Run sections of loaded profile as asked by CLI options,
+    engine of the profile is left running
+
+    :param sweep: Sweeper instance
+    :param args: parsed CLI options
+    """
     logger_cli.info("### {}".format(sweep.banner))
+    if args.resume is not None:
+        sweep.start_journal(args.resume, resume=True)
+    elif args.journal is not None and \
+            (args.sweep or args.apply is not None):
+        sweep.start_journal(args.journal)
     _sections = []
 
     if args.list_sections:
@@ -111,16 +457,34 @@ def sweeper_cli():
         logger_cli.info("Sections available in profile '{}'".format(
             args.profile
         ))
-        for section in sweep.sections_list:
-            logger_cli.info("# {}".format(section))
+        for section in sweep.sweep_items_list:
+            _depends_on = sweep.section_dependencies[section]
+            if _depends_on:
+                logger_cli.info("# {} (after: {})".format(
+                    section,
+                    ", ".join(_depends_on)
+                ))
+            else:
+                logger_cli.info("# {}".format(section))
     elif args.section is not None:
         _sections = [args.section]
     else:
         _sections = sweep.sweep_items_list
 
-    # do main flow
-    while len(_sections) > 0:
-        _section = _sections.pop(0)
+    _plan = None
+    if args.apply is not None:
+        from janitor.plan import read_plan
+        # only sections from plan, in its order
+        _plan, _planned = read_plan(
+            args.apply,
+            sweep,
+            max_age=args.max_plan_age
+        )
+        _sections = [_s for _s in _planned if _s in _sections]
+
+    # do main flow, sections are started once its dependencies are done
+    _present = []
+    for _section in _sections:
         # check if section is present in profile
         if not sweep.is_section_present(_section):
             logger_cli.error("# !!! Section'{}' not present in '{}'".format(
@@ -128,37 +492,68 @@ def sweeper_cli():
                 args.profile
             ))
             continue
+        _present.append(_section)
 
-        # Execute as usual
-        logger_cli.info("\n### {}".format(_section))
-        # Collect all data
-        rc = sweep.list_action(_section)
-        if rc != 0:
-            logger_cli.error("\t({}) '{}'\n\tERROR: {}".format(
-                rc,
-                sweep.get_section_list_cmd(_section),
-                sweep.get_section_list_error(_section)
+    scheduler = SectionScheduler(
+        _present,
+        sweep.section_dependencies,
+        concurrency=sweep.section_concurrency
+    )
+    _prefetcher = None
+    try:
+        if _plan is not None:
+            scheduler.run(finishing(
+                sweep,
+                lambda section: apply_section(sweep, section, _plan[section])
             ))
-        elif args.bash_action not in ['list']:
-            _all_output = sweep.get_section_output(_section)
-            _filtered_output = sweep.get_section_filtered_output(_section)
-            _count = len(_filtered_output)
-            logger_cli.info("# listed {}, matched {}.".format(
-                len(_all_output),
-                _count
+        elif sweep.journal_state is not None:
+            scheduler.run(finishing(
+                sweep,
+                lambda section: resume_section(sweep, section, args)
             ))
-
-            # Log collected data stats
-            if args.stat_only:
-                continue
-            else:
-                if args.sweep:
-                    # Do sweep actions
-                    rc = sweep.sweep_action(
-                        _section
-                    )
-
-                _count -= 1
+        else:
+            if sweep.prefetch_sections > 0 and args.bash_action is None:
+                # pipelined sections list on their own
+                _prefetcher = ListingPrefetcher(
+                    sweep,
+                    _present,
+                    [
+                        _s for _s in _present
+                        if sweep.is_section_prefetched(_s) and not (
+                            is_sweeping(args)
+                            and sweep.is_section_pipelined(_s)
+                        )
+                    ],
+                    sweep.section_dependencies,
+                    lookahead=sweep.prefetch_sections,
+                    concurrency=sweep.prefetch_concurrency
+                )
+            _results = scheduler.run(finishing(
+                sweep,
+                lambda section: process_section(
+                    sweep,
+                    section,
+                    args,
+                    prefetcher=_prefetcher
+                ),
+                prefetcher=_prefetcher
+            ))
+            if args.plan is not None:
+                from janitor.plan import write_plan
+                write_plan(
+                    args.plan,
+                    sweep,
+                    [_s for _s in _present if _results.get(_s) == 0]
+                )
+    except KeyboardInterrupt:
+        logger_cli.warn("\n# Interrupted, cancelling running actions")
+        sweep.engine.cancel()
+        raise
+    finally:
+        if _prefetcher is not None:
+            _prefetcher.close()
+        sweep.finish()
+        sweep.write_metrics()
 
     logger_cli.info("\nDone")
     return
@@ -1,18 +1,34 @@
+import Queue
 import re
-import json
-
-from time import sleep
-from copy import deepcopy
-from subprocess import Popen, PIPE
+import sys
+import threading
+from time import sleep, time
 
+from command import Command, CommandTemplate, split_command, split_variables
 from common import logger, logger_cli
+from engine import ActionContext, get_engine
+from filters import ItemFilter, KeyFilter, parse_rules
+from items import SweepItem, SweepResult
+from metrics import MetricsCollector, default_buckets
+from parsers import get_parser, is_keyed_format
+from priming import PrimedEnvironment, run_script
+from pyaction import PythonActions, is_python_action
+from ratelimit import RateLimiter, parse_limits
+from retry import RetryPolicy
+from scheduler import get_ancestors, resolve_dependencies
 from utils import merge_dict
 from utils.config import ConfigFileBase
-from utils.exception import FailedToOpenProcess
+from utils.exception import PlanInvalid, PrimingFailed, SectionNotPresent
 
 _list_action_label = "list_action"
 _sweep_action_label = "sweep_action"
 
+# seconds between checks of pipeline queue, keeps waits interruptible
+_pipeline_poll_interval = 0.5
+# seconds listing waits for sweep to take items before it goes on
+# without waiting, listing could hold process slot that sweep needs
+_pipeline_stall_timeout = 30.0
+
 
 class DataCache(dict):
     def __getattr__(self, item):
@@ -35,6 +51,12 @@ class Sweeper(ConfigFileBase):
             filepath,
             bash_action,
             section_name="sweeper",
+            concurrency=None,
+            section_concurrency=None,
+            process_budget=None,
+            engine=None,
+            metrics_json=None,
+            metrics_prometheus=None
     ):
         super(Sweeper, self).__init__(section_name, filepath=filepath)
 
@@ -48,6 +70,8 @@ class Sweeper(ConfigFileBase):
             value_type=bool
         )
 
+        # filter from CLI overrides include rules of all sections
+        self.filter_override = filter_regex
         if filter_regex is not None:
             self.common_filter = re.compile(filter_regex)
         else:
@@ -58,14 +82,241 @@ class Sweeper(ConfigFileBase):
         self.default_filter_field = self.get_value("default_filter_field")
         self.retry_count = self.get_value("retry", value_type=int)
         self.retry_timeout = self.get_value("timeout", value_type=float)
-        self.action_concurrency = self.get_value("concurrency", value_type=int)
+        if concurrency is not None:
+            self.action_concurrency = concurrency
+        else:
+            self.action_concurrency = self.get_value(
+                "concurrency",
+                value_type=int
+            )
+        self.sweep_batch_size = int(self.get_with_default(
+            section_name,
+            "sweep_batch_size",
+            1
+        ))
 
-        self.protected_run_default = self.get_value(
-            "default_protected_run",
-            value_type=bool
+        # keep whole listing output in memory or matched items only
+        self.keep_output = self._ensure_boolean(str(self.get_with_default(
+            section_name,
+            "keep_output",
+            False
+        )))
+        self.output_capture_limit = int(self.get_with_default(
+            section_name,
+            "output_capture_limit",
+            65536
+        ))
+
+        # sections executed at once and
+        # limit of processes running at once for all of them, 0 is no limit
+        if section_concurrency is not None:
+            self.section_concurrency = section_concurrency
+        else:
+            self.section_concurrency = int(self.get_with_default(
+                section_name,
+                "section_concurrency",
+                1
+            ))
+        if process_budget is None:
+            process_budget = int(self.get_with_default(
+                section_name,
+                "process_budget",
+                0
+            ))
+
+        # environment prepared by 'pre_script' once for all commands,
+        # sections could have own scripts on top of it
+        self.environment = self._get_environment(section_name)
+        self.section_environments = {}
+
+        # requests per second for each service tag, 0 is no limit,
+        # sections could declare lower limits for its service
+        self.rate_limiter = RateLimiter(
+            rate=float(self.get_with_default(section_name, "rate_limit", 0)),
+            burst=float(self.get_with_default(section_name, "rate_burst", 0)),
+            adaptive=self._ensure_boolean(str(self.get_with_default(
+                section_name,
+                "rate_adaptive",
+                False
+            )))
+        )
+        for _service, _rate in parse_limits(self.get_with_default(
+                section_name,
+                "service_rate_limits",
+                None
+        )):
+            self.rate_limiter.set_limit(_service, _rate)
+
+        # timings of commands and stages, written at the end of the run
+        self.metrics_json = metrics_json or self.get_with_default(
+            section_name,
+            "metrics_json",
+            None
+        )
+        self.metrics_prometheus = metrics_prometheus or self.get_with_default(
+            section_name,
+            "metrics_prometheus",
+            None
+        )
+        self.metrics = None
+        if self.metrics_json or self.metrics_prometheus:
+            _buckets = self.get_with_default(
+                section_name,
+                "metrics_buckets",
+                None
+            )
+            self.metrics = MetricsCollector(
+                [float(_b) for _b in _buckets.split(",")]
+                if _buckets else default_buckets
+            )
+
+        # confirm swept items are gone before dependent sections start
+        self.wait_until_gone = self._ensure_boolean(str(self.get_with_default(
+            section_name,
+            "wait_until_gone",
+            False
+        )))
+        self.wait_poll_interval = float(self.get_with_default(
+            section_name,
+            "wait_poll_interval",
+            5
+        ))
+        self.wait_timeout = float(self.get_with_default(
+            section_name,
+            "wait_timeout",
+            300
+        ))
+
+        # sweep items as they are listed, queue size is how far
+        # listing could get ahead of sweep
+        self.pipeline = self._ensure_boolean(str(self.get_with_default(
+            section_name,
+            "pipeline",
+            False
+        )))
+        self.pipeline_queue_size = int(self.get_with_default(
+            section_name,
+            "pipeline_queue_size",
+            1000
+        ))
+
+        # sections listed ahead while current ones are swept,
+        # and listings running in background at once
+        self.prefetch_sections = int(self.get_with_default(
+            section_name,
+            "prefetch_sections",
+            0
+        ))
+        self.prefetch_concurrency = int(self.get_with_default(
+            section_name,
+            "prefetch_concurrency",
+            1
+        ))
+
+        # progress of the run, recorded to journal if asked
+        self.journal_sync_batch = int(self.get_with_default(
+            section_name,
+            "journal_sync_batch",
+            100
+        ))
+        self.journal = None
+        self.journal_state = None
+
+        # engine to run all of the commands
+        if engine is None:
+            engine = self.get_with_default(section_name, "engine", "blocking")
+        _engine_options = {}
+        if engine == "session":
+            # long living interactive sessions of a CLI
+            _engine_options = {
+                "session_program": self.get_with_default(
+                    section_name,
+                    "session_program",
+                    None
+                ),
+                "session_cmd": self.get_with_default(
+                    section_name,
+                    "session_cmd",
+                    None
+                ),
+                "session_marker": self.get_with_default(
+                    section_name,
+                    "session_marker",
+                    "echo {}"
+                ),
+                "session_prompt": self.get_with_default(
+                    section_name,
+                    "session_prompt",
+                    None
+                ),
+                "session_pool_size": int(self.get_with_default(
+                    section_name,
+                    "session_pool_size",
+                    1
+                ))
+            }
+        self.engine = get_engine(
+            engine,
+            process_budget=process_budget,
+            timeout=float(self.get_with_default(
+                section_name,
+                "command_timeout",
+                0
+            )),
+            retry_policy=RetryPolicy(
+                retry_count=self.retry_count,
+                timeout=self.retry_timeout,
+                max_timeout=float(self.get_with_default(
+                    section_name,
+                    "max_timeout",
+                    60000
+                )),
+                conflict_timeout=float(self.get_with_default(
+                    section_name,
+                    "conflict_timeout",
+                    self.retry_timeout * 5
+                )),
+                jitter=self._ensure_boolean(str(self.get_with_default(
+                    section_name,
+                    "retry_jitter",
+                    True
+                ))),
+                permanent=self.get_with_default(
+                    section_name,
+                    "retry_permanent",
+                    None
+                ),
+                conflict=self.get_with_default(
+                    section_name,
+                    "retry_conflict",
+                    None
+                )
+            ),
+            rate_limiter=self.rate_limiter,
+            metrics=self.metrics,
+            python_actions=PythonActions(
+                path=self.get_with_default(section_name, "python_path", None),
+                session_factory=self.get_with_default(
+                    section_name,
+                    "python_session",
+                    None
+                ),
+                pool_size=int(self.get_with_default(
+                    section_name,
+                    "python_pool_size",
+                    1
+                ))
+            ),
+            **_engine_options
+        )
+
+        self.protected_run_default = self._ensure_boolean(
+            self.get_value("default_protected_run")
         )
 
         self.last_return_code = 0
+        self.section_results = {}
+        self.dropped_sections = set()
 
         # initialize all sections
         self.sweep_items = {}
@@ -73,6 +324,10 @@ class Sweeper(ConfigFileBase):
         sweep_items_list = self._config.sections()
         sweep_items_list.remove(section_name)
         for sweep_item in sweep_items_list:
+            self.section_environments[sweep_item] = self._get_environment(
+                sweep_item,
+                base=self.environment
+            )
             self.sweep_items[sweep_item] = self._get_properties(
                 sweep_item
             )
@@ -81,11 +336,155 @@ class Sweeper(ConfigFileBase):
         if self.presort_sections:
             self.sweep_items_list.sort()
 
+        # build sections dependency graph
+        _declared = {}
+        for sweep_item in self.sweep_items_list:
+            _depends_on = self.sweep_items[sweep_item]["depends_on"]
+            for dependency in _depends_on or []:
+                if dependency not in self.sweep_items:
+                    raise SectionNotPresent(dependency, self.profilepath)
+            _declared[sweep_item] = _depends_on
+        self.section_dependencies = resolve_dependencies(
+            self.sweep_items_list,
+            _declared
+        )
+
+    def _get_environment(self, section, base=None):
+        # section without a script uses base environment as is
+        _script = self.get_safe(section, "pre_script")
+        if _script is None or len(_script.strip()) == 0:
+            return base
+
+        def _get_option(key, default):
+            return self.get_with_default(
+                section,
+                key,
+                self.get_with_default(self._global_section_name, key, default)
+            )
+
+        return PrimedEnvironment(
+            _script,
+            base=base,
+            refresh=float(_get_option("pre_script_refresh", 0)),
+            expires_var=_get_option("pre_script_expires_var", None),
+            margin=float(_get_option("pre_script_refresh_margin", 300))
+        )
+
+    def _run_post_script(self, section, environment, shared=False):
+        _script = self.get_safe(section, "post_script")
+        if self.bash_action is not None \
+                or _script is None or len(_script.strip()) == 0:
+            return
+        try:
+            if environment is None:
+                run_script(_script)
+            elif shared:
+                # environment is not revoked, other sections use it
+                environment.run(_script)
+            else:
+                # nothing to clean up if environment was never prepared
+                environment.finish(_script)
+        except PrimingFailed as e:
+            logger_cli.warn("# WARN: {}".format(e.message))
+
+    def finish_section(self, section):
+        """
+        Run 'post_script' of the section, if any
+        """
+        _environment = self.section_environments[section]
+        self._run_post_script(
+            section,
+            _environment,
+            shared=_environment is self.environment
+        )
+
+    def finish(self):
+        """
+        Run common 'post_script', if any, and close journal
+        """
+        self._run_post_script(self._global_section_name, self.environment)
+        if self.journal is not None:
+            self.journal.close()
+
+    def reset(self):
+        """
+        Forget results of the previous run, so loaded profile,
+        its engine and environment are used for the next one
+        """
+        self.last_return_code = 0
+        self.section_results = {}
+        self.dropped_sections = set()
+        self.journal = None
+        self.journal_state = None
+        if self.metrics is not None:
+            self.metrics = MetricsCollector(self.metrics.buckets)
+            self.engine.metrics = self.metrics
+        self.engine.reset()
+
+    def start_journal(self, filename, resume=False):
+        """
+        Record progress of the run to a journal
+
+        :param filename: journal file
+        :param resume: read progress of interrupted run from the journal
+                       first and continue it
+        """
+        from journal import Journal, read_journal
+        if resume:
+            self.journal_state = read_journal(filename, self.profilepath)
+        self.journal = Journal(
+            filename,
+            sync_batch=self.journal_sync_batch,
+            append=resume
+        )
+        self.journal.start(self.profilepath)
+
+    def write_metrics(self):
+        """
+        Write metrics report to files set in profile or options
+        """
+        if self.metrics is None or self.metrics.empty:
+            return
+        # report is written at the end of the run, its failure
+        # should not hide the result or the error of the run
+        try:
+            if self.metrics_json:
+                self.metrics.write_json(self.metrics_json)
+            if self.metrics_prometheus:
+                self.metrics.write_prometheus(self.metrics_prometheus)
+        except (IOError, OSError) as e:
+            logger_cli.warn("# WARN: Metrics not saved: {}".format(e))
+
+    def _observe_stage(self, section, level, action, started, rc):
+        if self.metrics is not None:
+            self.metrics.observe_stage(
+                section,
+                level,
+                action,
+                time() - started,
+                rc
+            )
+
+    def _observe_level(self, data, _map, action, started, rc):
+        # levels are accounted only if there is an action_map
+        if len(_map) > 1:
+            _context = data[action]["context"]
+            self._observe_stage(
+                _context.section,
+                _context.level,
+                action,
+                started,
+                rc
+            )
+
     def _get_subsection_properties(self, section, prefix=""):
         __section_dict = {}
 
         _list_cmd = self._config.get(section, prefix + _list_action_label)
         _sweep_cmd = self._config.get(section, prefix + _sweep_action_label)
+        if not is_python_action(_list_cmd):
+            # malformed commands fail on load, not in the middle of a run
+            _list_cmd = Command(split_command(_list_cmd))
 
         _output_format = self.get_with_default(
             section,
@@ -99,12 +498,40 @@ class Sweeper(ConfigFileBase):
             self.default_filter_field
         )
 
+        _batch_size = int(self.get_with_default(
+            section,
+            prefix + "sweep_batch_size",
+            self.sweep_batch_size
+        ))
+
+        _keep_output = self._ensure_boolean(str(self.get_with_default(
+            section,
+            prefix + "keep_output",
+            self.keep_output
+        )))
+
+        # levels share service of the section unless set,
+        # section without service tag but with a limit is a service itself
+        _service = self.get_with_default(section, "service", None)
+        _service = self.get_with_default(section, prefix + "service", _service)
+        _rate_limit = float(self.get_with_default(
+            section,
+            prefix + "rate_limit",
+            0
+        ))
+        if _rate_limit > 0:
+            if _service is None:
+                _service = section
+            self.rate_limiter.set_limit(_service, _rate_limit)
+
         if len(prefix) > 0:
             __section_dict["section_name"] = section + " ({})".format(
                 prefix[:-1]
             )
+            __section_dict["level_name"] = prefix[:-1]
         else:
             __section_dict["section_name"] = section
+            __section_dict["level_name"] = section
         __section_dict[_list_action_label] = {}
         __section_dict[_sweep_action_label] = {}
 
@@ -112,12 +539,32 @@ class Sweeper(ConfigFileBase):
         __section_dict[_list_action_label]["output"] = None
         __section_dict[_list_action_label]["error"] = None
         __section_dict[_list_action_label]["return_code"] = None
+        for _action in (_list_action_label, _sweep_action_label):
+            __section_dict[_action]["context"] = ActionContext(
+                section=section,
+                level=__section_dict["level_name"],
+                action=_action,
+                service=_service,
+                environment=self.section_environments.get(section)
+            )
 
         __section_dict["output"] = None
+        __section_dict["listed_count"] = 0
+        __section_dict["keep_output"] = _keep_output
         __section_dict["output_format"] = _output_format
         __section_dict["filter_field"] = _filter_field
+        __section_dict["filter"] = self._get_filter(
+            section,
+            prefix,
+            _filter_field,
+            _output_format
+        )
         __section_dict["filtered_output"] = None
         __section_dict["data"] = None
+        __section_dict["sweep_items"] = []
+        __section_dict["listed_items"] = {}
+        __section_dict["parent_level"] = None
+        __section_dict["planned_cmds"] = {}
         __section_dict["last_rc"] = 0
         __section_dict["key"] = self._config.get(section, prefix + "key")
         __section_dict["as_child_options"] = self.get_with_default(
@@ -125,12 +572,127 @@ class Sweeper(ConfigFileBase):
             prefix + "as_child_options",
             None
         )
+        # list childs once and link them to parents by reference field
+        __section_dict["join_field"] = self.get_with_default(
+            section,
+            prefix + "join_field",
+            None
+        )
+        __section_dict["join_to"] = self.get_with_default(
+            section,
+            prefix + "join_to",
+            None
+        )
+
+        # levels wait as the section does unless set,
+        # items are polled with level listing or 'wait_list_action'
+        _wait = self.get_with_default(
+            section,
+            "wait_until_gone",
+            self.wait_until_gone
+        )
+        __section_dict["wait_until_gone"] = self._ensure_boolean(str(
+            self.get_with_default(section, prefix + "wait_until_gone", _wait)
+        ))
+        __section_dict["wait_list_action"] = self.get_with_default(
+            section,
+            prefix + "wait_list_action",
+            None
+        )
+
+        __section_dict["parser_options"] = self._get_parser_options(
+            section,
+            prefix,
+            __section_dict
+        )
 
         __section_dict[_sweep_action_label]["cmd"] = _sweep_cmd
+        # compiled once, items only fill its slots
+        __section_dict[_sweep_action_label]["template"] = CommandTemplate(
+            _sweep_cmd
+        )
         __section_dict[_sweep_action_label]["pool"] = {}
+        __section_dict["sweep_batch_size"] = max(_batch_size, 1)
 
         return __section_dict
 
+    def _get_parser_options(self, section, prefix, data):
+        # table, csv and value outputs keep only columns level uses,
+        # whole rows are kept if output is kept or rules look at any field
+        _columns = self.get_with_default(
+            section,
+            prefix + "output_columns",
+            None
+        )
+        if _columns is not None:
+            _columns = [
+                _column.strip() for _column in _columns.split(",")
+                if _column.strip()
+            ]
+        _fields = None if data["keep_output"] else data["filter"].fields
+        if _fields is not None:
+            _fields.add(data["filter_field"])
+            if data["join_field"] is not None:
+                _fields.add(data["join_field"])
+        _options = {
+            "fields": _fields,
+            "columns": _columns,
+            "key": data["key"]
+        }
+        if not is_python_action(data[_list_action_label]["cmd"]):
+            # parser options that can't work fail on load
+            get_parser(data["output_format"], **_options)
+        return _options
+
+    def _get_filter_rules(self, section, prefix, option):
+        # section rules or default ones from main section
+        return parse_rules(self.get_with_default(
+            section,
+            prefix + option,
+            self.get_with_default(self._global_section_name, option, None)
+        ))
+
+    def _get_filter(self, section, prefix, filter_field, output_format):
+        # compile include/exclude rules once for the section
+        _include = self._get_filter_rules(section, prefix, "filter_include")
+        _include_prefixes = self._get_filter_rules(
+            section,
+            prefix,
+            "filter_include_prefixes"
+        )
+        if self.filter_override is not None:
+            _include = [(None, self.filter_override)]
+            _include_prefixes = []
+        elif not _include and not _include_prefixes:
+            _include = [(None, self.common_filter.pattern)]
+
+        # exclude rules from main section are always applied
+        _exclude = []
+        _exclude_prefixes = []
+        for _section, _option in [
+            (self._global_section_name, ""),
+            (section, prefix)
+        ]:
+            _exclude.extend(parse_rules(self.get_with_default(
+                _section,
+                _option + "filter_exclude",
+                None
+            )))
+            _exclude_prefixes.extend(parse_rules(self.get_with_default(
+                _section,
+                _option + "filter_exclude_prefixes",
+                None
+            )))
+
+        return ItemFilter(
+            _include,
+            exclude=_exclude,
+            include_prefixes=_include_prefixes,
+            exclude_prefixes=_exclude_prefixes,
+            default_field=filter_field,
+            raw=output_format == "raw"
+        )
+
     def _get_child(self, section, _map, _level, _dict):
         _levels = _map.split('.')
         _prefix = _levels[_level]
@@ -172,12 +734,45 @@ class Sweeper(ConfigFileBase):
                 {}
             )
 
-        _root_section["protected_run"] = self.get_with_default(
-            section,
-            "protected_run",
-            self.protected_run_default
-        )
+        _root_section["protected_run"] = self._ensure_boolean(str(
+            self.get_with_default(
+                section,
+                "protected_run",
+                self.protected_run_default
+            )
+        ))
+
+        # None means the section follows the previous one
+        _depends_on = self.get_safe(section, "depends_on")
+        if _depends_on is not None:
+            _depends_on = [
+                _dependency.strip() for _dependency in _depends_on.split(',')
+                if len(_dependency.strip()) > 0
+            ]
+        _root_section["depends_on"] = _depends_on
         _root_section["action_map"] = action_map
+        _root_section["concurrency"] = int(self.get_with_default(
+            section,
+            "concurrency",
+            self.action_concurrency
+        ))
+        _root_section["wait_poll_interval"] = float(self.get_with_default(
+            section,
+            "wait_poll_interval",
+            self.wait_poll_interval
+        ))
+        _root_section["wait_timeout"] = float(self.get_with_default(
+            section,
+            "wait_timeout",
+            self.wait_timeout
+        ))
+        _root_section["pipeline"] = self._ensure_boolean(str(
+            self.get_with_default(section, "pipeline", self.pipeline)
+        ))
+        # listing could be done ahead, before previous sections are swept
+        _root_section["prefetch"] = self._ensure_boolean(str(
+            self.get_with_default(section, "prefetch", True)
+        ))
 
         return _root_section
 
@@ -191,38 +786,98 @@ class Sweeper(ConfigFileBase):
         return self.sweep_items[section][action][item]
 
     def get_section_list_error(self, section):
-        return self._get(section, _list_action_label, "error")
+        _map, _data = self._get_map_for_section(section)
+        return _data[_list_action_label]["error"]
 
     def get_section_list_cmd(self, section):
-        return self._get(section, _list_action_label, "cmd")
+        _map, _data = self._get_map_for_section(section)
+        return _data[_list_action_label]["cmd"]
 
     def _get_section_sweep_pool(self, section):
-        return self._get(section, _sweep_action_label, "pool")
+        _map, _data = self._get_map_for_section(section)
+        return _data[_sweep_action_label]["pool"]
 
     def get_section_sweep_output(self, section, data_item):
-        return self._get_section_sweep_pool(section)[data_item]["item_output"]
+        return self._get_section_sweep_pool(section)[data_item].output
 
     def get_section_sweep_error(self, section, data_item):
-        return self._get_section_sweep_pool(section)[data_item]["item_error"]
+        return self._get_section_sweep_pool(section)[data_item].error
 
     def get_section_sweep_cmd(self, section, data_item):
-        return self._get_section_sweep_pool(section)[data_item]["item_cmd"]
+        return self._get_section_sweep_pool(section)[data_item].cmd
 
     def get_section_output(self, section):
-        return self.sweep_items[section]["output"]
+        _map, _data = self._get_map_for_section(section)
+        return _data["output"]
+
+    def get_section_listed_count(self, section):
+        _map, _data = self._get_map_for_section(section)
+        return _data["listed_count"]
 
     def get_section_filtered_output(self, section):
-        return self.sweep_items[section]["filtered_output"]
+        _map, _data = self._get_map_for_section(section)
+        return _data["filtered_output"]
 
     def get_section_data(self, section):
-        return self.sweep_items[section]["data"]
+        _map, _data = self._get_map_for_section(section)
+        return _data["data"]
+
+    def get_section_ancestors(self, section):
+        return get_ancestors(self.section_dependencies, section)
+
+    def get_section_summary(self, section):
+        """
+        Counts of items of the section, all action_map levels together,
+        and errors of items that failed to sweep
+
+        :return: dict of counts, return code and errors
+        """
+        _map, _data = self._get_map_for_section(section)
+        _summary = {
+            "return_code": self.section_results.get(section),
+            "dropped": section in self.dropped_sections,
+            "listed": 0,
+            "matched": 0,
+            "swept": 0,
+            "failed": 0,
+            "errors": []
+        }
+        _level = _data
+        _summary["listed"] = _data["listed_count"] or 0
+        for _index in range(len(_map)):
+            if _index > 0:
+                # childs are not filtered, all of them are swept
+                _level = _level[_map[_index]]
+                _summary["listed"] += len(_level["sweep_items"])
+            _summary["matched"] += len(_level["sweep_items"])
+            for _value, _result in \
+                    _level[_sweep_action_label]["pool"].iteritems():
+                if _result.return_code == 0:
+                    _summary["swept"] += 1
+                    continue
+                _summary["failed"] += 1
+                _summary["errors"].append({
+                    "item": _value,
+                    "return_code": _result.return_code,
+                    "error": _result.error
+                })
+        return _summary
+
+    def _set_section_result(self, section, rc):
+        # keep first error for the section
+        if rc != 0:
+            self.last_return_code = rc
+            if self.section_results.get(section, 0) == 0:
+                self.section_results[section] = rc
+        else:
+            self.section_results.setdefault(section, rc)
 
     def is_section_present(self, section):
         return True if section in self.sections_list else False
 
     @staticmethod
     def get_data_item(_frmt, item, key=None):
-        if _frmt == "json":
+        if is_keyed_format(_frmt):
             return item[key]
         elif _frmt == "raw":
             return item
@@ -232,147 +887,117 @@ class Sweeper(ConfigFileBase):
     @staticmethod
     def get_cache_key_name(data):
         _frmt = data["output_format"]
-        if _frmt == "json":
-            return "item." + data["section_name"] + "." + data["key"]
+        if is_keyed_format(_frmt):
+            return "item." + data["level_name"] + "." + data["key"]
         elif _frmt == "raw":
-            return "item." + data["section_name"] + ".raw"
+            return "item." + data["level_name"] + ".raw"
 
-    @staticmethod
-    def _action_process(cmd, test=False):
+    def _action_process(self, cmd, test=False, consumer=None, context=None,
+                        use_budget=True):
         logger.debug("...cmd: '{}'".format(cmd))
         if test:
             logger_cli.info("{}\n".format(cmd))
             return None, None, 0
 
-        _cmd = cmd.split()
-        try:
-            sweep_process = Popen(_cmd, stdout=PIPE, stderr=PIPE)
-        except OSError as e:
-            raise FailedToOpenProcess(" ".join(_cmd), e.strerror)
-
-        _output, _err = sweep_process.communicate()
-        _rc = sweep_process.returncode
-
-        # log it
-        logger.debug(
-            "process [{}] '{}' returned\n"
-            "--- start output ---\n{}\n--- end output ---\n"
-            "Error: '{}'\n"
-            "Return code: {}".format(
-                sweep_process.pid,
+        if consumer is not None:
+            return self.engine.execute_stream(
                 cmd,
-                _output,
-                _err,
-                _rc
+                consumer,
+                capture_limit=self.output_capture_limit,
+                context=context,
+                use_budget=use_budget
             )
-        )
-        return _output, _err, _rc
+        return self.engine.execute(cmd, context=context)
 
     def _do_list_action(
             self,
             cmd,
             expected_format=None,
             use_filter=False,
-            filter_key=None
+            item_filter=None,
+            keep_output=True,
+            context=None,
+            on_matched=None,
+            parser_options=None,
+            use_budget=True
     ):
         # execute the list action
         if self.bash_action == 'list':
             _out, _err, _rc = self._action_process(cmd, test=True)
-            return _rc, _out, None
+            return _rc, 0, None, None
+
+        # parse data by chunks and
+        # filter it according to selected type right away,
+        # whole output is kept only if asked or there is no filter,
+        # matched items go to 'on_matched' as they come, if given
+        _listed = [0]
+        _data = [] if keep_output or not use_filter else None
+        _filtered = [] if use_filter and on_matched is None else None
+
+        def _consume(items):
+            _listed[0] += len(items)
+            if _data is not None:
+                _data.extend(items)
+            if use_filter:
+                _matched = item_filter.filter(items)
+                if on_matched is not None:
+                    on_matched(_matched)
+                else:
+                    _filtered.extend(_matched)
+
+        if is_python_action(cmd):
+            # python action returns list of items, no parsing needed
+            _out, _err, _rc = self._action_process(cmd, context=context)
+            if _rc == 0:
+                _consume(list(_out or []))
         else:
-            _out, _err, _rc = self._action_process(cmd)
+            _parser = get_parser(expected_format, **(parser_options or {}))
+            _out, _err, _rc = self._action_process(
+                cmd,
+                consumer=lambda chunk: _consume(_parser.feed(chunk)),
+                context=context,
+                use_budget=use_budget
+            )
+            if _rc == 0:
+                _consume(_parser.close())
 
         # Handle result
-        _data, _filtered = None, None
         if _rc != 0:
             logger.debug("Non-zero exit code returned. No data will be saved")
-        else:
-            # parse data and
-            # filter it according to selected type
-            if expected_format == "json":
-                _data = json.loads(_out)
-                if use_filter:
-                    _filtered = self._filter_json(
-                        _data,
-                        filter_key
-                    )
-            else:
-                _data = _out.splitlines()
-                if use_filter:
-                    _filtered = self._filter_raw(_data)
-
-        return _rc, _data, _filtered
-
-    def _do_sweep_action(self, cmd):
-        logger_cli.debug("+ '{}'".format(cmd))
-
-        _out, _err, _rc = self._action_process(cmd)
-
-        # handle specific RC
-        # _rc = 1
-
-        # if error received, log it and retry
-        if _rc != 0:
-            # retry action
-            _retry_left = self.retry_count
-            while _retry_left > 0:
-                logger.warn(
-                    "About to retry sweep action in {}ms, "
-                    "{} retries left".format(
-                        self.retry_timeout,
-                        _retry_left
-                    )
-                )
-
-                sleep(self.retry_timeout / 1000)
-                _out, _err, _rc = self._action_process(cmd)
+            return _rc, 0, None, None
 
-                _retry_left -= 1
+        return _rc, _listed[0], _data, _filtered
 
-        return _rc, cmd, _out, _err
+    def _do_sweep_action(
+            self,
+            cmds,
+            concurrency=1,
+            context=None,
+            on_result=None,
+            retry=True
+    ):
+        for cmd in cmds:
+            logger_cli.debug("+ '{}'".format(cmd))
 
-    def _do_matching(self, unfiltered):
-        logger.debug("About to apply filter for '{}'".format(unfiltered))
-        _filtered_data_item = self.common_filter.match(unfiltered)
-        if _filtered_data_item is not None:
-            logger.debug("..matched value '{}'".format(
-                _filtered_data_item.string
-            ))
-            return _filtered_data_item.string
+        if self.bash_action == 'sweep':
+            _results = [self._action_process(cmd, test=True) for cmd in cmds]
         else:
-            return None
-
-    def _filter_raw(self, data):
-        _filtered = []
-        for data_item in data:
-            _filtered_data_item = self._do_matching(data_item)
-            if _filtered_data_item is not None:
-                _filtered.append(deepcopy(_filtered_data_item))
-        return _filtered
-
-    def _filter_json(self, json_data, field):
-        _filtered = []
-        for json_item in json_data:
-            _filtered_value = None
-            if field is None:
-                # filter all fields
-                for key, value in json_item.iteritems():
-                    _filtered_value = self._do_matching(value)
-                    if _filtered_value is not None:
-                        # break if found
-                        break
-            else:
-                _filtered_value = self._do_matching(json_item[field])
-
-            if _filtered_value is not None:
-                # found matching, add it
-                _filtered.append(deepcopy(json_item))
+            # failed commands are retried by engine
+            _results = self.engine.execute_many(
+                cmds,
+                concurrency=concurrency,
+                retry=retry,
+                context=context,
+                on_result=on_result
+            )
 
-        return _filtered
+        return [
+            (_rc, cmd, _out, _err)
+            for cmd, (_out, _err, _rc) in zip(cmds, _results)
+        ]
 
     @staticmethod
     def do_action(action, cmd, **kwargs):
-        # TODO: use gevent to generate subprocess
         logger.info("Running '{}'. CMD:'{}', ARGS:'{}'".format(
             action,
             cmd,
@@ -385,7 +1010,7 @@ class Sweeper(ConfigFileBase):
         _map = self.sweep_items[section]["action_map"]
         if _map is None:
             logger_cli.debug("## no action map")
-            _map = section
+            _map = [section]
             _data = self.sweep_items[section]
         else:
             logger_cli.debug("## action map is '{}'".format(_map))
@@ -396,217 +1021,646 @@ class Sweeper(ConfigFileBase):
         return _map, _data
 
     @staticmethod
-    def _format_variables(format_string, cache):
-        # fill in var values from cache
-        _format_list = format_string.split(':')
-        _vars = ()
-        for var in _format_list[1].split(','):
-            _vars += cache.__getattr__(var)
-        _formatted = _format_list[0].format(_vars)
-        return _formatted
-
-    def _do_list_as_child(self, data, _map, level, cache):
-        # get all items on this level for supplied options
+    def _format_variables(format_string, cache, value=None):
+        # fill in var values from cache,
+        # 'cmd {}:item.level.key' or 'cmd {0} {1}:item.a.key,item.b.key'
+        _format, _variables = split_variables(format_string)
+        if _variables is None:
+            # no variables declared, use supplied value
+            return _format.format(value)
+        return _format.format(
+            *[cache.__getattr__(_var) for _var in _variables]
+        )
+
+    def _add_sweep_items(self, data, items, parent=None):
+        # same childs could be listed for several parents,
+        # keep single entry for each of them and link it to its parent,
+        # only key value and name are kept from listed objects
+        _listed = data["listed_items"]
+        _format = data["output_format"]
+        _field = data["filter_field"]
+        _added = []
+        for item in items:
+            _value = self.get_data_item(_format, item, key=data["key"])
+            if _value not in _listed:
+                _item = SweepItem(
+                    _value,
+                    name=item.get(_field) if is_keyed_format(_format)
+                    else None,
+                    parent=parent
+                )
+                _listed[_value] = _item
+                data["sweep_items"].append(_item)
+                _added.append(_item)
+        return _added
 
+    @staticmethod
+    def _get_sweep_values(data):
+        return [_item.value for _item in data["sweep_items"]]
+
+    def _get_item_cache(self, data, item):
+        # item value and values of all of its parents
+        cache = DataCache()
+        while data is not None and item is not None:
+            cache.__setattr__(self.get_cache_key_name(data), item.value)
+            data, item = data["parent_level"], item.parent
+        return cache
+
+    def _do_list_as_child(self, data, parent):
+        # list childs for each of the parent items
+        rc = 0
         _cmd = data[_list_action_label]["cmd"]
-        _options = self._format_variables(data["as_child_options"], cache)
-        cmd = _cmd + " " + _options
+        data["parent_level"] = parent
+        for _parent_item in parent["sweep_items"]:
+            cache = self._get_item_cache(parent, _parent_item)
+            _options = self._format_variables(data["as_child_options"], cache)
+            cmd = _cmd + " " + _options
+
+            _rc, _, _items, _ = self.do_action(
+                self._do_list_action,
+                cmd,
+                expected_format=data["output_format"],
+                context=data[_list_action_label]["context"],
+                parser_options=data["parser_options"]
+            )
+
+            if _rc != 0:
+                logger_cli.warn("##### Failed to list child objects")
+                rc = _rc
+                continue
 
-        _items = self.do_action(
+            self._add_sweep_items(data, _items, parent=_parent_item)
+
+        return rc
+
+    def _do_list_as_joined_child(self, data, parent):
+        # list all childs at once and link them to parent items
+        # using reference field, instead of listing for each parent
+        _format = data["output_format"]
+        _join_field = data["join_field"]
+
+        rc, _, _items, _ = self.do_action(
             self._do_list_action,
-            cmd,
-            expected_format=data["output_format"]
+            data[_list_action_label]["cmd"],
+            expected_format=_format,
+            context=data[_list_action_label]["context"],
+            parser_options=data["parser_options"]
         )
 
-        data["sweep_items"].extend(_items)
-
-        # Process next levels
-        if len(_map) - 1 > level:
-            # there is a next level present
-            _next_level = _map[level + 1]
-            for item in _items:
-                _item = self.get_data_item(
-                    data["output_format"],
-                    item,
-                    key=data["key"]
-                )
-                cache.__setattr__(
-                    self.get_cache_key_name(data),
-                    _item
-                )
-                self._do_list_as_child(
-                    data[_next_level],
-                    _map,
-                    level + 1,
-                    cache
-                )
+        if rc != 0:
+            logger_cli.warn("##### Failed to list child objects")
+            return rc
 
-    def _list_action_runner(self, _data, _map, _level):
-        # Process next levels
-        if len(_map) - 1 > _level:
-            # there is a next level present
-            _next_level = _map[_level + 1]
-            self._list_action_runner(
-                _data[_next_level],
-                _map,
-                _level + 1
+        # index childs by parent reference
+        _index = {}
+        for item in _items:
+            try:
+                _reference = self.get_data_item(_format, item, _join_field)
+            except KeyError:
+                continue
+            _index.setdefault(_reference, []).append(item)
+
+        data["parent_level"] = parent
+        for _parent_item in parent["sweep_items"]:
+            self._add_sweep_items(
+                data,
+                _index.get(_parent_item.value, []),
+                parent=_parent_item
             )
 
+        return rc
+
+    def _list_action_runner(self, _data, _map, _level):
         # do listing for this section, will produce filtered out
         # prepare cmd and options
         _cmd = _data[_list_action_label]["cmd"]
         _format = _data["output_format"]
-        _filter_key = _data["filter_field"]
 
         # run initial action with filter
-        rc, output, filtered = self.do_action(
+        _started = time()
+        rc, listed, output, filtered = self.do_action(
             self._do_list_action,
             _cmd,
             expected_format=_format,
             use_filter=True,
-            filter_key=_filter_key
+            item_filter=_data["filter"],
+            keep_output=_data["keep_output"],
+            context=_data[_list_action_label]["context"],
+            parser_options=_data["parser_options"]
         )
+        self._observe_level(_data, _map, _list_action_label, _started, rc)
 
-        if rc > 0:
+        if rc != 0:
             logger_cli.warn("##### Failed to list objects")
             return rc
         elif self.bash_action == "list":
             return rc
 
-        if len(_map) > 1:
-            # ...process this level
-            _level_path = " -> ".join(_map[:_level + 1])
+        _data["listed_count"] = listed
+        _data["output"] = output
+        _data["filtered_output"] = self._add_sweep_items(_data, filtered)
+        # listed objects are not needed anymore, only its items
+        filtered = None
+
+        # list all filtered 'key' childs, level by level,
+        # and force them to be added as filtered
+        _levels = {_data["level_name"]: _data}
+        _parent = _data
+        for _index in range(_level + 1, len(_map)):
+            _child = _parent[_map[_index]]
+            _level_path = " -> ".join(_map[:_index + 1])
             logger_cli.debug("## {}".format(_level_path))
 
+            _started = time()
+            if _child["join_field"] is not None:
+                # parent could be any of the upper levels
+                _join_to = _levels[_child["join_to"] or _map[_index - 1]]
+                _rc = self._do_list_as_joined_child(_child, _join_to)
+            else:
+                _rc = self._do_list_as_child(_child, _parent)
+            self._observe_level(
+                _child,
+                _map,
+                _list_action_label,
+                _started,
+                _rc
+            )
 
-            # list all filtered 'key' childs
-            # and force them to be added as filtered
-            _key = _data["key"]
-            for item in filtered:
-                # iterate key values
-                _value = self.get_data_item(_format, item, _key)
+            if _rc != 0:
+                rc = _rc
+            _levels[_child["level_name"]] = _child
+            _parent = _child
 
-                cache = DataCache()
-                cache.__setattr__(
-                    self.get_cache_key_name(_data),
-                    _value
+        return rc
+
+    def _reset_sweep_items(self, data, _map, _level):
+        data["sweep_items"] = []
+        data["listed_items"] = {}
+        data["parent_level"] = None
+        data["planned_cmds"] = {}
+        data["listed_count"] = 0
+        data["output"] = None
+        data["filtered_output"] = None
+        data[_sweep_action_label]["pool"] = {}
+        if len(_map) - 1 > _level:
+            self._reset_sweep_items(data[_map[_level + 1]], _map, _level + 1)
+
+    def is_section_dropped(self, section):
+        # check if it is eligible to execute action
+        if not self.sweep_items[section]["protected_run"]:
+            return False
+        _failed = [
+            _ancestor
+            for _ancestor in self.get_section_ancestors(section)
+            if self.section_results.get(_ancestor, 0) != 0
+        ]
+        if _failed:
+            logger_cli.warn(
+                "# WARN: ...dropping protected section "
+                "due to previous error in '{}'".format(
+                    ", ".join(sorted(_failed))
                 )
+            )
+            self.dropped_sections.add(section)
+            return True
+        return False
 
-                self._do_list_as_child(_data, _map,_level, cache)
+    def list_action(self, section=None, prefetch=False):
+        # 'prefetch' lists section ahead of its turn, it is checked
+        # to be dropped and gets its result in 'take_prefetched'
+        logger_cli.debug("## list action started")
 
-                _data["sweep_items"].append(item)
+        # if map is present, do child listings as well
+        _map, _data = self._get_map_for_section(section)
 
-        _data["output"] = output
-        _data["filtered_output"] = filtered
+        # do listing using map, parent first
+        # filtered parents will bring all of their childs
+        self._reset_sweep_items(_data, _map, 0)
 
+        # get data lists for section
+        if not prefetch and self.is_section_dropped(section):
+            return 0
+        _started = time()
+        rc = self._list_action_runner(_data, _map, 0)
+        self._observe_stage(section, None, _list_action_label, _started, rc)
+        if not prefetch:
+            self._set_section_result(section, rc)
         return rc
 
-    def list_action(self, section=None):
-        logger_cli.debug("## list action started")
+    def take_prefetched(self, section, rc):
+        # listing done ahead is used when section's turn comes
+        if self.is_section_dropped(section):
+            _map, _data = self._get_map_for_section(section)
+            self._reset_sweep_items(_data, _map, 0)
+            return 0
+        self._set_section_result(section, rc)
+        return rc
 
-        # if map is present, do child listings as well
+    def is_section_prefetched(self, section):
+        return self.sweep_items[section]["prefetch"]
+
+    def _get_levels(self, section):
+        # data of all levels, parents first
         _map, _data = self._get_map_for_section(section)
+        _levels = [_data]
+        for _level in _map[1:]:
+            _levels.append(_levels[-1][_level])
+        return _levels
+
+    def get_section_plan(self, section):
+        # listed items, its links and sweep commands of each level
+        _levels = []
+        for data in self._get_levels(section):
+            _values = self._get_sweep_values(data)
+            _parents = {}
+            for _item in data["sweep_items"]:
+                if _item.parent is not None:
+                    _parents[_item.value] = [
+                        data["parent_level"]["level_name"],
+                        _item.parent.value
+                    ]
+            _levels.append({
+                "level": data["level_name"],
+                "items": _values,
+                "parents": _parents,
+                "commands": [
+                    self._format_sweep_cmd(data, [_value])
+                    for _value in _values
+                ]
+            })
+        return {"section": section, "levels": _levels}
+
+    def load_section_plan(self, section, plan, swept=None):
+        # fill in section with items from plan, instead of listing,
+        # 'swept' is dict of level -> items already swept, skipped
+        swept = swept or {}
+        _map, _data = self._get_map_for_section(section)
+        self._reset_sweep_items(_data, _map, 0)
 
-        # do listing using map, child first
-        # process child level
+        _levels = self._get_levels(section)
+        _names = [data["level_name"] for data in _levels]
+        if _names != [level["level"] for level in plan["levels"]]:
+            raise PlanInvalid(
+                section,
+                "levels differ from profile: {}".format(", ".join(_names))
+            )
 
-        # get data lists for section
-        # check if it is eligible to execute action
-        if self.sweep_items[section]["protected_run"] \
-                and self.last_return_code != 0:
-            logger_cli.warn(
-                "# WARN: ...dropping protected section due to previous error"
+        _by_name = {}
+        for data, level in zip(_levels, plan["levels"]):
+            _by_name[data["level_name"]] = data
+            _swept = swept.get(data["level_name"], ())
+            for _value, _cmd in zip(level["items"], level["commands"]):
+                if _value in _swept:
+                    continue
+                _item = SweepItem(_value)
+                data["sweep_items"].append(_item)
+                data["listed_items"][_value] = _item
+                data["planned_cmds"][_value] = _cmd
+            for _value, (_parent, _parent_value) in level["parents"].items():
+                _item = data["listed_items"].get(_value)
+                if _item is None:
+                    continue
+                # parent could be swept already, its value is enough
+                data["parent_level"] = _by_name[_parent]
+                _item.parent = _by_name[_parent]["listed_items"].get(
+                    _parent_value,
+                    SweepItem(_parent_value)
+                )
+
+        _data["filtered_output"] = list(_data["sweep_items"])
+        return len(_data["sweep_items"])
+
+    def _format_sweep_cmd(self, data, values):
+        # sweep action for a single item value or a chunk of them
+        if len(values) == 1 and values[0] in data["planned_cmds"]:
+            return data["planned_cmds"][values[0]]
+        _template = data[_sweep_action_label]["template"]
+        _value = " ".join(values)
+        _cache = None
+        if _template.variables is not None:
+            # chunk of values has no parents to take values from
+            _item = data["listed_items"].get(_value, SweepItem(_value))
+            _cache = self._get_item_cache(data, _item)
+        return _template.render(_value, cache=_cache, chunk=len(values) > 1)
+
+    def _journal_swept(self, data, cmd_values):
+        # records items as soon as its command succeeds,
+        # so interrupted run is resumed without them
+        if self.journal is None:
+            return None
+        _section = data[_sweep_action_label]["context"].section
+
+        def _record(cmd, result):
+            if result[2] == 0:
+                self.journal.record_items(
+                    _section,
+                    data["level_name"],
+                    cmd_values[cmd],
+                    0
+                )
+        return _record
+
+    def _sweep_values(self, data, values, concurrency=1):
+        # executes single sweep action for each chunk of item values,
+        # falls back to per item execution if chunk action failed
+        _batch_size = data["sweep_batch_size"]
+        _chunks = [
+            values[_index:_index + _batch_size]
+            for _index in range(0, len(values), _batch_size)
+        ]
+
+        _cmds = [
+            self._format_sweep_cmd(data, _chunk) for _chunk in _chunks
+        ]
+        _results = self.do_action(
+            self._do_sweep_action,
+            _cmds,
+            concurrency=concurrency,
+            context=data[_sweep_action_label]["context"],
+            on_result=self._journal_swept(data, dict(zip(_cmds, _chunks))),
+            # failed batch is not run again as whole, items left by it
+            # are retried one by one
+            retry=_batch_size == 1
+        )
+
+        _values_results = {}
+        _fallback = []
+        for _chunk, _result in zip(_chunks, _results):
+            if _result[0] == 0 or _batch_size == 1:
+                for value in _chunk:
+                    _values_results[value] = _result
+            else:
+                logger.warn(
+                    "Batch sweep action failed with rc={}, "
+                    "falling back to {} single item actions".format(
+                        _result[0],
+                        len(_chunk)
+                    )
+                )
+                for value in _chunk:
+                    _values_results[value] = _result
+                _fallback.extend(_chunk)
+
+        if _fallback:
+            _fallback = self._get_remaining(data, _fallback, _values_results)
+        if _fallback:
+            _cmds = [
+                self._format_sweep_cmd(data, [value]) for value in _fallback
+            ]
+            _results = self.do_action(
+                self._do_sweep_action,
+                _cmds,
+                concurrency=concurrency,
+                context=data[_sweep_action_label]["context"],
+                on_result=self._journal_swept(
+                    data,
+                    dict((_cmd, [_value])
+                         for _cmd, _value in zip(_cmds, _fallback))
+                )
             )
-            return 0
-        _data["sweep_items"] = []
-        return self._list_action_runner(_data, _map, 0)
+            _values_results.update(zip(_fallback, _results))
+
+        return [(value, _values_results[value]) for value in values]
+
+    def _get_remaining(self, data, values, results):
+        # failed batch could sweep part of its items before it failed,
+        # only ones that are listed still are tried one by one;
+        # all of them are, if level could not be listed on its own
+        _cmd = self._get_poll_cmd(data)
+        if _cmd is None or self.bash_action is not None:
+            return values
+        _present = self._list_present(data, _cmd, set(values))
+        if _present is None:
+            logger.warn("Listing after failed batch failed, "
+                        "all of its items are tried again")
+            return values
+        _gone = [value for value in values if value not in _present]
+        for value in _gone:
+            # swept by the batch, its command is the one that did it
+            _rc, cmd, output, error = results[value]
+            results[value] = (0, cmd, output, error)
+        if _gone and self.journal is not None:
+            self.journal.record_items(
+                data[_sweep_action_label]["context"].section,
+                data["level_name"],
+                _gone,
+                0
+            )
+        logger.info("{} of {} items of failed batches are gone".format(
+            len(_gone),
+            len(values)
+        ))
+        return [value for value in values if value in _present]
+
+    def _store_sweep_result(self, data, item, result, number, tab_space):
+        # keep result of the item in pool and show it
+        _rc, cmd, output, error = result
+        _value = item.value
+        data[_sweep_action_label]["pool"][_value] = SweepResult(
+            _rc,
+            cmd,
+            output,
+            error
+        )
 
-    def _sweep_action_runner(self, data, _map, _level, cache=None):
+        # show item processed
+        if item.name is not None and item.name != _value:
+            logger_cli.info("{}> {}: {} ({})".format(
+                tab_space,
+                number,
+                _value,
+                item.name
+            ))
+        else:
+            logger_cli.info("{}> {}: {}".format(tab_space, number, _value))
+        if _rc != 0:
+            logger_cli.error("\t({}) '{}'\n\tERROR: {}".format(
+                _rc,
+                cmd,
+                error
+            ))
+            if self.journal is not None:
+                self.journal.record_items(
+                    data[_sweep_action_label]["context"].section,
+                    data["level_name"],
+                    [_value],
+                    _rc
+                )
+        else:
+            logger_cli.info("{}".format(output))
+        return _rc
+
+    def _sweep_action_runner(self, data, _map, _level, concurrency=1):
         # At this point, we should have
         # all of the items in filtered ready for sweep.
         _name = data["section_name"]
-        _format = data["output_format"]
         _tab_space = "\t" * (_level + 1)
 
         # announce section
         logger_cli.info("{}==> '{}'".format(_tab_space, _name))
 
+        rc = 0
         # Run next levels first
         if len(_map) - 1 > _level:
             # there is a next level present
             _next_level = _map[_level + 1]
-            self._list_action_runner(
+            rc = self._sweep_action_runner(
                 data[_next_level],
                 _map,
-                _level + 1
+                _level + 1,
+                concurrency=concurrency
             )
 
-        # At this point, we should have
-        # all of the items in filtered ready for sweep.
-        _name = data["section_name"]
-        _format = data["output_format"]
-
-        # get cmd for this section
-        _cmd = data[_sweep_action_label]["cmd"]
-
-        # key for this section to load from 'item'
-        _key = data["key"]
-
-        # Take item from filtered
-        _count = len(data["sweep_items"])
-        for _data_item in data["sweep_items"]:
-            if _format == "json":
-                logger_cli.info("\t> {}: {}".format(_count, _data_item[_key]))
-                # handle parameter in cmd using format
-                _cmd.format(_data_item[_key])
-            elif _format == "raw":
-                # show item in processing
-                logger_cli.info("\t> {}: {}".format(_count, _data_item))
-                # handle parameter in cmd using format
-                _cmd.format(_data_item)
-
-            _formatted_cmd = self._format_variables(_cmd, _cache)
-
-            # then execute sweep on this level
-            rc, cmd, output, error = self.do_action(
-                self._do_sweep_action,
-                _cmd,
+        # Take values from filtered, keep its order
+        _items = data["sweep_items"]
+        _values = self._get_sweep_values(data)
+
+        # execute sweep on this level, results are coming in order
+        _count = len(_values)
+        _started = time()
+        _results = self._sweep_values(data, _values, concurrency=concurrency)
+        _level_rc = 0
+        for _item, (_, _result) in zip(_items, _results):
+            _rc = self._store_sweep_result(
+                data,
+                _item,
+                _result,
+                _count,
+                _tab_space
             )
+            if _rc != 0:
+                rc = _level_rc = _rc
+            _count -= 1
 
-            # store
-            _pool = data["pool"]
-            _pool[_data_item] = {}
-            _pool[_data_item]["item_cmd"] = cmd
-            _pool[_data_item]["item_output"] = output
-            _pool[_data_item]["item_error"] = error
-            _pool[_data_item]["item_return_code"] = rc
+        self._observe_level(
+            data,
+            _map,
+            _sweep_action_label,
+            _started,
+            _level_rc
+        )
+        return rc
 
-            rc = self.do_action(
-                self._do_sweep_action,
-                _cmd
-            )
+    def _list_present(self, data, cmd, keys):
+        # keys that are listed still, None if listing failed
+        _format = data["output_format"]
+        rc, _, _, _items = self.do_action(
+            self._do_list_action,
+            cmd,
+            expected_format=_format,
+            use_filter=True,
+            item_filter=KeyFilter(
+                keys,
+                key=data["key"] if is_keyed_format(_format) else None
+            ),
+            keep_output=False,
+            context=data[_list_action_label]["context"],
+            parser_options=data["parser_options"]
+        )
+        if rc != 0:
+            return None
+        return set(
+            self.get_data_item(_format, _item, data["key"])
+            for _item in _items
+        )
 
-            if rc != 0:
-                logger_cli.error("\t({}) '{}'\n\tERROR: {}".format(
-                    rc,
-                    self.get_section_sweep_cmd(
-                        _name,
-                        _data_item
-                    ),
-                    self.get_section_sweep_error(
-                        _name,
-                        _data_item
+    @staticmethod
+    def _get_poll_cmd(data):
+        # command that lists all items of the level at once,
+        # None for levels listed for each parent with no 'wait_list_action'
+        if data["wait_list_action"] is not None:
+            return data["wait_list_action"]
+        if data["as_child_options"] is not None:
+            return None
+        return data[_list_action_label]["cmd"]
+
+    def _get_waiting_levels(self, section):
+        # levels with swept items to wait for and its poll commands
+        _waiting = []
+        for data in self._get_levels(section):
+            if not data["wait_until_gone"]:
+                continue
+            _cmd = self._get_poll_cmd(data)
+            if _cmd is None:
+                logger_cli.warn(
+                    "# WARN: '{}' is listed for each parent, set "
+                    "'wait_list_action' to wait for it".format(
+                        data["section_name"]
                     )
-                ))
-            else:
-                logger_cli.info("{}".format(
-                    self.get_section_sweep_output(
-                        data["section_name"],
-                        _data_item
+                )
+                continue
+            _pool = data[_sweep_action_label]["pool"]
+            _pending = set(
+                _value for _value, _result in _pool.items()
+                if _result.return_code == 0
+            )
+            if _pending:
+                _waiting.append((data, _cmd, _pending))
+        return _waiting
+
+    def wait_until_gone_action(self, section):
+        """
+        Poll listings of section levels until swept items disappear,
+        single listing for each level per poll. Gives up after
+        'wait_timeout' seconds, dependent sections start anyway.
+
+        :return: 0 if all items are gone, 1 on timeout
+        """
+        if self.bash_action is not None:
+            return 0
+        _waiting = self._get_waiting_levels(section)
+        if not _waiting:
+            return 0
+
+        _interval = self.sweep_items[section]["wait_poll_interval"]
+        _timeout = self.sweep_items[section]["wait_timeout"]
+        _started = time()
+        logger_cli.info("# {}: waiting for {} items to be gone".format(
+            section,
+            sum(len(_pending) for _, _, _pending in _waiting)
+        ))
+        rc = 0
+        while True:
+            for _entry in list(_waiting):
+                data, _cmd, _pending = _entry
+                _present = self._list_present(data, _cmd, _pending)
+                if _present is None:
+                    logger_cli.warn("# WARN: '{}' failed, retry in {}s".format(
+                        _cmd,
+                        _interval
+                    ))
+                    continue
+                _pending.intersection_update(_present)
+                if not _pending:
+                    _waiting.remove(_entry)
+            if not _waiting:
+                break
+            _left = _timeout - (time() - _started)
+            if _left <= 0 or self.engine.cancelled:
+                logger_cli.warn(
+                    "# WARN: {}: gave up waiting after {:.0f}s, "
+                    "still present: {}".format(
+                        section,
+                        time() - _started,
+                        ", ".join(
+                            "{} in '{}'".format(
+                                len(_pending),
+                                data["section_name"]
+                            )
+                            for data, _, _pending in _waiting
+                        )
                     )
-                ))
-            _count -= 1
+                )
+                rc = 1
+                break
+            sleep(min(_interval, _left))
 
+        if rc == 0:
+            logger_cli.info("# {}: swept items are gone after {:.0f}s".format(
+                section,
+                time() - _started
+            ))
+        self._observe_stage(section, None, "wait", _started, rc)
         return rc
 
     def sweep_action(self, section=None):
@@ -615,6 +1669,201 @@ class Sweeper(ConfigFileBase):
 
         # if map is present, do child listings as well
         _map, _data = self._get_map_for_section(section)
+        _concurrency = self.sweep_items[section]["concurrency"]
+        logger_cli.debug("## concurrency is {}".format(_concurrency))
+
+        # items of resumed section are in the journal already
+        _journal = self.journal
+        if section in self.dropped_sections:
+            _journal = None
+        if _journal is not None and not (
+                self.journal_state is not None
+                and section in self.journal_state.listings
+        ):
+            _journal.record_listing(self.get_section_plan(section))
 
         # sweep it
-        return self._sweep_action_runner(self.sweep_items[section], _map, 0)
+        _started = time()
+        rc = self._sweep_action_runner(
+            _data,
+            _map,
+            0,
+            concurrency=_concurrency
+        )
+        self._observe_stage(section, None, _sweep_action_label, _started, rc)
+        self.wait_until_gone_action(section)
+        self._set_section_result(section, rc)
+        if _journal is not None:
+            _journal.record_section(section, self.section_results[section])
+        return rc
+
+    def is_section_pipelined(self, section):
+        # childs are swept before parents,
+        # so sections with action map are not pipelined
+        _data = self.sweep_items[section]
+        return _data["pipeline"] and _data["action_map"] is None
+
+    @staticmethod
+    def _pipeline_put(queue, item, state):
+        # waits while sweep is behind, queue is made unbounded
+        # once sweep takes nothing for too long
+        _waited = 0.0
+        while not state["stopped"]:
+            try:
+                queue.put(item, timeout=_pipeline_poll_interval)
+                return
+            except Queue.Full:
+                _waited += _pipeline_poll_interval
+                if _waited >= _pipeline_stall_timeout:
+                    logger_cli.warn(
+                        "# WARN: sweep took nothing for {:.0f}s, "
+                        "listing goes on without waiting".format(_waited)
+                    )
+                    queue.maxsize = 0
+
+    @staticmethod
+    def _pipeline_take(queue):
+        # waits for the first item, then takes all that are ready,
+        # each take ends waiting for its slowest command, so take more;
+        # None marks the end of listing
+        _items = []
+        while True:
+            try:
+                if _items:
+                    _item = queue.get_nowait()
+                else:
+                    # timeout keeps the wait interruptible
+                    _item = queue.get(timeout=_pipeline_poll_interval)
+            except Queue.Empty:
+                if _items:
+                    break
+                continue
+            if _item is None:
+                return _items, True
+            _items.append(_item)
+        return _items, False
+
+    def _pipeline_list(self, data, queue, state, swept):
+        # runs in own thread, matched items are queued as they are parsed,
+        # ones swept by interrupted run are skipped
+        def _matched(items):
+            for _item in self._add_sweep_items(data, items):
+                if _item.value not in swept:
+                    self._pipeline_put(queue, _item, state)
+
+        _section = data[_list_action_label]["context"].section
+        try:
+            _started = time()
+            rc, listed, output, _ = self.do_action(
+                self._do_list_action,
+                data[_list_action_label]["cmd"],
+                expected_format=data["output_format"],
+                use_filter=True,
+                item_filter=data["filter"],
+                keep_output=data["keep_output"],
+                context=data[_list_action_label]["context"],
+                on_matched=_matched,
+                parser_options=data["parser_options"],
+                # listing waits for sweep to take its items, with a slot
+                # of process budget held it could wait for itself
+                use_budget=False
+            )
+            self._observe_stage(
+                _section,
+                None,
+                _list_action_label,
+                _started,
+                rc
+            )
+            data["listed_count"] = listed
+            data["output"] = output
+            state["rc"] = rc
+        except Exception:
+            state["error"] = sys.exc_info()
+        finally:
+            self._pipeline_put(queue, None, state)
+
+    def pipeline_action(self, section):
+        """
+        List section and sweep its items at once. Matched items go
+        to sweep through a bounded queue while listing is parsed,
+        listing waits when sweep falls behind.
+
+        :param section: section without action map
+        :return: return code of listing, or of sweep if listing is fine
+        """
+        logger_cli.debug("## pipelined list and sweep started")
+        _map, _data = self._get_map_for_section(section)
+        self._reset_sweep_items(_data, _map, 0)
+        if self.is_section_dropped(section):
+            return 0
+        _concurrency = self.sweep_items[section]["concurrency"]
+        logger_cli.debug("## concurrency is {}".format(_concurrency))
+
+        # engine that can't wait in stream consumer gets no backpressure
+        _queue = Queue.Queue(
+            self.pipeline_queue_size if self.engine.consumer_may_block else 0
+        )
+        _state = {"stopped": False, "rc": 0, "error": None}
+        # listing is not journaled, swept items are known by value only
+        _swept = set()
+        if self.journal_state is not None:
+            _swept = self.journal_state.get_swept(section).get(
+                _data["level_name"],
+                _swept
+            )
+        _thread = threading.Thread(
+            target=self._pipeline_list,
+            args=(_data, _queue, _state, _swept)
+        )
+        _thread.daemon = True
+        _tab_space = "\t"
+        logger_cli.info("{}==> '{}'".format(_tab_space, _data["section_name"]))
+
+        _started = time()
+        _thread.start()
+        rc = 0
+        _count = 0
+        _done = False
+        try:
+            while not _done:
+                # sweep takes all that is listed so far
+                _items, _done = self._pipeline_take(_queue)
+                if not _items:
+                    continue
+                _results = self._sweep_values(
+                    _data,
+                    [_item.value for _item in _items],
+                    concurrency=_concurrency
+                )
+                for _item, (_, _result) in zip(_items, _results):
+                    _count += 1
+                    _rc = self._store_sweep_result(
+                        _data,
+                        _item,
+                        _result,
+                        _count,
+                        _tab_space
+                    )
+                    if _rc != 0:
+                        rc = _rc
+        finally:
+            # interrupted sweep stops listing from queueing
+            _state["stopped"] = True
+        _thread.join()
+        if _state["error"] is not None:
+            raise _state["error"][0], _state["error"][1], _state["error"][2]
+        self._observe_stage(section, None, _sweep_action_label, _started, rc)
+        _data["filtered_output"] = list(_data["sweep_items"])
+
+        if _state["rc"] != 0:
+            logger_cli.warn("##### Failed to list objects")
+            rc = _state["rc"]
+        self.wait_until_gone_action(section)
+        self._set_section_result(section, rc)
+        if self.journal is not None:
+            self.journal.record_section(
+                section,
+                self.section_results[section]
+            )
+        return rc
@@ -2,10 +2,12 @@ import file
 import config
 import logger
 import exception
+import pool
 
 file_utils = file
 logger = logger
 config = config
+pool = pool
 
 
 def merge_dict(source, destination):
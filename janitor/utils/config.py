@@ -93,4 +93,15 @@ class SweeperConfig(ConfigFileBase):
         _path = self.get_value('logfile')
         return self._ensure_abs_path(_path)
 
-sweeper = SweeperConfig(_default_config)
+
+_sweeper_config = None
+
+
+def get_sweeper_config():
+    """
+    Tool config from 'etc/janitor.conf', read on first use
+    """
+    global _sweeper_config
+    if _sweeper_config is None:
+        _sweeper_config = SweeperConfig(_default_config)
+    return _sweeper_config
@@ -36,6 +36,16 @@ class JSONParsingFailed(SweeperException):
             "InvalidJSON: Failed to parse JSON from listing output")
 
 
+class OutputParsingFailed(SweeperException):
+    def __init__(self, output_format, reason):
+        super(OutputParsingFailed, self).__init__(
+            "InvalidOutput: Failed to parse '{}' listing output: {}".format(
+                output_format,
+                reason
+            )
+        )
+
+
 class SweeperNotImplemented(SweeperException):
     def __init__(self, functionality):
         super(SweeperNotImplemented, self).__init__(
@@ -43,3 +53,92 @@ class SweeperNotImplemented(SweeperException):
                 functionality
             )
         )
+
+
+class SectionDependencyCycle(SweeperException):
+    def __init__(self, sections):
+        super(SectionDependencyCycle, self).__init__(
+            "DependencyCycle: Sections '{}' depend on each other".format(
+                ", ".join(sections)
+            )
+        )
+
+
+class EngineNotAvailable(SweeperException):
+    def __init__(self, engine, error):
+        super(EngineNotAvailable, self).__init__(
+            "EngineNotAvailable: Engine '{}' can't be used: '{}'".format(
+                engine,
+                error
+            )
+        )
+
+
+class PlanInvalid(SweeperException):
+    def __init__(self, filename, reason):
+        super(PlanInvalid, self).__init__(
+            "PlanInvalid: Plan '{}' can't be applied: {}".format(
+                filename,
+                reason
+            )
+        )
+
+
+class PythonActionNotFound(SweeperException):
+    def __init__(self, action, error):
+        super(PythonActionNotFound, self).__init__(
+            "PythonActionNotFound: Action '{}' can't be loaded: {}".format(
+                action,
+                error
+            )
+        )
+
+
+class PrimingFailed(SweeperException):
+    def __init__(self, script, error):
+        super(PrimingFailed, self).__init__(
+            "PrimingFailed: Script '{}' failed: {}".format(
+                script,
+                error
+            )
+        )
+
+
+class JournalInvalid(SweeperException):
+    def __init__(self, filename, reason):
+        super(JournalInvalid, self).__init__(
+            "JournalInvalid: Journal '{}' can't be resumed: {}".format(
+                filename,
+                reason
+            )
+        )
+
+
+class DaemonRequestFailed(SweeperException):
+    def __init__(self, path, error):
+        super(DaemonRequestFailed, self).__init__(
+            "DaemonRequestFailed: Request to daemon at '{}' failed: {}".format(
+                path,
+                error
+            )
+        )
+
+
+class TargetsInvalid(SweeperException):
+    def __init__(self, filename, reason):
+        super(TargetsInvalid, self).__init__(
+            "TargetsInvalid: Targets '{}' can't be used: {}".format(
+                filename,
+                reason
+            )
+        )
+
+
+class CommandInvalid(SweeperException):
+    def __init__(self, cmd, reason):
+        super(CommandInvalid, self).__init__(
+            "CommandInvalid: Command '{}' can't be parsed: {}".format(
+                cmd,
+                reason
+            )
+        )
@@ -57,20 +57,14 @@ def setup_loggers(name, def_level=logging.DEBUG, log_fname=None):
     colored_formatter = ColoredFormatter(log_format, datefmt="%H:%M:%S")
     sh.setFormatter(colored_formatter)
 
-    # File handler
-    if log_fname is not None:
-        fh = logging.FileHandler(log_fname)
-        log_format = '%(asctime)s - %(levelname)8s - %(name)-15s - %(message)s'
-        formatter = logging.Formatter(log_format, datefmt="%H:%M:%S")
-        fh.setFormatter(formatter)
-        fh.setLevel(logging.DEBUG)
-    else:
-        fh = None
-
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
     if len(logger.handlers) == 0:
-        logger.addHandler(fh)
+        if log_fname is not None:
+            add_file_handler(logger, log_fname)
+        else:
+            # file is added by the CLI, library users get nothing
+            logger.addHandler(logging.NullHandler())
 
     logger_cli = logging.getLogger(name + ".cli")
     logger_cli.setLevel(logging.DEBUG)
@@ -78,3 +72,20 @@ def setup_loggers(name, def_level=logging.DEBUG, log_fname=None):
         logger_cli.addHandler(sh)
 
     return logger, logger_cli
+
+
+def add_file_handler(logger, log_fname):
+    """
+    Log to file, it is created with the first record
+
+    :param logger: logger to add handler to
+    :param log_fname: log file name
+    :return: handler added
+    """
+    fh = logging.FileHandler(log_fname, delay=True)
+    log_format = '%(asctime)s - %(levelname)8s - %(name)-15s - %(message)s'
+    formatter = logging.Formatter(log_format, datefmt="%H:%M:%S")
+    fh.setFormatter(formatter)
+    fh.setLevel(logging.DEBUG)
+    logger.addHandler(fh)
+    return fh
@@ -0,0 +1,25 @@
+def ordered_map(func, items, concurrency=1):
+    """
+    Generator that applies 'func' to every item using up to 'concurrency'
+    worker threads. Results are yielded in the order of 'items',
+    so callers can report them deterministically.
+
+    :param func: callable to execute for each item
+    :param items: list of items to process
+    :param concurrency: maximum number of items processed at once
+    """
+    _count = len(items)
+    if concurrency is None or concurrency <= 1 or _count < 2:
+        for item in items:
+            yield func(item)
+        return
+
+    # multiprocessing is slow to import, most runs do not need it
+    from multiprocessing.pool import ThreadPool
+    _pool = ThreadPool(min(concurrency, _count))
+    try:
+        for result in _pool.imap(func, items):
+            yield result
+    finally:
+        _pool.close()
+        _pool.join()
@@ -40,6 +40,9 @@ setup(
     },
     zip_safe=False,
     install_requires=dependencies,
+    extras_require={
+        'asyncio': ['trollius']
+    },
     data_files=DATA,
     license="GNU General Public License v3.0",
     description="Janitor is a console util to create profiles "